@@ -0,0 +1,415 @@
+"""
+Command-line interface for pyzandronum.
+
+    python -m pyzandronum query 127.0.0.1:10666
+    python -m pyzandronum scan --master --format ndjson > fleet.ndjson
+    python -m pyzandronum bench --local 1000 --rounds 5
+    python -m pyzandronum serve --servers 100 --port 20000
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from . import __version__
+from . import enums
+from . import exceptions
+from . import master
+from . import zandronum
+from .export import NDJSONWriter
+from .health import HealthTracker
+from .metrics import Metrics
+from .partition import HashRing
+from .responder import Responder
+from .scanner import Scanner, ShardedScanner
+
+
+def parse_target(text: str, default_port: int = 10666) -> tuple:
+    """
+    Parses ``host``, ``host:port`` or ``[ipv6]:port`` into
+    ``(host, port)``.
+    """
+    text = text.strip()
+    if text.startswith('['):
+        host, _, rest = text[1:].partition(']')
+        port = rest[1:] if rest.startswith(':') else ''
+    elif text.count(':') == 1:
+        host, _, port = text.partition(':')
+    else:
+        host, port = text, ''
+    return host, int(port) if port else default_port
+
+
+def parse_flags(text: str) -> enums.RequestFlags:
+    """
+    Parses ``default``, ``all``, a number or comma-separated flag names
+    (with or without the ``SQF_`` prefix) into request flags.
+    """
+    text = text.strip()
+    if text.lower() == 'default':
+        return enums.RequestFlags.default()
+    if text.lower() == 'all':
+        return enums.RequestFlags.all()
+    try:
+        return enums.RequestFlags(int(text, 0))
+    except ValueError:
+        pass
+
+    flags = enums.RequestFlags.NONE
+    for name in text.split(','):
+        name = name.strip().upper()
+        if not name.startswith('SQF_'):
+            name = 'SQF_' + name
+        flags |= enums.RequestFlags[name]
+    return flags
+
+
+def read_targets(args) -> list:
+    """Collects targets from arguments, a file and/or standard input."""
+    lines = list(args.targets)
+
+    if args.file == '-' or (
+        args.file is None and not lines and
+        not getattr(args, 'master', None) and
+        not getattr(args, 'local', None) and
+        not sys.stdin.isatty()
+    ):
+        lines += sys.stdin.read().splitlines()
+    elif args.file is not None:
+        with open(args.file, encoding='utf-8') as fp:
+            lines += fp.read().splitlines()
+
+    targets = []
+    for line in lines:
+        line = line.split('#', 1)[0].strip()
+        if line:
+            targets.append(parse_target(line))
+    return targets
+
+
+def _scanner(args, metrics: Metrics = None) -> Scanner:
+    return Scanner(
+        flags=args.flags,
+        timeout=args.timeout,
+        concurrency=args.concurrency,
+        retries=args.retries,
+        rate=args.rate,
+        engine=args.engine,
+        validate=args.validate,
+        health=HealthTracker(path=args.health) if args.health else None,
+        state=args.state,
+        metrics=metrics
+    )
+
+
+def _print_server(result, out) -> None:
+    server = result.server
+    print(f'{result.address}:{result.port}', file=out)
+    if not result.ok:
+        print(f'  error: {result.error}', file=out)
+        return
+    print(f'  name:     {zandronum.strip_colors(server.name or "")}', file=out)
+    print(f'  version:  {server.version}', file=out)
+    print(f'  map:      {server.map} ({server.gamemode})', file=out)
+    print(f'  iwad:     {server.iwad}  pwads: {", ".join(server.pwads or [])}',
+          file=out)
+    print(f'  players:  {server.number_players}/{server.max_players} '
+          f'(ping {result.latency * 1000:.0f} ms)', file=out)
+    for player in server.players:
+        flags = ' spectator' if player.spectator else ''
+        flags += ' bot' if player.bot else ''
+        print(f'    {player.name:32} score {player.score:5} '
+              f'ping {player.ping:4}{flags}', file=out)
+    if server.query_dict['teamgame']:
+        try:
+            teams = server.teams
+        except exceptions.MalformedResponse as e:
+            print(f'  teams:    malformed ({e.reason})', file=out)
+            teams = []
+        for team in teams:
+            print(f'  team {team["name"]}: {team["score"]}', file=out)
+
+
+def _print_row(result, out) -> None:
+    address = f'{result.address}:{result.port}'
+    if not result.ok:
+        print(f'{address:24} {type(result.error).__name__}', file=out)
+        return
+    server = result.server
+    players = f'{server.number_players}/{server.max_players}'
+    print(f'{address:24} {players:>6} {result.latency * 1000:6.0f}ms '
+          f'{server.map or "":8} {str(server.gamemode):24} '
+          f'{zandronum.strip_colors(server.name or "")}', file=out)
+
+
+async def _collect_targets(args) -> list:
+    targets = read_targets(args)
+    if getattr(args, 'master', None):
+        targets += await master.fetch_servers(
+            parse_target(args.master, master.MASTER_ADDRESS[1]),
+            args.timeout
+        )
+    if getattr(args, 'nodes', None):
+        # Keep only this node's share of the targets
+        nodes = [node.strip() for node in args.nodes.split(',')]
+        if args.node not in nodes:
+            raise SystemExit(f'--node must be one of --nodes ({args.nodes})')
+        targets = [
+            (host, port)
+            for index, host, port in HashRing(nodes).share(targets, args.node)
+        ]
+    return targets
+
+
+def cmd_query(args) -> int:
+    out = sys.stdout
+    writer = NDJSONWriter(out, flush=True) if args.format == 'ndjson' else None
+    failed = 0
+
+    def show(result):
+        nonlocal failed
+        failed += not result.ok
+        if writer is not None:
+            writer.write(result)
+        elif args.command == 'query':
+            _print_server(result, out)
+        else:
+            _print_row(result, out)
+
+    async def run():
+        targets = await _collect_targets(args)
+        scanner = _scanner(args)
+        if getattr(args, 'deadline', None) is None:
+            async for result in scanner.scan(targets):
+                show(result)
+            return
+
+        # Answers within the deadline first, then the stragglers
+        partial = await scanner.scan_deadline(targets, args.deadline)
+        for result in partial.results:
+            if not result.pending:
+                show(result)
+        async for result in partial.late():
+            show(result)
+
+    if args.command == 'scan' and args.processes > 1:
+        unsupported = [
+            option for option, value in (
+                ('--deadline', args.deadline),
+                ('--health', args.health),
+                ('--state', args.state)
+            ) if value is not None
+        ]
+        if unsupported:
+            raise SystemExit(
+                f'{", ".join(unsupported)} can not be used with --processes'
+            )
+
+        # Worker processes parse in parallel; results arrive in order
+        targets = asyncio.run(_collect_targets(args))
+        scanner = ShardedScanner(
+            processes=args.processes,
+            flags=args.flags,
+            timeout=args.timeout,
+            concurrency=args.concurrency,
+            retries=args.retries,
+            rate=args.rate,
+            engine=args.engine,
+            validate=args.validate
+        )
+        for result in scanner.scan(targets):
+            failed += not result.ok
+            if writer is not None:
+                writer.write(result)
+            else:
+                _print_row(result, out)
+    else:
+        asyncio.run(run())
+
+    return 1 if failed and args.command == 'query' else 0
+
+
+def _percentile(values: list, q: float) -> float:
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def cmd_bench(args) -> int:
+    async def run():
+        local = None
+        if args.local:
+            local = Responder.synthetic(
+                args.local, seed=0, loss=args.loss, latency=args.latency
+            )
+            targets = await local.start(multiplex=args.multiplex)
+        else:
+            targets = await _collect_targets(args)
+
+        metrics = Metrics()
+        scanner = _scanner(args, metrics)
+        latencies = []
+        started = time.perf_counter()
+        try:
+            for i in range(args.rounds):
+                for result in await scanner.scan_all(targets):
+                    if result.latency is not None:
+                        latencies.append(result.latency)
+        finally:
+            if local is not None:
+                local.close()
+        return targets, metrics, latencies, time.perf_counter() - started
+
+    targets, metrics, latencies, elapsed = asyncio.run(run())
+    counters = metrics.counters
+    responses = counters['responses']
+    processing = metrics.phases['decode'].sum + metrics.phases['parse'].sum
+    latencies.sort()
+
+    report = {
+        'targets': len(targets),
+        'rounds': args.rounds,
+        'seconds': elapsed,
+        'packets_per_sec': (counters['queries'] + responses) / elapsed,
+        'responses_per_sec': responses / elapsed,
+        'parse_us_per_response': (
+            processing / responses * 1e6 if responses else None
+        ),
+        'loss': (
+            1 - responses / counters['queries'] if counters['queries'] else None
+        ),
+        'timeouts': counters['timeouts'],
+        'latency_ms': {
+            f'p{int(q * 100)}': (
+                _percentile(latencies, q) * 1000 if latencies else None
+            )
+            for q in (0.5, 0.9, 0.99)
+        },
+        'counters': counters
+    }
+
+    if args.format == 'ndjson':
+        print(json.dumps(report))
+    else:
+        for key, value in report.items():
+            print(f'{key:24} {value}')
+    return 0
+
+
+def cmd_serve(args) -> int:
+    async def run():
+        responder = Responder.synthetic(
+            args.servers, seed=args.seed, loss=args.loss,
+            latency=args.latency, deny_rate=args.deny_rate,
+            ban_rate=args.ban_rate
+        )
+        addresses = await responder.start(
+            args.host, args.port, args.multiplex
+        )
+        for address in sorted(set(address[:2] for address in addresses)):
+            print('%s:%d' % address, flush=True)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            responder.close()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='python -m pyzandronum',
+        description='Query and scan Zandronum servers.'
+    )
+    parser.add_argument('--version', action='version', version=__version__)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('targets', nargs='*', help='host[:port] targets')
+    common.add_argument('-f', '--file',
+                        help="file with one target per line ('-' for stdin)")
+    common.add_argument('--flags', type=parse_flags,
+                        default=enums.RequestFlags.default(),
+                        help="'default', 'all', a number or flag names")
+    common.add_argument('-c', '--concurrency', type=int, default=256)
+    common.add_argument('-t', '--timeout', type=float, default=3.0)
+    common.add_argument('-r', '--retries', type=int, default=1)
+    common.add_argument('--rate', type=float,
+                        help='limit new queries per second')
+    common.add_argument('--engine', action='store_true',
+                        help='use the zero-copy datagram engine')
+    common.add_argument('--validate', action='store_true',
+                        help='reject malformed responses early')
+    common.add_argument('--health', metavar='FILE',
+                        help='skip failing servers, keeping state in FILE')
+    common.add_argument('--state', metavar='FILE',
+                        help='save and restore scanner state (warm start)')
+    common.add_argument('--format', choices=('table', 'ndjson'),
+                        default='table')
+
+    query = commands.add_parser('query', parents=[common],
+                                help='query servers in detail')
+    query.set_defaults(func=cmd_query)
+
+    scan = commands.add_parser('scan', parents=[common],
+                               help='scan many servers, one line each')
+    scan.add_argument('--master', nargs='?',
+                      const='%s:%d' % master.MASTER_ADDRESS,
+                      help='also scan servers listed by the master server')
+    scan.add_argument('-p', '--processes', type=int, default=1,
+                      help='worker processes (results in target order)')
+    scan.add_argument('--deadline', type=float, metavar='SECONDS',
+                      help='print answers received within SECONDS first')
+    scan.add_argument('--nodes', metavar='NAME,...',
+                      help='scan only the share of --node among these nodes')
+    scan.add_argument('--node', help='name of this scanner node')
+    scan.set_defaults(func=cmd_query)
+
+    bench = commands.add_parser('bench', parents=[common],
+                                help='measure scan throughput')
+    bench.add_argument('--master', nargs='?',
+                       const='%s:%d' % master.MASTER_ADDRESS,
+                       help='benchmark against the master server list')
+    bench.add_argument('--local', type=int, metavar='N',
+                       help='benchmark against N local emulated servers')
+    bench.add_argument('--loss', type=float, default=0.0,
+                       help='packet loss of the local servers')
+    bench.add_argument('--latency', type=float, default=0.0,
+                       help='reply delay of the local servers in seconds')
+    bench.add_argument('--multiplex', action='store_true',
+                       help='serve the local servers on one port')
+    bench.add_argument('--rounds', type=int, default=3)
+    bench.set_defaults(func=cmd_bench)
+
+    serve = commands.add_parser('serve',
+                                help='run local emulated servers for testing')
+    serve.add_argument('-n', '--servers', type=int, default=1)
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=0,
+                       help='first port (default: ephemeral ports)')
+    serve.add_argument('--multiplex', action='store_true',
+                       help='serve all servers on one port, keyed by the '
+                            'request token (the server index)')
+    serve.add_argument('--seed', type=int, default=0)
+    serve.add_argument('--loss', type=float, default=0.0)
+    serve.add_argument('--latency', type=float, default=0.0)
+    serve.add_argument('--deny-rate', type=float, default=0.0)
+    serve.add_argument('--ban-rate', type=float, default=0.0)
+    serve.set_defaults(func=cmd_serve)
+
+    return parser
+
+
+def main(argv: list = None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
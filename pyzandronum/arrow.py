@@ -0,0 +1,281 @@
+"""
+Arrow/Parquet columnar export module for pyzandronum.
+
+Scan results are appended straight into column buffers and turned into
+two Arrow record batches at a time: a servers table, and a players
+table whose ``server_id`` refers to the row of the player's server.
+Map names, PWADs, IWADs, game modes and other repetitive strings are
+dictionary-encoded.
+
+:class:`ParquetWriter` writes the batches as Parquet row groups every
+``batch_size`` servers, so memory stays bounded however large the scan.
+
+Requires pyarrow (``pip install pyzandronum[arrow]``).
+"""
+
+import os
+
+from . import exceptions
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Server columns read from ``Server.query_dict``: (column, key, type)
+_SERVER_FIELDS = (
+    ('version', 'version', 'dictionary'),
+    ('hostname', 'hostname', 'string'),
+    ('map', 'map', 'dictionary'),
+    ('gamemode', 'gamemode', 'dictionary'),
+    ('maxclients', 'maxclients', 'uint8'),
+    ('maxplayers', 'maxplayers', 'uint8'),
+    ('numplayers', 'numplayers', 'uint8'),
+    ('pwads', 'pwads_list', 'dictionary_list'),
+    ('gamename', 'gamename', 'dictionary'),
+    ('iwad', 'iwad', 'dictionary'),
+    ('instagib', 'instagib', 'bool_'),
+    ('buckshot', 'buckshot', 'bool_'),
+    ('forcepassword', 'forcepassword', 'bool_'),
+    ('forcejoinpassword', 'forcejoinpassword', 'bool_'),
+    ('skill', 'skill', 'uint8'),
+    ('botskill', 'botskill', 'uint8'),
+    ('fraglimit', 'fraglimit', 'uint16'),
+    ('timelimit', 'timelimit', 'uint16'),
+    ('timelimit_left', 'timelimit_left', 'uint16'),
+    ('duellimit', 'duellimit', 'uint16'),
+    ('pointlimit', 'pointlimit', 'uint16'),
+    ('winlimit', 'winlimit', 'uint16'),
+    ('testing_server', 'testing_server', 'bool_'),
+    ('country', 'country', 'dictionary')
+)
+
+# Player columns read from ``Player.player_dict``
+_PLAYER_FIELDS = (
+    ('name', 'name', 'string'),
+    ('score', 'score', 'int32'),
+    ('ping', 'ping', 'uint16'),
+    ('spectator', 'spectator', 'bool_'),
+    ('bot', 'bot', 'bool_'),
+    ('team', 'team', 'uint8'),
+    ('time', 'time', 'uint8')
+)
+
+_schemas = None
+
+
+def _require() -> None:
+    if pyarrow is None:
+        raise ImportError(
+            'Arrow export requires pyarrow; '
+            'install it with "pip install pyzandronum[arrow]"'
+        )
+
+
+def _type(name: str):
+    if name == 'dictionary':
+        return pyarrow.dictionary(pyarrow.int32(), pyarrow.string())
+    if name == 'dictionary_list':
+        return pyarrow.list_(_type('dictionary'))
+    return getattr(pyarrow, name)()
+
+
+def schemas() -> tuple:
+    """Returns the Arrow schemas of the servers and players tables."""
+    global _schemas
+
+    _require()
+    if _schemas is None:
+        servers = pyarrow.schema([
+            ('server_id', pyarrow.uint32()),
+            ('address', pyarrow.string()),
+            ('port', pyarrow.uint16()),
+            ('latency', pyarrow.float64()),
+            ('error', _type('dictionary'))
+        ] + [
+            (column, _type(kind)) for column, key, kind in _SERVER_FIELDS
+        ])
+        players = pyarrow.schema([
+            ('server_id', pyarrow.uint32())
+        ] + [
+            (column, _type(kind)) for column, key, kind in _PLAYER_FIELDS
+        ])
+        _schemas = (servers, players)
+
+    return _schemas
+
+
+class RecordBatchBuilder:
+    """
+    Buffers servers or scan results as columns and builds Arrow record
+    batches from them. Server ids count up from ``first_id``.
+    """
+
+    def __init__(self, first_id: int = 0) -> None:
+        _require()
+        self.next_id: int = first_id
+        self._reset()
+
+    def _reset(self) -> None:
+        servers, players = schemas()
+        self._servers = {name: [] for name in servers.names}
+        self._players = {name: [] for name in players.names}
+
+    def __len__(self) -> int:
+        """Returns the number of buffered servers."""
+        return len(self._servers['server_id'])
+
+    def append(self, item) -> int:
+        """Buffers one server or scan result; returns its server id."""
+        server = getattr(item, 'server', item)
+        error = getattr(item, 'error', None)
+        if server is not None:
+            # Extended fields are decoded on first access; a broken
+            # section makes the server count as malformed
+            try:
+                server._decode_lazy()
+            except exceptions.MalformedResponse as e:
+                server, error = None, e
+        server_id = self.next_id
+        self.next_id += 1
+
+        columns = self._servers
+        columns['server_id'].append(server_id)
+        columns['address'].append(item.address)
+        columns['port'].append(item.port)
+        columns['latency'].append(getattr(item, 'latency', None))
+        columns['error'].append(
+            type(error).__name__ if error is not None else None
+        )
+
+        if server is None:
+            for column, key, kind in _SERVER_FIELDS:
+                columns[column].append(None)
+            return server_id
+
+        query = server.query_dict
+        for column, key, kind in _SERVER_FIELDS:
+            value = query.get(key)
+            if kind == 'dictionary' and value is not None:
+                value = getattr(value, 'name', value)
+            columns[column].append(value)
+
+        players = self._players
+        ids = players['server_id']
+        for player in server.players:
+            ids.append(server_id)
+            player_dict = player.player_dict
+            for column, key, kind in _PLAYER_FIELDS:
+                players[column].append(player_dict.get(key))
+
+        return server_id
+
+    def build(self) -> tuple:
+        """
+        Returns the buffered ``(servers, players)`` record batches and
+        empties the buffers.
+        """
+        servers, players = schemas()
+        batches = (
+            pyarrow.RecordBatch.from_arrays(
+                [
+                    pyarrow.array(self._servers[field.name], type=field.type)
+                    for field in servers
+                ],
+                schema=servers
+            ),
+            pyarrow.RecordBatch.from_arrays(
+                [
+                    pyarrow.array(self._players[field.name], type=field.type)
+                    for field in players
+                ],
+                schema=players
+            )
+        )
+        self._reset()
+        return batches
+
+
+def record_batches(items, batch_size: int = 65536):
+    """
+    Yields ``(servers, players)`` record batches of at most
+    ``batch_size`` servers from an iterable of servers or scan results.
+    """
+    builder = RecordBatchBuilder()
+    for item in items:
+        builder.append(item)
+        if len(builder) >= batch_size:
+            yield builder.build()
+    if len(builder):
+        yield builder.build()
+
+
+class ParquetWriter:
+    """
+    Writes servers or scan results to ``servers.parquet`` and
+    ``players.parquet`` in the ``path`` directory, one row group every
+    ``batch_size`` servers. Close it to finish the files.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        batch_size: int = 16384,
+        compression: str = 'zstd'
+    ) -> None:
+        _require()
+        self.path: str = path
+        self.batch_size: int = batch_size
+
+        os.makedirs(path, exist_ok=True)
+        servers, players = schemas()
+        self._builder = RecordBatchBuilder()
+        self._servers = pyarrow.parquet.ParquetWriter(
+            os.path.join(path, 'servers.parquet'), servers,
+            compression=compression
+        )
+        self._players = pyarrow.parquet.ParquetWriter(
+            os.path.join(path, 'players.parquet'), players,
+            compression=compression
+        )
+
+    def __enter__(self) -> "ParquetWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    @property
+    def records(self) -> int:
+        """Returns the number of servers written so far."""
+        return self._builder.next_id
+
+    def write(self, item) -> None:
+        """Writes one server or scan result."""
+        self._builder.append(item)
+        if len(self._builder) >= self.batch_size:
+            self.flush()
+
+    def write_all(self, items) -> None:
+        """Writes every server or scan result of an iterable."""
+        for item in items:
+            self.write(item)
+
+    def flush(self) -> None:
+        """Writes the buffered servers out as a row group."""
+        if not len(self._builder):
+            return
+        servers, players = self._builder.build()
+        self._servers.write_batch(servers)
+        self._players.write_batch(players)
+
+    def close(self) -> None:
+        """Flushes and closes both files."""
+        if self._servers is None:
+            return
+        self.flush()
+        self._servers.close()
+        self._players.close()
+        self._servers = None
+        self._players = None
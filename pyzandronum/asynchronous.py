@@ -1,11 +1,13 @@
-import struct
-import time
+import asyncio
 
 from . import zandronum
 from . import enums
 from . import huffman
 from . import asyncudp
 from .player import Player
+from .capture import CaptureWriter
+from .metrics import Metrics, NULL_TIMER
+from .resolver import Resolver, get_resolver
 
 
 class AsyncServer(zandronum.Server):
@@ -13,7 +15,12 @@ class AsyncServer(zandronum.Server):
         self,
         address: str,
         port: int = 10666,
-        flags: enums.RequestFlags = enums.RequestFlags.default()
+        flags: enums.RequestFlags = enums.RequestFlags.default(),
+        capture: CaptureWriter = None,
+        metrics: Metrics = None,
+        timeout: float = None,
+        resolver: Resolver = None,
+        validate: bool = False
     ) -> None:
         self.address: str = address
         self.port: int = port
@@ -45,16 +52,33 @@ class AsyncServer(zandronum.Server):
             'duellimit': None,
             'pointlimit': None,
             'winlimit': None,
-            'numplayers': None
+            'numplayers': None,
+            'teamdamage': None,
+            'team_count': None,
+            'team_names': None,
+            'team_colors': None,
+            'team_scores': None,
+            'extended_flags': None,
+            'pwad_hashes': None,
+            'country': None,
+            'gamemode_name': None,
+            'gamemode_shortname': None,
+            'voicechat': None
         }
         self.players: list[Player] = []
 
-        self._huffman = huffman.Huffman(huffman.HUFFMAN_FREQS)
+        self._huffman = huffman.get_codec()
         self._sock: asyncudp.Socket = None
+        self._capture = capture
+        self._metrics = metrics
+        self._timeout = timeout
+        self._resolver = resolver or get_resolver()
+        self._validate: bool = validate
         self._request_flags: int = flags.value
         self._buffsize: int = 8192
         self._bytepos: int = 0
         self._raw_data: bytes = b''
+        self._lazy: list = []
 
     async def __aenter__(self) -> "AsyncServer":
         await self.query()
@@ -67,24 +91,41 @@ class AsyncServer(zandronum.Server):
         """
         Asynchronous requests server query to fetch server infomation.
         """
-        # Launcher challenge
-        request = struct.pack('l', 199)
-        # Desired information
-        request += struct.pack('l', self._request_flags)
-        # Current time, this will be sent back to you so you can determine ping
-        request += struct.pack('l', int(time.time()))
+        # Launcher challenge, desired information and current time
+        request = zandronum.build_request(self._request_flags)
+
+        # Resolve through the cache; the connected socket then only
+        # accepts replies from the resolved address
+        addr = await self._resolver.resolve_async(self.address, self.port)
+
+        metrics = self._metrics
+        timer = NULL_TIMER if metrics is None else metrics.timer()
 
         # Compress query request with the Huffman algorithm
         request_encoded = self._huffman.encode(request)
+        timer.mark('encode')
 
         # Send the query request to Zandronum server
         self._sock = await asyncudp.create_socket(
-            remote_addr=(self.address, self.port)
+            remote_addr=addr
         )
-        self._sock.sendto(request_encoded)
-        data, server = await self._sock.recvfrom()
-        self._raw_data = self._huffman.decode(data)
-        self._sock.close()
+        try:
+            self._sock.sendto(request_encoded)
+            timer.mark('send')
+            if metrics is not None:
+                metrics.inc('queries')
+                metrics.inc('bytes_out', len(request_encoded))
+
+            try:
+                data, server = await asyncio.wait_for(
+                    self._sock.recvfrom(), self._timeout
+                )
+            except asyncio.TimeoutError:
+                if metrics is not None:
+                    metrics.inc('timeouts')
+                raise
+            timer.mark('wait')
+        finally:
+            self._sock.close()
 
-        # Calling method for parsing server query response
-        self._parse()
+        self._handle_response(data, server, timer)
@@ -3,6 +3,8 @@ Asynchronous UDP module for pyzandronum.
 """
 
 import asyncio
+import socket
+import time
 
 
 class ClosedError(Exception):
@@ -20,7 +22,12 @@ class SocketProtocol:
         self._packets.put_nowait(None)
 
     def datagram_received(self, data, addr):
-        self._packets.put_nowait((data, addr))
+        self._packets.put_nowait((data, addr, time.perf_counter()))
+
+    def error_received(self, exc):
+        # ICMP errors (e.g. port unreachable) are not fatal for UDP,
+        # missing replies are handled by timeouts instead
+        pass
 
     async def recvfrom(self):
         return await self._packets.get()
@@ -48,6 +55,11 @@ class Socket:
         """Receive a UDP packet.
         Raises ClosedError on connection error, often by calling the close()
         method from another task."""
+        return (await self.recvfrom_timed())[:2]
+
+    async def recvfrom_timed(self):
+        """Receive a UDP packet like :meth:`recvfrom`, along with the
+        :func:`time.perf_counter` time at which it arrived."""
         packet = await self._protocol.recvfrom()
 
         if packet is None:
@@ -66,12 +78,22 @@ class Socket:
         self.close()
 
 
-async def create_socket(local_addr=None, remote_addr=None):
-    """Create a UDP socket with given local and remote addresses."""
+async def create_socket(local_addr=None, remote_addr=None, rcvbuf=None):
+    """Create a UDP socket with given local and remote addresses.
+    With ``rcvbuf``, the socket's receive buffer is enlarged to that many
+    bytes (up to the system limit), so bursts of replies are not dropped."""
     loop = asyncio.get_running_loop()
     transport, protocol = await loop.create_datagram_endpoint(
         SocketProtocol,
         local_addr=local_addr,
         remote_addr=remote_addr
     )
+    if rcvbuf is not None:
+        try:
+            transport.get_extra_info('socket').setsockopt(
+                socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf
+            )
+        except OSError:
+            # The system limit applies, which is fine
+            pass
     return Socket(transport, protocol)
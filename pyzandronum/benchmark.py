@@ -0,0 +1,300 @@
+"""
+Benchmark suite for pyzandronum hot paths.
+
+Measures Huffman encoding/decoding (per packet and batched), server and
+player parsing on synthetic packets of different sizes, plus an
+end-to-end scan against a loopback :class:`~pyzandronum.responder.Responder`. Results are written
+as JSON so they can be compared between versions::
+
+    python -m pyzandronum.benchmark -o before.json
+    python -m pyzandronum.benchmark -o after.json --compare before.json
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+from . import __version__
+from . import enums
+from . import huffman
+from . import responder
+from . import zandronum
+from .asynchronous import AsyncServer
+from .player import Player
+
+# Packet profiles: (min players, max players), (min PWADs, max PWADs)
+PACKET_PROFILES = {
+    'small': ((0, 0), (0, 0)),
+    'typical': ((8, 8), (2, 2)),
+    'full': ((64, 64), (6, 6))
+}
+
+# Packets per call of the batch decoding benchmarks
+BATCH_SIZE = 2000
+
+
+def generate_packets(profile: str, count: int = 16, seed: int = 0) -> list:
+    """
+    Generates ``count`` raw (not Huffman-encoded) server responses
+    for the named profile with default request flags.
+    """
+    players, pwads = PACKET_PROFILES[profile]
+    rng = random.Random(seed)
+    flags = enums.RequestFlags.default().value
+
+    packets = []
+    for i in range(count):
+        state = responder.generate_state(
+            rng,
+            players=players,
+            pwads=pwads,
+            gamemode=enums.Gamemode.TEAMPLAY if i % 2 else None
+        )
+        packets.append(responder.build_response(state, flags, i))
+
+    return packets
+
+
+def measure(func, args_list: list, min_time: float = 0.5) -> dict:
+    """
+    Calls ``func`` on every item of ``args_list`` in rounds until
+    ``min_time`` seconds have passed. Returns operations per second,
+    mean microseconds per call and peak allocated bytes per call.
+    """
+    # Warm up once, which also catches errors before timing
+    for args in args_list:
+        func(*args)
+
+    calls = 0
+    started = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_time:
+        for args in args_list:
+            func(*args)
+        calls += len(args_list)
+        elapsed = time.perf_counter() - started
+
+    # Allocations are traced separately, as tracing slows calls down
+    peak = 0
+    tracemalloc.start()
+    for args in args_list:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        func(*args)
+        peak = max(peak, tracemalloc.get_traced_memory()[1] - base)
+    tracemalloc.stop()
+
+    return {
+        'ops_per_sec': calls / elapsed,
+        'us_per_op': elapsed / calls * 1e6,
+        'alloc_peak_bytes': peak
+    }
+
+
+def _decode_loop(codec: huffman.Huffman, packets: list) -> None:
+    for packet in packets:
+        codec.decode(packet)
+
+
+def _parse(server: zandronum.Server, raw: bytes) -> None:
+    server._raw_data = raw
+    server._parse()
+
+
+def _parse_players(raw: bytes, start: int, count: int, teamgame: bool) -> None:
+    pos = start
+    for i in range(count):
+        pos = Player(raw, pos, teamgame)._bytepos
+
+
+def bench_codec(min_time: float = 0.5) -> dict:
+    """Benchmarks Huffman encoding and decoding per packet profile."""
+    codec = huffman.get_codec()
+    results = {}
+
+    for profile in PACKET_PROFILES:
+        packets = generate_packets(profile)
+        encoded = [codec.encode(packet) for packet in packets]
+        results[f'huffman_encode[{profile}]'] = measure(
+            codec.encode, [(packet,) for packet in packets], min_time
+        )
+        results[f'huffman_decode[{profile}]'] = measure(
+            codec.decode, [(packet,) for packet in encoded], min_time
+        )
+
+    # Many typical responses, decoded one by one and in one batch
+    encoded = [
+        codec.encode(packet)
+        for packet in generate_packets('typical', BATCH_SIZE)
+    ]
+    results[f'huffman_decode_loop[typical x{BATCH_SIZE}]'] = measure(
+        _decode_loop, [(codec, encoded)], min_time
+    )
+    results[f'huffman_decode_batch[typical x{BATCH_SIZE}]'] = measure(
+        codec.decode_many, [(encoded,)], min_time
+    )
+
+    return results
+
+
+def bench_parser(min_time: float = 0.5) -> dict:
+    """Benchmarks server and player parsing per packet profile."""
+    results = {}
+    server = zandronum.Server('127.0.0.1')
+
+    for profile in PACKET_PROFILES:
+        packets = generate_packets(profile)
+        results[f'server_parse[{profile}]'] = measure(
+            _parse, [(server, packet) for packet in packets], min_time
+        )
+
+        # Locate player data by parsing each packet once
+        player_args = []
+        for packet in packets:
+            _parse(server, packet)
+            if server.players:
+                player_args.append((
+                    packet,
+                    server.players[0]._bytestartpos,
+                    len(server.players),
+                    server.query_dict['teamgame']
+                ))
+        if player_args:
+            results[f'player_parse[{profile}]'] = measure(
+                _parse_players, player_args, min_time
+            )
+
+    return results
+
+
+async def _scan(addresses: list, concurrency: int) -> tuple:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    failures = 0
+
+    async def query(address):
+        nonlocal failures
+        async with semaphore:
+            server = AsyncServer(*address)
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(server.query(), 2.0)
+            except Exception:
+                failures += 1
+            else:
+                latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(query(address) for address in addresses))
+    return latencies, failures
+
+
+def bench_scan(servers: int = 500, concurrency: int = 128) -> dict:
+    """
+    Benchmarks an end-to-end scan of ``servers`` emulated servers
+    on the loopback interface.
+    """
+    async def run():
+        async with responder.Responder.synthetic(servers, seed=0) as local:
+            started = time.perf_counter()
+            latencies, failures = await _scan(local.addresses, concurrency)
+            elapsed = time.perf_counter() - started
+        return latencies, failures, elapsed
+
+    latencies, failures, elapsed = asyncio.run(run())
+    latencies.sort()
+
+    def percentile(q):
+        if not latencies:
+            return None
+        index = min(len(latencies) - 1, int(q * len(latencies)))
+        return latencies[index] * 1000
+
+    return {
+        'e2e_scan': {
+            'servers': servers,
+            'concurrency': concurrency,
+            'servers_per_sec': servers / elapsed,
+            'failures': failures,
+            'latency_p50_ms': percentile(0.50),
+            'latency_p99_ms': percentile(0.99)
+        }
+    }
+
+
+def run(min_time: float = 0.5, scan_servers: int = 500) -> dict:
+    """Runs the whole benchmark suite and returns the results."""
+    benchmarks = {}
+    benchmarks.update(bench_codec(min_time))
+    benchmarks.update(bench_parser(min_time))
+    if scan_servers:
+        benchmarks.update(bench_scan(scan_servers))
+
+    return {
+        'version': __version__,
+        'python': sys.version.split()[0],
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'timestamp': time.time(),
+        'benchmarks': benchmarks
+    }
+
+
+def compare(old: dict, new: dict) -> list:
+    """
+    Returns ``(name, old ops/sec, new ops/sec, ratio)`` for benchmarks
+    present in both results.
+    """
+    rows = []
+    for name, result in new['benchmarks'].items():
+        previous = old['benchmarks'].get(name)
+        if previous is None or 'ops_per_sec' not in result:
+            continue
+        rows.append((
+            name,
+            previous['ops_per_sec'],
+            result['ops_per_sec'],
+            result['ops_per_sec'] / previous['ops_per_sec']
+        ))
+    return rows
+
+
+def main(argv: list = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog='python -m pyzandronum.benchmark',
+        description='Benchmark pyzandronum codec, parser and scanner.'
+    )
+    parser.add_argument('-o', '--output', help='write JSON results here')
+    parser.add_argument('--compare', help='previous JSON results to compare')
+    parser.add_argument('--min-time', type=float, default=0.5)
+    parser.add_argument('--scan-servers', type=int, default=500,
+                        help='emulated servers for the scan (0 to skip)')
+    args = parser.parse_args(argv)
+
+    results = run(args.min_time, args.scan_servers)
+
+    for name, result in results['benchmarks'].items():
+        if 'ops_per_sec' in result:
+            print(f'{name:32} {result["ops_per_sec"]:12.1f} ops/s '
+                  f'{result["us_per_op"]:10.1f} us '
+                  f'{result["alloc_peak_bytes"]:8d} B')
+        else:
+            print(name, json.dumps(result))
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as fp:
+            old = json.load(fp)
+        for name, before, after, ratio in compare(old, results):
+            print(f'{name:32} {before:12.1f} -> {after:12.1f} ({ratio:.2f}x)')
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as fp:
+            json.dump(results, fp, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+"""
+Raw datagram capture module for pyzandronum.
+
+Capture files are append-only and hold every raw (still Huffman-encoded)
+server response together with the time it was received and the address
+it came from. They can be replayed offline through the same decoding and
+parsing code that is used for live queries.
+
+File layout::
+
+    header:  b'PZCAP' + format version (3 bytes)
+    record:  timestamp (float64), port (uint16), address length (uint8),
+             data length (uint16), address (ascii), data
+"""
+
+import mmap
+import os
+import struct
+import time
+
+from . import zandronum
+
+CAPTURE_MAGIC = b'PZCAP\x00\x00\x01'
+
+_RECORD_HEADER = struct.Struct('<dHBH')
+
+
+class CaptureError(Exception):
+    """
+    Raises when a file is not a valid pyzandronum capture file.
+    """
+
+
+class CaptureWriter:
+    """
+    Appends raw server responses to a capture file.
+    """
+
+    def __init__(self, path: str, buffering: int = 65536) -> None:
+        self.path: str = path
+        self.records: int = 0
+
+        self._fp = open(path, 'ab', buffering=buffering)
+
+        # Write a header only when starting a new file
+        if self._fp.tell() == 0:
+            self._fp.write(CAPTURE_MAGIC)
+
+    def __enter__(self) -> "CaptureWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def write(
+        self,
+        data: bytes,
+        addr: tuple,
+        timestamp: float = None
+    ) -> None:
+        """
+        Appends one raw datagram received from ``addr``.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+
+        address = addr[0].encode('ascii')
+
+        self._fp.write(_RECORD_HEADER.pack(
+            timestamp, addr[1], len(address), len(data)
+        ))
+        self._fp.write(address)
+        self._fp.write(data)
+        self.records += 1
+
+    def flush(self) -> None:
+        """Flushes buffered records to the file."""
+        self._fp.flush()
+
+    def close(self) -> None:
+        """Flushes and closes the capture file."""
+        if not self._fp.closed:
+            self._fp.close()
+
+
+class CaptureReader:
+    """
+    Memory-maps a capture file for fast sequential reading.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path: str = path
+
+        self._fp = open(path, 'rb')
+        self._map = None
+
+        if os.fstat(self._fp.fileno()).st_size > 0:
+            self._map = mmap.mmap(
+                self._fp.fileno(), 0, access=mmap.ACCESS_READ
+            )
+
+        if self._map is None or self._map[:8] != CAPTURE_MAGIC:
+            self.close()
+            raise CaptureError(f'{path!r} is not a capture file')
+
+    def __enter__(self) -> "CaptureReader":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def __iter__(self):
+        return self.records()
+
+    def records(self):
+        """
+        Yields ``(timestamp, (address, port), data)`` for every record.
+        A truncated record at the end of the file (e.g. after a crash
+        while writing) is ignored.
+        """
+        buf = self._map
+        size = len(buf)
+        pos = len(CAPTURE_MAGIC)
+        header_size = _RECORD_HEADER.size
+        unpack_from = _RECORD_HEADER.unpack_from
+
+        while pos + header_size <= size:
+            timestamp, port, addr_len, data_len = unpack_from(buf, pos)
+            pos += header_size
+
+            end = pos + addr_len + data_len
+            if end > size:
+                break
+
+            address = buf[pos:pos + addr_len].decode('ascii')
+            data = buf[pos + addr_len:end]
+            pos = end
+
+            yield timestamp, (address, port), data
+
+    def replay(self, server_class: type = None):
+        """
+        Decodes and parses every record without touching the network.
+        Yields ``(timestamp, server)`` for each successfully parsed
+        response and ``(timestamp, exception)`` for failed ones.
+        """
+        if server_class is None:
+            server_class = zandronum.Server
+
+        for timestamp, (address, port), data in self.records():
+            server = server_class(address, port)
+            try:
+                server.parse_response(data)
+            except Exception as e:
+                yield timestamp, e
+            else:
+                yield timestamp, server
+
+    def close(self) -> None:
+        """Closes the underlying memory map and file."""
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._fp.close()
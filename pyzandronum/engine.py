@@ -0,0 +1,190 @@
+"""
+Low-level datagram engine for pyzandronum.
+
+:class:`DatagramEngine` is a non-blocking UDP socket driven directly by
+the event loop's readiness callbacks instead of a protocol and queue.
+Every wakeup drains all pending datagrams with ``recvfrom_into`` into a
+preallocated ring of buffers and hands out ``memoryview`` slices, so no
+buffer is allocated per received packet.
+"""
+
+import asyncio
+import socket
+import time
+
+
+class DatagramEngine:
+    """
+    Non-blocking UDP socket with a reusable receive buffer ring.
+
+    ``on_datagram(view, addr)`` is called for every received datagram.
+    ``view`` is a memoryview into the ring and stays valid only until
+    ``ring_size`` more datagrams have been received; copy it (or decode
+    it, which copies) if it must be kept longer. During the call,
+    ``received_at`` is the :func:`time.perf_counter` time at which the
+    socket was drained, before any of the datagrams were handled.
+    """
+
+    def __init__(
+        self,
+        on_datagram,
+        local_addr: tuple = ('0.0.0.0', 0),
+        ring_size: int = 256,
+        buffsize: int = 8192,
+        rcvbuf: int = 4 * 1024 * 1024
+    ) -> None:
+        self.local_addr: tuple = local_addr
+        self.ring_size: int = ring_size
+        self.buffsize: int = buffsize
+        self.stats = {
+            'received': 0,
+            'sent': 0,
+            'wakeups': 0,
+            'send_errors': 0,
+            'recv_errors': 0
+        }
+
+        self.received_at: float = None
+
+        self._on_datagram = on_datagram
+        self._rcvbuf = rcvbuf
+        self._ring = bytearray(ring_size * buffsize)
+        view = memoryview(self._ring)
+        self._slots = [
+            view[i * buffsize:(i + 1) * buffsize] for i in range(ring_size)
+        ]
+        self._slot = 0
+        self._sock: socket.socket = None
+        self._loop: asyncio.AbstractEventLoop = None
+
+    def __enter__(self) -> "DatagramEngine":
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def open(self) -> None:
+        """
+        Binds the socket and starts receiving on the running event loop.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.setblocking(False)
+        try:
+            self._sock.setsockopt(
+                socket.SOL_SOCKET, socket.SO_RCVBUF, self._rcvbuf
+            )
+        except OSError:
+            # The system limit applies, which is fine
+            pass
+        self._sock.bind(self.local_addr)
+        self._loop.add_reader(self._sock.fileno(), self._on_readable)
+
+    def close(self) -> None:
+        """Stops receiving and closes the socket."""
+        if self._sock is not None:
+            self._loop.remove_reader(self._sock.fileno())
+            self._sock.close()
+            self._sock = None
+
+    def getsockname(self) -> tuple:
+        """Get bound infomation."""
+        return self._sock.getsockname()
+
+    def _on_readable(self) -> None:
+        recvfrom_into = self._sock.recvfrom_into
+        on_datagram = self._on_datagram
+        slots = self._slots
+        ring_size = self.ring_size
+        slot = self._slot
+        received = 0
+
+        self.stats['wakeups'] += 1
+        self.received_at = time.perf_counter()
+
+        # Drain everything pending, but never more than one full ring,
+        # so views handed out in this wakeup are not overwritten
+        while received < ring_size:
+            view = slots[slot]
+            try:
+                nbytes, addr = recvfrom_into(view)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                # ICMP errors; missing replies are handled by timeouts.
+                # Stop here, so a lasting error can not spin this loop
+                self.stats['recv_errors'] += 1
+                break
+
+            slot += 1
+            if slot == ring_size:
+                slot = 0
+            received += 1
+            on_datagram(view[:nbytes], addr)
+
+        self._slot = slot
+        self.stats['received'] += received
+
+    def sendto(self, data: bytes, addr: tuple) -> bool:
+        """
+        Sends one datagram without blocking. Returns False if it could
+        not be sent (e.g. the socket buffer is full).
+        """
+        try:
+            self._sock.sendto(data, addr)
+        except OSError:
+            self.stats['send_errors'] += 1
+            return False
+
+        self.stats['sent'] += 1
+        return True
+
+    async def _writable(self) -> None:
+        future = self._loop.create_future()
+        fileno = self._sock.fileno()
+        self._loop.add_writer(fileno, future.set_result, None)
+        try:
+            await future
+        finally:
+            self._loop.remove_writer(fileno)
+
+    async def send_burst(
+        self,
+        packets,
+        rate: float = None,
+        burst: int = 64
+    ) -> int:
+        """
+        Sends pre-encoded ``(data, addr)`` packets in bursts of ``burst``.
+        With ``rate`` (packets per second) the bursts are paced to keep
+        to that rate. Waits for the socket to become writable when its
+        buffer is full. Returns the number of packets sent.
+        """
+        loop = self._loop
+        sendto = self._sock.sendto
+        started = loop.time()
+        sent = 0
+
+        for count, (data, addr) in enumerate(packets, 1):
+            while True:
+                try:
+                    sendto(data, addr)
+                except BlockingIOError:
+                    await self._writable()
+                    continue
+                except OSError:
+                    self.stats['send_errors'] += 1
+                else:
+                    sent += 1
+                break
+
+            if count % burst == 0:
+                delay = 0
+                if rate:
+                    delay = max(0, started + count / rate - loop.time())
+                # Also lets replies be received between bursts
+                await asyncio.sleep(delay)
+
+        self.stats['sent'] += sent
+        return sent
@@ -1,5 +1,12 @@
 import enum
 
+LAUNCHER_CHALLENGE = 199
+
+# Protocol limits enforced by validating parses
+MAX_PACKET_SIZE = 8192
+MAX_STRING_LENGTH = 1024
+MAX_PLAYERS = 64
+
 GAMEMODE_TEXT = [
     'Cooperative',
     'Survival Cooperative',
@@ -86,6 +93,10 @@ class RequestFlags(enum.Flag):
             self.SQF_LIMITS |
             self.SQF_NUMPLAYERS |
             self.SQF_PLAYERDATA |
+            self.SQF_TEAMINFO_NUMBER |
+            self.SQF_TEAMINFO_NAME |
+            self.SQF_TEAMINFO_COLOR |
+            self.SQF_TEAMINFO_SCORE |
             self.SQF_TESTING_SERVER |
             self.SQF_ALL_DMFLAGS |
             self.SQF_SECURITY_SETTINGS |
@@ -94,6 +105,36 @@ class RequestFlags(enum.Flag):
         )
 
 
+# Team info fields that are sent once per team, after the team count
+TEAMINFO_FIELDS = (
+    RequestFlags.SQF_TEAMINFO_NAME |
+    RequestFlags.SQF_TEAMINFO_COLOR |
+    RequestFlags.SQF_TEAMINFO_SCORE
+)
+
+
+class ExtendedFlags(enum.Flag):
+    """
+    Zandronum extended request flags, sent as a fourth request field
+    when ``SQF_EXTENDED_INFO`` is requested.
+    """
+
+    NONE = 0x0
+
+    SQF2_PWAD_HASHES = 0x00000001
+    SQF2_COUNTRY = 0x00000002
+    SQF2_GAMEMODE_NAME = 0x00000004
+    SQF2_GAMEMODE_SHORTNAME = 0x00000008
+    SQF2_VOICECHAT = 0x00000010
+
+    @classmethod
+    def all(self):
+        retval = self.NONE
+        for member in self.__members__.values():
+            retval |= member
+        return retval
+
+
 class Response(enum.Enum):
     """
     Zandronum magic accepted number responses.
@@ -128,3 +169,16 @@ class Gamemode(enum.Enum):
 
     def __str__(self):
         return GAMEMODE_TEXT[self.value]
+
+
+# Game modes in which players are split into teams
+TEAM_GAMEMODES = frozenset([
+    Gamemode.TEAMPLAY,
+    Gamemode.TEAMLMS,
+    Gamemode.TEAMPOSSESSION,
+    Gamemode.TEAMGAME,
+    Gamemode.CTF,
+    Gamemode.ONEFLAGCTF,
+    Gamemode.SKULLTAG,
+    Gamemode.DOMINATION
+])
@@ -24,3 +24,29 @@ class QueryBanned(QueryDenied):
 
     def __str__(self):
         return 'Query denied; Your IP was banned from this server.'
+
+
+class QueryTimeout(TimeoutError):
+    """
+    Raises when server did not respond to the query in time.
+    """
+
+    def __str__(self):
+        return 'Server did not respond to the query in time'
+
+
+class MalformedResponse(ValueError):
+    """
+    Raises when a server response is truncated or invalid. ``offset``
+    is the position in the decoded response where parsing stopped
+    (0 for packets rejected before decoding).
+    """
+
+    def __init__(self, reason: str = '', offset: int = 0) -> None:
+        super().__init__(reason, offset)
+        self.reason = reason
+        self.offset = offset
+
+    def __str__(self):
+        return f'Malformed server response at offset {self.offset}: ' \
+               f'{self.reason}'
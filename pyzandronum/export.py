@@ -0,0 +1,350 @@
+"""
+Streaming snapshot export module for pyzandronum.
+
+Writers accept :class:`~pyzandronum.zandronum.Server` objects or
+:class:`~pyzandronum.scanner.ScanResult` objects one at a time and write
+them out immediately, so exporting a large scan never holds the whole
+document in memory. Two formats are supported:
+
+* NDJSON, one JSON object per line (:class:`NDJSONWriter`)
+* A compact length-prefixed binary format (:class:`BinaryWriter`), read
+  back with :class:`BinaryReader`
+"""
+
+import enum
+import json
+import mmap
+import os
+import struct
+
+from . import enums
+from . import exceptions
+from . import zandronum
+
+BINARY_MAGIC = b'PZSNAP\x00\x01'
+
+# Value type tags of the binary format
+_T_NONE = 0
+_T_FALSE = 1
+_T_TRUE = 2
+_T_INT = 3
+_T_FLOAT = 4
+_T_STR = 5
+_T_LIST = 6
+_T_GAMEMODE = 7
+
+_LENGTH = struct.Struct('<I')
+_FLOAT = struct.Struct('<d')
+
+# Fields stored before the query values in every binary record
+_HEADER_FIELDS = (
+    'address', 'port', 'response', 'response_time', 'response_flags',
+    'latency', 'error'
+)
+
+
+class ExportError(Exception):
+    """
+    Raises when a snapshot file can not be read.
+    """
+
+
+def record(item) -> dict:
+    """
+    Returns the exported record of a server or scan result: the server's
+    snapshot plus ``latency`` and ``error`` (exception class name). A
+    server whose lazily decoded sections are broken is exported like
+    one that did not answer, with a ``MalformedResponse`` error.
+    """
+    server = getattr(item, 'server', item)
+    latency = getattr(item, 'latency', None)
+    error = getattr(item, 'error', None)
+
+    data = None
+    if server is not None:
+        try:
+            data = server.snapshot()
+        except exceptions.MalformedResponse as e:
+            error = e
+
+    if data is None:
+        data = {
+            'address': item.address,
+            'port': item.port,
+            'response': None,
+            'response_time': None,
+            'response_flags': None,
+            'query': {},
+            'players': []
+        }
+
+    data['latency'] = latency
+    data['error'] = type(error).__name__ if error is not None else None
+    return data
+
+
+def _json_default(value):
+    if isinstance(value, enum.Enum):
+        return value.name
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+class NDJSONWriter:
+    """
+    Writes one JSON object per server or scan result and line.
+    Enums are written by name.
+    """
+
+    def __init__(self, fp, flush: bool = False) -> None:
+        self.records: int = 0
+
+        self._fp = fp
+        self._flush = flush
+        self._encoder = json.JSONEncoder(
+            default=_json_default, ensure_ascii=False,
+            separators=(',', ':')
+        )
+
+    def write(self, item) -> None:
+        """Writes one server or scan result."""
+        self._fp.write(self._encoder.encode(record(item)))
+        self._fp.write('\n')
+        self.records += 1
+        if self._flush:
+            self._fp.flush()
+
+    def write_all(self, items) -> None:
+        """Writes every server or scan result of an iterable."""
+        for item in items:
+            self.write(item)
+
+
+def _pack_uvarint(out: bytearray, value: int) -> None:
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _pack_value(out: bytearray, value) -> None:
+    if value is None:
+        out.append(_T_NONE)
+    elif value is True:
+        out.append(_T_TRUE)
+    elif value is False:
+        out.append(_T_FALSE)
+    elif isinstance(value, enums.Gamemode):
+        out.append(_T_GAMEMODE)
+        out.append(value.value)
+    elif isinstance(value, int):
+        out.append(_T_INT)
+        # Zigzag encoding keeps small negative numbers short
+        _pack_uvarint(out, value << 1 if value >= 0 else (-value << 1) - 1)
+    elif isinstance(value, float):
+        out.append(_T_FLOAT)
+        out += _FLOAT.pack(value)
+    elif isinstance(value, str):
+        data = value.encode('utf-8', 'surrogateescape')
+        out.append(_T_STR)
+        _pack_uvarint(out, len(data))
+        out += data
+    elif isinstance(value, (list, tuple)):
+        out.append(_T_LIST)
+        _pack_uvarint(out, len(value))
+        for item in value:
+            _pack_value(out, item)
+    else:
+        raise TypeError(f'can not export {type(value).__name__} values')
+
+
+def _unpack_uvarint(buf, pos: int) -> tuple:
+    value = 0
+    shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def _unpack_value(buf, pos: int) -> tuple:
+    tag = buf[pos]
+    pos += 1
+
+    if tag == _T_STR:
+        length, pos = _unpack_uvarint(buf, pos)
+        end = pos + length
+        return bytes(buf[pos:end]).decode('utf-8', 'surrogateescape'), end
+    if tag == _T_INT:
+        value, pos = _unpack_uvarint(buf, pos)
+        return (value >> 1) ^ -(value & 1), pos
+    if tag == _T_NONE:
+        return None, pos
+    if tag == _T_TRUE:
+        return True, pos
+    if tag == _T_FALSE:
+        return False, pos
+    if tag == _T_GAMEMODE:
+        return enums.Gamemode(buf[pos]), pos + 1
+    if tag == _T_LIST:
+        length, pos = _unpack_uvarint(buf, pos)
+        items = []
+        for i in range(length):
+            item, pos = _unpack_value(buf, pos)
+            items.append(item)
+        return items, pos
+    if tag == _T_FLOAT:
+        return _FLOAT.unpack_from(buf, pos)[0], pos + 8
+
+    raise ExportError(f'unknown value tag {tag} at offset {pos - 1}')
+
+
+class BinaryWriter:
+    """
+    Writes servers or scan results as length-prefixed binary records.
+
+    The file starts with a header naming the query and player fields,
+    so records only hold values. ``query_keys`` and ``player_keys``
+    default to the keys of a fresh ``Server`` and ``Player``.
+    """
+
+    def __init__(
+        self,
+        fp,
+        query_keys: list = None,
+        player_keys: list = None
+    ) -> None:
+        self.records: int = 0
+        self.query_keys: list = query_keys or list(
+            zandronum.Server('0.0.0.0').query_dict
+        )
+        self.player_keys: list = player_keys or [
+            'name', 'score', 'ping', 'spectator', 'bot', 'team', 'time'
+        ]
+
+        self._fp = fp
+
+        header = bytearray(BINARY_MAGIC)
+        _pack_value(header, self.query_keys)
+        _pack_value(header, self.player_keys)
+        fp.write(_LENGTH.pack(len(header)))
+        fp.write(header)
+
+    def write(self, item) -> None:
+        """Writes one server or scan result."""
+        data = record(item)
+        query = data['query']
+        out = bytearray()
+
+        for key in _HEADER_FIELDS:
+            _pack_value(out, data[key])
+        for key in self.query_keys:
+            _pack_value(out, query.get(key))
+
+        _pack_uvarint(out, len(data['players']))
+        for player in data['players']:
+            for key in self.player_keys:
+                _pack_value(out, player.get(key))
+
+        self._fp.write(_LENGTH.pack(len(out)))
+        self._fp.write(out)
+        self.records += 1
+
+    def write_all(self, items) -> None:
+        """Writes every server or scan result of an iterable."""
+        for item in items:
+            self.write(item)
+
+
+class BinaryReader:
+    """
+    Memory-maps a binary snapshot file and reads its records.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path: str = path
+
+        self._fp = open(path, 'rb')
+        self._map = None
+        if os.fstat(self._fp.fileno()).st_size > 0:
+            self._map = mmap.mmap(
+                self._fp.fileno(), 0, access=mmap.ACCESS_READ
+            )
+
+        buf = self._map
+        if buf is None or buf[4:4 + len(BINARY_MAGIC)] != BINARY_MAGIC:
+            self.close()
+            raise ExportError(f'{path!r} is not a snapshot file')
+
+        pos = 4 + len(BINARY_MAGIC)
+        self.query_keys, pos = _unpack_value(buf, pos)
+        self.player_keys, pos = _unpack_value(buf, pos)
+        self._start = 4 + _LENGTH.unpack_from(buf, 0)[0]
+
+    def __enter__(self) -> "BinaryReader":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def __iter__(self):
+        return self.records()
+
+    def records(self):
+        """
+        Yields every record as a dict shaped like :func:`record`.
+        """
+        buf = self._map
+        size = len(buf)
+        pos = self._start
+        query_keys = self.query_keys
+        player_keys = self.player_keys
+        unpack_value = _unpack_value
+
+        while pos + 4 <= size:
+            length = _LENGTH.unpack_from(buf, pos)[0]
+            pos += 4
+            end = pos + length
+            if end > size:
+                raise ExportError(f'truncated record at offset {pos - 4}')
+
+            data = {}
+            for key in _HEADER_FIELDS:
+                data[key], pos = unpack_value(buf, pos)
+
+            query = {}
+            for key in query_keys:
+                query[key], pos = unpack_value(buf, pos)
+            data['query'] = query
+
+            count, pos = _unpack_uvarint(buf, pos)
+            players = []
+            for i in range(count):
+                player = {}
+                for key in player_keys:
+                    player[key], pos = unpack_value(buf, pos)
+                players.append(player)
+            data['players'] = players
+
+            pos = end
+            yield data
+
+    def servers(self):
+        """
+        Yields a ``Server`` for every record of a server that answered
+        the query. Records with an error, including denied queries, are
+        skipped; :meth:`records` still returns them.
+        """
+        accepted = enums.Response.ACCEPTED.value
+        for data in self.records():
+            if data['error'] is None and data['response'] == accepted:
+                yield zandronum.Server.from_snapshot(data)
+
+    def close(self) -> None:
+        """Closes the underlying memory map and file."""
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._fp.close()
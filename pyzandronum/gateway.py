@@ -0,0 +1,288 @@
+"""
+HTTP JSON gateway module for pyzandronum.
+
+:class:`Gateway` polls a fixed list of servers in the background and
+serves the latest results over HTTP as JSON, using only the standard
+library. HTTP requests never trigger queries: each server is queried at
+most once per poll interval, however many clients are asking.
+
+Endpoints::
+
+    GET /servers                    all servers (see filters below)
+    GET /servers/<address>:<port>   one server
+    GET /health                     poll status
+
+``/servers`` accepts ``gamemode`` (name, e.g. ``CTF``), ``map``,
+``iwad``, ``name`` (substring of the host name), ``min_players`` and
+``online`` (``1`` to hide servers that did not answer) filters.
+Responses carry an ``ETag`` and honor ``If-None-Match``.
+"""
+
+import asyncio
+import hashlib
+import json
+import re
+import time
+import urllib.parse
+
+from .export import record, _json_default
+from .scanner import Scanner
+
+_REASONS = {
+    200: 'OK',
+    304: 'Not Modified',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed'
+}
+
+# One entity tag of an If-None-Match list, weak or not, or '*'
+_ENTITY_TAG = re.compile(r'\s*(?:(?:W/)?("[^"]*")|(\*))\s*(?:,|$)')
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    # If-None-Match uses the weak comparison: W/"x" matches "x"
+    for match in _ENTITY_TAG.finditer(header):
+        if match.group(2) is not None or match.group(1) == etag:
+            return True
+    return False
+
+
+def _matches(data: dict, filters: dict) -> bool:
+    query = data['query']
+
+    if 'online' in filters and filters['online'] == '1':
+        if data['error'] is not None:
+            return False
+    if 'gamemode' in filters:
+        gamemode = query.get('gamemode')
+        if gamemode is None or gamemode.name != filters['gamemode'].upper():
+            return False
+    for key in ('map', 'iwad'):
+        if key in filters:
+            value = query.get(key) or ''
+            if value.lower() != filters[key].lower():
+                return False
+    if 'name' in filters:
+        if filters['name'].lower() not in (query.get('hostname') or '').lower():
+            return False
+    if 'min_players' in filters:
+        if (query.get('numplayers') or 0) < int(filters['min_players']):
+            return False
+    return True
+
+
+class Gateway:
+    """
+    Serves cached fleet state polled every ``interval`` seconds.
+    ``scanner`` defaults to a :class:`~.scanner.Scanner` without
+    retries, so every server gets at most one query per poll; a given
+    scanner sends its retries too.
+    """
+
+    def __init__(
+        self,
+        targets: list,
+        interval: float = 30.0,
+        scanner: Scanner = None,
+        host: str = '127.0.0.1',
+        port: int = 8080
+    ) -> None:
+        self.targets: list = list(targets)
+        self.interval: float = interval
+        self.scanner: Scanner = scanner or Scanner(retries=0)
+        self.host: str = host
+        self.port: int = port
+        self.polls: int = 0
+        self.last_poll: float = None
+        self.requests: int = 0
+
+        self._records: list = []
+        self._by_address: dict = {}
+        # Rendered (status, body, etag) per path and query string,
+        # except /health, cleared after every poll
+        self._responses: dict = {}
+        self._server = None
+        self._poller = None
+
+    async def __aenter__(self) -> "Gateway":
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        await self.close()
+
+    async def start(self) -> None:
+        """
+        Runs the first poll, then starts serving and polling.
+        """
+        await self.poll()
+        self._server = await asyncio.start_server(
+            self._handle, self.host, self.port
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._poller = asyncio.ensure_future(self._poll_forever())
+
+    async def close(self) -> None:
+        """Stops polling and serving."""
+        if self._poller is not None:
+            self._poller.cancel()
+            self._poller = None
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def poll(self) -> None:
+        """Queries all servers once and replaces the cached state."""
+        results = await self.scanner.scan_all(self.targets)
+        records = [record(result) for result in results]
+
+        self._records = records
+        self._by_address = {
+            f'{data["address"]}:{data["port"]}': data for data in records
+        }
+        self._responses = {}
+        self.polls += 1
+        self.last_poll = time.time()
+
+    async def _poll_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.poll()
+            except Exception:
+                # Keep serving the previous state
+                pass
+
+    def _render(self, target: str) -> tuple:
+        cached = self._responses.get(target)
+        if cached is not None:
+            return cached
+
+        url = urllib.parse.urlsplit(target)
+        path = url.path.rstrip('/')
+
+        if path == '/servers':
+            filters = dict(urllib.parse.parse_qsl(url.query))
+            try:
+                payload = [
+                    data for data in self._records if _matches(data, filters)
+                ]
+                status = 200
+            except ValueError:
+                payload = {'error': 'invalid filter'}
+                status = 400
+        elif path.startswith('/servers/'):
+            payload = self._by_address.get(urllib.parse.unquote(path[9:]))
+            status = 200
+            if payload is None:
+                payload = {'error': 'unknown server'}
+                status = 404
+        elif path == '/health':
+            payload = {
+                'polls': self.polls,
+                'last_poll': self.last_poll,
+                'servers': len(self._records)
+            }
+            if self.scanner.health is not None:
+                payload['circuits'] = dict(
+                    self.scanner.health.stats,
+                    open=len(self.scanner.health.open_servers())
+                )
+            status = 200
+        else:
+            payload = {'error': 'not found'}
+            status = 404
+
+        body = json.dumps(
+            payload, default=_json_default, ensure_ascii=False,
+            separators=(',', ':')
+        ).encode('utf-8')
+        etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+        rendered = (status, body, etag)
+
+        # Bursts of identical requests are served from memory until the
+        # next poll; the size bound guards against unique query strings.
+        # Health changes between polls, so it is always rendered afresh
+        if path != '/health' and len(self._responses) < 4096:
+            self._responses[target] = rendered
+        return rendered
+
+    async def _handle(self, reader, writer) -> None:
+        try:
+            while True:
+                try:
+                    request_line = await reader.readline()
+                    if not request_line:
+                        break
+
+                    headers = {}
+                    while True:
+                        line = await reader.readline()
+                        if line in (b'\r\n', b'\n', b''):
+                            break
+                        name, _, value = line.decode('latin-1').partition(':')
+                        headers[name.strip().lower()] = value.strip()
+                except ValueError:
+                    # A line longer than the stream limit
+                    self._respond(writer, 400, b'', None, False)
+                    await writer.drain()
+                    break
+
+                try:
+                    method, target, version = (
+                        request_line.decode('latin-1').split()
+                    )
+                except ValueError:
+                    self._respond(writer, 400, b'', None, False)
+                    break
+
+                self.requests += 1
+                keep_alive = (
+                    version == 'HTTP/1.1' and
+                    headers.get('connection', '').lower() != 'close'
+                )
+
+                if method not in ('GET', 'HEAD'):
+                    self._respond(writer, 405, b'', None, keep_alive)
+                else:
+                    status, body, etag = self._render(target)
+                    if status == 200 and _etag_matches(
+                        headers.get('if-none-match', ''), etag
+                    ):
+                        status, body = 304, b''
+                    self._respond(
+                        writer, status, body, etag, keep_alive,
+                        method == 'HEAD'
+                    )
+
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def _respond(
+        self,
+        writer,
+        status: int,
+        body: bytes,
+        etag: str,
+        keep_alive: bool,
+        head_only: bool = False
+    ) -> None:
+        head = [
+            f'HTTP/1.1 {status} {_REASONS[status]}',
+            'Content-Type: application/json; charset=utf-8',
+            f'Content-Length: {len(body)}',
+            'Connection: ' + ('keep-alive' if keep_alive else 'close'),
+            f'Cache-Control: max-age={int(self.interval)}'
+        ]
+        if etag is not None:
+            head.append(f'ETag: {etag}')
+        if head_only:
+            body = b''
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
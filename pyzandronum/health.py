@@ -0,0 +1,228 @@
+"""
+Server health tracking module for pyzandronum.
+
+:class:`HealthTracker` keeps a circuit breaker per server address.
+A server starts ``closed`` (queried normally). After
+``failure_threshold`` consecutive failures (timeouts, ban denials or
+malformed responses) its circuit opens and it is skipped until its probe
+interval has passed; then it is ``half-open`` and one query is let
+through as a probe. A successful probe closes the circuit again, a
+failed one reopens it with a probe interval ``multiplier`` times longer,
+up to ``max_interval``.
+
+Scanners given a tracker apply it automatically. The state can be saved
+to a JSON file and is loaded from it again on creation.
+"""
+
+import json
+import os
+import time
+
+from . import exceptions
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+# Errors counting as failures; other denials come from live servers
+FAILURES = (
+    exceptions.QueryTimeout,
+    exceptions.QueryBanned,
+    exceptions.MalformedResponse
+)
+
+
+class CircuitOpen(Exception):
+    """
+    Raises for servers skipped because their circuit is open.
+    """
+
+    def __str__(self):
+        return 'Server skipped after repeated failures'
+
+
+class ServerHealth:
+    """
+    Represents the circuit breaker state of one server.
+    """
+
+    __slots__ = ('state', 'failures', 'interval', 'next_probe', 'last_error')
+
+    def __init__(
+        self,
+        state: str = CLOSED,
+        failures: int = 0,
+        interval: float = 0.0,
+        next_probe: float = 0.0,
+        last_error: str = None
+    ) -> None:
+        self.state: str = state
+        # Consecutive failures
+        self.failures: int = failures
+        # Current probe interval in seconds, 0 while closed
+        self.interval: float = interval
+        # Time (time.time()) from which a probe is allowed
+        self.next_probe: float = next_probe
+        # Exception class name of the last failure
+        self.last_error: str = last_error
+
+    def __repr__(self) -> str:
+        return f'<ServerHealth {self.state} failures={self.failures}>'
+
+    def to_list(self) -> list:
+        return [
+            self.state, self.failures, self.interval, self.next_probe,
+            self.last_error
+        ]
+
+
+class HealthTracker:
+    """
+    Per-server circuit breakers, keyed by ``(ip, port)`` addresses.
+    With ``path``, the state is loaded from that file if it exists and
+    :meth:`save` writes it back.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 3,
+        base_interval: float = 60.0,
+        max_interval: float = 86400.0,
+        multiplier: float = 2.0,
+        path: str = None
+    ) -> None:
+        self.failure_threshold: int = failure_threshold
+        self.base_interval: float = base_interval
+        self.max_interval: float = max_interval
+        self.multiplier: float = multiplier
+        self.path: str = path
+        self.stats = {'skipped': 0, 'probes': 0, 'opened': 0, 'closed': 0}
+
+        self._servers: dict[tuple, ServerHealth] = {}
+        self._dirty = False
+
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+    def __len__(self) -> int:
+        return len(self._servers)
+
+    def get(self, addr: tuple) -> ServerHealth:
+        """Returns the health of a server (closed if unknown)."""
+        return self._servers.get(tuple(addr)) or ServerHealth()
+
+    def open_servers(self) -> list[tuple]:
+        """Returns the addresses of servers whose circuit is not closed."""
+        return [
+            addr for addr, health in self._servers.items()
+            if health.state != CLOSED
+        ]
+
+    def allow(self, addr: tuple, now: float = None) -> bool:
+        """
+        Returns True if a server should be queried now. An open circuit
+        whose probe interval has passed turns half-open and lets this
+        one query through; other queries are counted as skipped.
+        """
+        health = self._servers.get(addr)
+        if health is None or health.state == CLOSED:
+            return True
+
+        if now is None:
+            now = time.time()
+        if now >= health.next_probe:
+            # A probe lost without an outcome is retried after another
+            # interval
+            health.state = HALF_OPEN
+            health.next_probe = now + health.interval
+            self.stats['probes'] += 1
+            self._dirty = True
+            return True
+
+        # Open, or half-open with its probe still in flight
+        self.stats['skipped'] += 1
+        return False
+
+    def record(self, addr: tuple, error: Exception = None) -> None:
+        """Records the outcome of a query; ``error`` is None on success."""
+        if isinstance(error, FAILURES):
+            self.failure(addr, error)
+        else:
+            self.success(addr)
+
+    def success(self, addr: tuple) -> None:
+        """Records a response; closes the server's circuit."""
+        health = self._servers.pop(addr, None)
+        if health is not None:
+            self._dirty = True
+            if health.state != CLOSED:
+                self.stats['closed'] += 1
+
+    def failure(
+        self,
+        addr: tuple,
+        error: Exception = None,
+        now: float = None
+    ) -> None:
+        """Records a failure; may open the server's circuit."""
+        if now is None:
+            now = time.time()
+        health = self._servers.get(addr)
+        if health is None:
+            health = self._servers[addr] = ServerHealth()
+
+        health.failures += 1
+        if error is not None:
+            health.last_error = type(error).__name__
+        self._dirty = True
+
+        if health.state == HALF_OPEN:
+            # The probe failed, wait longer before the next one
+            health.interval = min(
+                health.interval * self.multiplier, self.max_interval
+            )
+        elif health.state == CLOSED:
+            if health.failures < self.failure_threshold:
+                return
+            health.interval = self.base_interval
+            self.stats['opened'] += 1
+        health.state = OPEN
+        health.next_probe = now + health.interval
+
+    def to_dict(self) -> dict:
+        """Returns the state as a JSON-serializable dict."""
+        return {
+            'servers': [
+                [addr[0], addr[1], *health.to_list()]
+                for addr, health in self._servers.items()
+            ],
+            'stats': dict(self.stats)
+        }
+
+    def from_dict(self, data: dict) -> None:
+        """Replaces the state with one returned by :meth:`to_dict`."""
+        self._servers = {
+            (ip, port): ServerHealth(*values)
+            for ip, port, *values in data['servers']
+        }
+        self.stats.update(data.get('stats', {}))
+        self._dirty = False
+
+    def load(self, path: str = None) -> None:
+        """Loads the state saved at ``path`` (default: :attr:`path`)."""
+        with open(path or self.path, encoding='utf-8') as fp:
+            self.from_dict(json.load(fp))
+
+    def save(self, path: str = None) -> None:
+        """
+        Saves the state to ``path`` (default: :attr:`path`) if it has
+        changed, replacing the file atomically.
+        """
+        path = path or self.path
+        if path is None or (path == self.path and not self._dirty):
+            return
+        temp = path + '.tmp'
+        with open(temp, 'w', encoding='utf-8') as fp:
+            json.dump(self.to_dict(), fp, separators=(',', ':'))
+        os.replace(temp, path)
+        self._dirty = False
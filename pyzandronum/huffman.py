@@ -45,6 +45,22 @@ HUFFMAN_FREQS = [
 ]
 
 
+_codec = None
+
+
+def get_codec() -> "Huffman":
+    """
+    Returns the shared Huffman codec built from :data:`HUFFMAN_FREQS`.
+    Building the tree is costly, so it is done only once per process.
+    """
+    global _codec
+
+    if _codec is None:
+        _codec = Huffman(HUFFMAN_FREQS)
+
+    return _codec
+
+
 class Huffman:
     """
     Python Huffman Encoder/Decoder for Zandronum (Skulltag)
@@ -57,6 +73,9 @@ class Huffman:
 
         self.__build_binary_tree()
         self.__binary_tree_to_lookup_table(self.huffman_tree)
+        self._max_code = max(len(code) for code in self.huffman_table)
+        # Byte-at-a-time decoding tables, built on first batch decode
+        self._byte_table = None
 
     def __build_binary_tree(self):
         """
@@ -149,12 +168,15 @@ class Huffman:
 
         return encoded_string
 
-    def decode(self, data_string):
+    def decode(self, data_string, limit: int = None):
         """
         Decode a huffman-coded string into a string.
+        Accepts any bytes-like object, e.g. a memoryview of a receive
+        buffer, and always returns bytes. With ``limit``, decoding stops
+        after that many bytes, e.g. to peek at a header.
         """
 
-        if type(data_string) is not bytes:
+        if not isinstance(data_string, (bytes, bytearray, memoryview)):
             raise ValueError('Must pass bytes to decode')
 
         # Obtain and remove the number of padding bits stored in the
@@ -167,7 +189,11 @@ class Huffman:
 
         # If the padding bit is set to 0xff the message is not encoded.
         if padding_length == 0xff:
-            return data_string
+            return bytes(data_string[:limit])
+
+        if limit is not None:
+            # Only convert the bytes that can hold ``limit`` codes
+            data_string = data_string[:(limit * self._max_code + 7) // 8 + 1]
 
         # Convert ascii string into binary string
         for byte in data_string:
@@ -184,8 +210,123 @@ class Huffman:
                 tree_node = tree_node[bit]
             else:
                 decoded_string += bytes([tree_node['asc']])
+                if limit is not None and len(decoded_string) == limit:
+                    return decoded_string
                 tree_node = self.huffman_tree[bit]
 
         decoded_string += bytes([tree_node['asc']])
 
         return decoded_string
+
+    def __build_byte_table(self):
+        """
+        Create the table used to decode a whole byte at a time.
+
+        Tree branches are numbered (the root is 0) and for every branch
+        and input byte the table holds the bytes completed by those 8
+        bits and the branch they end on. It is built from a 4-bit table
+        so that each entry is only composed once.
+        """
+
+        branches = []
+        numbers = {}
+        stack = [self.huffman_tree]
+        while stack:
+            branch = stack.pop()
+            if '0' in branch:
+                numbers[id(branch)] = len(branches)
+                branches.append(branch)
+                stack.append(branch['1'])
+                stack.append(branch['0'])
+
+        # (bytes completed, next branch) per branch and single bit
+        bit_table = []
+        for branch in branches:
+            for bit in '01':
+                child = branch[bit]
+                if '0' in child:
+                    bit_table.append((b'', numbers[id(child)]))
+                else:
+                    bit_table.append((bytes([child['asc']]), 0))
+        self._bit_table = bit_table
+
+        # The same per 4 bits, least significant bit first
+        nibble_table = []
+        for state in range(len(branches)):
+            for nibble in range(16):
+                output = b''
+                current = state
+                for i in range(4):
+                    completed, current = bit_table[
+                        current * 2 + ((nibble >> i) & 1)
+                    ]
+                    output += completed
+                nibble_table.append((output, current))
+
+        byte_table = []
+        for state in range(len(branches)):
+            for byte in range(256):
+                low, current = nibble_table[state * 16 + (byte & 15)]
+                high, current = nibble_table[current * 16 + (byte >> 4)]
+                byte_table.append((low + high, current))
+        self._byte_table = byte_table
+
+    def decode_many(self, packets, errors: str = 'strict') -> tuple:
+        """
+        Decode a list of huffman-coded strings in one call.
+
+        Returns ``(buffer, offsets)``: all decoded strings concatenated
+        into one bytearray, and ``len(packets) + 1`` offsets into it, so
+        that string ``i`` is ``buffer[offsets[i]:offsets[i + 1]]``.
+        Decoding goes a byte at a time through a lookup table instead of
+        a bit at a time. Invalid strings raise ValueError, or decode as
+        empty with ``errors='ignore'``.
+        """
+
+        if errors not in ('strict', 'ignore'):
+            raise ValueError(f'Unknown errors mode: {errors!r}')
+        if self._byte_table is None:
+            self.__build_byte_table()
+
+        byte_table = self._byte_table
+        bit_table = self._bit_table
+        buffer = bytearray()
+        offsets = [0]
+
+        for index, data_string in enumerate(packets):
+            start = len(buffer)
+            if not data_string:
+                padding_length = None
+            else:
+                padding_length = data_string[0]
+
+            if padding_length == 0xff:
+                # The string is not encoded
+                buffer += data_string[1:]
+                offsets.append(len(buffer))
+                continue
+
+            state = 0
+            if padding_length is not None and padding_length < 8:
+                last = len(data_string) - 1
+                for byte in data_string[1:last]:
+                    completed, state = byte_table[state << 8 | byte]
+                    buffer += completed
+                if last > 0:
+                    # Only the bits before the padding of the last byte
+                    byte = data_string[last]
+                    for i in range(8 - padding_length):
+                        completed, state = bit_table[
+                            state * 2 + ((byte >> i) & 1)
+                        ]
+                        buffer += completed
+
+            # Every code has to end exactly where the bits end
+            if padding_length is None or padding_length >= 8 or state:
+                if errors == 'strict':
+                    raise ValueError(f'Invalid huffman-coded string {index}')
+                del buffer[start:]
+
+            offsets.append(len(buffer))
+
+        return buffer, offsets
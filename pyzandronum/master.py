@@ -0,0 +1,117 @@
+"""
+Master server module for pyzandronum.
+
+Fetches the list of public servers from a Zandronum master server.
+"""
+
+import asyncio
+import struct
+
+from . import asyncudp
+from . import exceptions
+from . import huffman
+from .resolver import get_resolver
+
+MASTER_ADDRESS = ('master.zandronum.com', 15300)
+
+LAUNCHER_MASTER_CHALLENGE = 5660028
+MASTER_SERVER_VERSION = 2
+
+# Master server response codes
+MSC_ENDSERVERLIST = 2
+MSC_IPISBANNED = 3
+MSC_REQUESTIGNORED = 4
+MSC_WRONGVERSION = 5
+MSC_BEGINSERVERLISTPART = 6
+MSC_ENDSERVERLISTPART = 7
+MSC_SERVERBLOCK = 8
+
+
+class MasterError(Exception):
+    """
+    Raises when the master server response can not be understood.
+    """
+
+
+def _parse_part(data: bytes) -> tuple:
+    """
+    Parses one decoded server list packet.
+    Returns ``(packet number, servers, is last packet)``.
+    """
+    code = struct.unpack_from('<l', data, 0)[0]
+
+    if code == MSC_IPISBANNED:
+        raise exceptions.QueryBanned
+    if code == MSC_REQUESTIGNORED:
+        raise exceptions.QueryIgnored
+    if code == MSC_WRONGVERSION:
+        raise MasterError('Master server does not support this version')
+    if code != MSC_BEGINSERVERLISTPART:
+        raise MasterError(f'Unexpected master server response {code}')
+
+    number = data[4]
+    pos = 5
+    servers = []
+
+    try:
+        while True:
+            command = data[pos]
+            pos += 1
+
+            if command == MSC_SERVERBLOCK:
+                # Blocks of ports sharing one IP, until a zero count
+                while True:
+                    count = data[pos]
+                    pos += 1
+                    if count == 0:
+                        break
+                    ip = '.'.join(str(octet) for octet in data[pos:pos + 4])
+                    pos += 4
+                    for port in struct.unpack_from(f'<{count}H', data, pos):
+                        servers.append((ip, port))
+                    pos += count * 2
+            elif command == MSC_ENDSERVERLISTPART:
+                return number, servers, False
+            elif command == MSC_ENDSERVERLIST:
+                return number, servers, True
+            else:
+                raise MasterError(f'Unexpected command {command} in list')
+    except (IndexError, struct.error):
+        raise MasterError('Truncated master server response') from None
+
+
+async def fetch_servers(
+    address: tuple = MASTER_ADDRESS,
+    timeout: float = 5.0
+) -> list:
+    """
+    Fetches the ``(ip, port)`` list of public servers from the master
+    server at ``address``.
+    """
+    codec = huffman.get_codec()
+    request = codec.encode(struct.pack(
+        '<lh', LAUNCHER_MASTER_CHALLENGE, MASTER_SERVER_VERSION
+    ))
+
+    addr = await get_resolver().resolve_async(*address)
+    sock = await asyncudp.create_socket(remote_addr=addr)
+
+    parts = {}
+    last = None
+
+    try:
+        sock.sendto(request)
+        # The list arrives in several packets, in any order
+        while last is None or len(parts) <= last:
+            try:
+                data, source = await asyncio.wait_for(sock.recvfrom(), timeout)
+            except asyncio.TimeoutError:
+                raise exceptions.QueryTimeout from None
+            number, servers, is_last = _parse_part(codec.decode(data))
+            parts[number] = servers
+            if is_last:
+                last = number
+    finally:
+        sock.close()
+
+    return [server for number in sorted(parts) for server in parts[number]]
@@ -0,0 +1,176 @@
+"""
+Query instrumentation module for pyzandronum.
+
+A :class:`Metrics` instance can be passed to ``Server``/``AsyncServer``
+(and shared between many of them) to time the phases of every query and
+count outcomes and traffic. Servers without metrics skip all of it.
+"""
+
+import bisect
+import time
+
+# Query phases in the order they happen
+PHASES = ('encode', 'send', 'wait', 'decode', 'parse')
+
+COUNTERS = {
+    'queries': 'Query requests sent.',
+    'responses': 'Responses received.',
+    'timeouts': 'Queries that timed out waiting for a response.',
+    'denied': 'Responses denying the query.',
+    'banned': 'Responses denying the query because of a ban.',
+    'malformed': 'Responses rejected by validating parses.',
+    'skipped': 'Queries skipped because the server circuit is open.',
+    'bytes_out': 'Encoded request bytes sent.',
+    'bytes_in': 'Encoded response bytes received.'
+}
+
+# Histogram upper bounds in seconds
+DEFAULT_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0
+)
+
+
+class Histogram:
+    """
+    Cumulative-on-export histogram with fixed bucket bounds.
+    """
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS) -> None:
+        self.buckets: tuple = tuple(buckets)
+        # One extra slot for values above the last bound (+Inf)
+        self.counts: list[int] = [0] * (len(self.buckets) + 1)
+        self.sum: float = 0.0
+        self.count: int = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> list:
+        """Returns ``(upper bound, cumulative count)`` pairs."""
+        pairs = []
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimates the ``q`` quantile (0 to 1) like Prometheus'
+        ``histogram_quantile``: linearly within its bucket, and as the
+        last bound if it falls above it. Returns None if empty.
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        lower = 0.0
+        below = 0
+        for bound, total in self.cumulative():
+            if total >= rank and total > below:
+                if bound == float('inf'):
+                    return lower
+                return lower + (bound - lower) * (rank - below) / (
+                    total - below
+                )
+            lower, below = bound, total
+        return lower
+
+
+class _PhaseTimer:
+    __slots__ = ('_phases', '_last')
+
+    def __init__(self, phases: dict) -> None:
+        self._phases = phases
+        self._last = time.perf_counter()
+
+    def mark(self, phase: str) -> None:
+        """Records the time since the previous mark under ``phase``."""
+        now = time.perf_counter()
+        self._phases[phase].observe(now - self._last)
+        self._last = now
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def mark(self, phase: str) -> None:
+        pass
+
+
+NULL_TIMER = _NullTimer()
+
+
+class Metrics:
+    """
+    Aggregated query counters and per-phase timing histograms.
+    Not thread-safe; use one instance per thread or event loop.
+    """
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS) -> None:
+        self.counters: dict[str, int] = dict.fromkeys(COUNTERS, 0)
+        self.phases: dict[str, Histogram] = {
+            phase: Histogram(buckets) for phase in PHASES
+        }
+
+    def timer(self) -> _PhaseTimer:
+        """Starts timing the phases of one query."""
+        return _PhaseTimer(self.phases)
+
+    def inc(self, name: str, value: int = 1) -> None:
+        """Increments the named counter."""
+        self.counters[name] += value
+
+    def reset(self) -> None:
+        """Zeroes all counters and histograms."""
+        for name in self.counters:
+            self.counters[name] = 0
+        for phase, histogram in self.phases.items():
+            self.phases[phase] = Histogram(histogram.buckets)
+
+    def to_dict(self) -> dict:
+        """Returns the metrics as plain Python types."""
+        return {
+            'counters': dict(self.counters),
+            'phases': {
+                phase: {
+                    'count': histogram.count,
+                    'sum': histogram.sum,
+                    'buckets': {
+                        str(bound): count
+                        for bound, count in histogram.cumulative()
+                    }
+                }
+                for phase, histogram in self.phases.items()
+            }
+        }
+
+    def to_prometheus(self, prefix: str = 'pyzandronum') -> str:
+        """Returns the metrics in Prometheus text exposition format."""
+        lines = []
+
+        for name, value in self.counters.items():
+            metric = f'{prefix}_{name}_total'
+            lines.append(f'# HELP {metric} {COUNTERS[name]}')
+            lines.append(f'# TYPE {metric} counter')
+            lines.append(f'{metric} {value}')
+
+        metric = f'{prefix}_query_phase_seconds'
+        lines.append(f'# HELP {metric} Time spent in each query phase.')
+        lines.append(f'# TYPE {metric} histogram')
+        for phase, histogram in self.phases.items():
+            for bound, count in histogram.cumulative():
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(
+                    f'{metric}_bucket{{phase="{phase}",le="{le}"}} {count}'
+                )
+            lines.append(f'{metric}_sum{{phase="{phase}"}} {histogram.sum}')
+            lines.append(
+                f'{metric}_count{{phase="{phase}"}} {histogram.count}'
+            )
+
+        return '\n'.join(lines) + '\n'
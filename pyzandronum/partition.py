@@ -0,0 +1,311 @@
+"""
+Coordinator-free scan partitioning module for pyzandronum.
+
+Every scanner node maps each ``(host, port)`` target onto a
+:class:`HashRing` of node names and scans only the targets that land on
+its own name. Nodes agree on the split without talking to each other as
+long as they share the node list, and when a node joins or leaves only
+the targets on its arcs of the ring move, so every other server keeps
+being queried (and cached) by the same node.
+
+The node list is either fixed or kept by :class:`Membership`, which
+exchanges UDP heartbeats between nodes. :func:`scan_nodes` runs several
+local processes as nodes and merges their results into one stream.
+"""
+
+import asyncio
+import bisect
+import hashlib
+import json
+import time
+
+from .scanner import Scanner, ShardedScanner
+
+
+def _hash(key: str) -> int:
+    # Stable across processes and hosts, unlike hash()
+    return int.from_bytes(
+        hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big'
+    )
+
+
+class HashRing:
+    """
+    Consistent hash ring of node names, each placed at ``replicas``
+    points to even out the shares.
+    """
+
+    def __init__(self, nodes=(), replicas: int = 128) -> None:
+        self.replicas: int = replicas
+        self.nodes: set[str] = set()
+
+        self._points: list[int] = []
+        self._owners: list[str] = []
+
+        for node in nodes:
+            self.add(node)
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def _rebuild(self) -> None:
+        points = sorted(
+            (_hash(f'{node}#{replica}'), node)
+            for node in self.nodes
+            for replica in range(self.replicas)
+        )
+        self._points = [point for point, node in points]
+        self._owners = [node for point, node in points]
+
+    def add(self, node: str) -> None:
+        """Adds a node; it takes over parts of the other nodes' shares."""
+        if node not in self.nodes:
+            self.nodes.add(node)
+            self._rebuild()
+
+    def remove(self, node: str) -> None:
+        """Removes a node; its share is spread over the others."""
+        if node in self.nodes:
+            self.nodes.discard(node)
+            self._rebuild()
+
+    def node_for(self, host: str, port: int) -> str:
+        """Returns the node responsible for a target."""
+        if not self._points:
+            raise LookupError('Hash ring has no nodes')
+        index = bisect.bisect(self._points, _hash(f'{host}:{port}'))
+        return self._owners[index % len(self._owners)]
+
+    def share(self, targets, node: str) -> list:
+        """
+        Returns ``(index, host, port)`` of every target assigned to
+        ``node``, with indices into ``targets``.
+        """
+        return [
+            (index, host, port)
+            for index, (host, port) in enumerate(targets)
+            if self.node_for(host, port) == node
+        ]
+
+
+class _MembershipProtocol(asyncio.DatagramProtocol):
+    def __init__(self, membership: "Membership") -> None:
+        self._membership = membership
+
+    def datagram_received(self, data: bytes, addr: tuple) -> None:
+        self._membership._received(data, addr)
+
+    def error_received(self, exc: Exception) -> None:
+        pass
+
+
+class Membership:
+    """
+    Tracks live scanner nodes with UDP heartbeats, without a
+    coordinator.
+
+    Every ``interval`` seconds the node sends a heartbeat listing the
+    nodes it knows to ``peers`` and to every node it has heard of, so
+    nodes only need one live peer to find the rest. A node counts as a
+    member while its own heartbeats arrive, and is dropped after
+    ``timeout`` seconds of silence or when it leaves. ``on_change`` is
+    called with the sorted member list whenever it changes.
+    """
+
+    def __init__(
+        self,
+        node: str,
+        peers=(),
+        host: str = '0.0.0.0',
+        port: int = 0,
+        interval: float = 1.0,
+        timeout: float = 5.0,
+        on_change=None
+    ) -> None:
+        self.node: str = node
+        self.peers: list[tuple] = [tuple(peer) for peer in peers]
+        self.host: str = host
+        self.port: int = port
+        self.interval: float = interval
+        self.timeout: float = timeout
+
+        self._on_change = on_change
+        # node -> [address, time of its last heartbeat]
+        self._nodes = {}
+        self._members = [node]
+        self._transport = None
+        self._task = None
+
+    async def __aenter__(self) -> "Membership":
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def members(self) -> list[str]:
+        """Returns the sorted names of the live nodes, this one included."""
+        return list(self._members)
+
+    async def start(self) -> tuple:
+        """Starts heartbeating and returns the local ``(host, port)``."""
+        loop = asyncio.get_running_loop()
+        self._transport, protocol = await loop.create_datagram_endpoint(
+            lambda: _MembershipProtocol(self),
+            local_addr=(self.host, self.port)
+        )
+        self.port = self._transport.get_extra_info('sockname')[1]
+        self._heartbeat()
+        self._task = asyncio.ensure_future(self._run())
+        return self.host, self.port
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            self._heartbeat()
+            self._update()
+
+    def _message(self, kind: str) -> bytes:
+        now = time.monotonic()
+        nodes = {
+            node: list(entry[0]) for node, entry in self._nodes.items()
+            if now - entry[1] < self.timeout
+        }
+        return b'PZN' + json.dumps({
+            'kind': kind, 'node': self.node, 'nodes': nodes
+        }).encode('utf-8')
+
+    def _heartbeat(self, kind: str = 'alive') -> None:
+        message = self._message(kind)
+        addresses = set(self.peers)
+        addresses.update(entry[0] for entry in self._nodes.values())
+        for addr in addresses:
+            self._transport.sendto(message, addr)
+
+    def _received(self, data: bytes, addr: tuple) -> None:
+        if not data.startswith(b'PZN'):
+            return
+        try:
+            message = json.loads(data[3:])
+            node = message['node']
+            nodes = message['nodes']
+        except (ValueError, KeyError, TypeError):
+            return
+        if node == self.node:
+            return
+
+        if message.get('kind') == 'leave':
+            self._nodes.pop(node, None)
+        else:
+            self._nodes[node] = [addr[:2], time.monotonic()]
+            # Nodes we have not heard from ourselves get contacted, but
+            # only become members once their own heartbeats arrive
+            heard = time.monotonic() - self.timeout
+            for other, other_addr in nodes.items():
+                if other != self.node and other not in self._nodes:
+                    self._nodes[other] = [tuple(other_addr), heard]
+        self._update()
+
+    def _update(self) -> None:
+        now = time.monotonic()
+        for node, entry in list(self._nodes.items()):
+            # Forget unreachable contacts after a few timeouts
+            if now - entry[1] > self.timeout * 3:
+                del self._nodes[node]
+
+        members = sorted([self.node] + [
+            node for node, entry in self._nodes.items()
+            if now - entry[1] < self.timeout
+        ])
+        if members != self._members:
+            self._members = members
+            if self._on_change is not None:
+                self._on_change(members)
+
+    def close(self) -> None:
+        """Tells the other nodes this node leaves, and stops."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._transport is not None:
+            self._heartbeat('leave')
+            self._transport.close()
+            self._transport = None
+
+
+class PartitionedScanner:
+    """
+    Scans this node's share of the targets. The node list is ``nodes``
+    or, with ``membership``, the live members at the start of each scan.
+    Other keyword arguments are passed to :class:`~.scanner.Scanner`.
+    """
+
+    def __init__(
+        self,
+        node: str,
+        nodes=None,
+        membership: Membership = None,
+        replicas: int = 128,
+        **options
+    ) -> None:
+        self.node: str = node
+        self.membership: Membership = membership
+        self.scanner: Scanner = Scanner(**options)
+
+        self._replicas = replicas
+        self._ring = HashRing(nodes or [node], replicas)
+
+    def ring(self) -> HashRing:
+        """Returns the hash ring for the current node list."""
+        if self.membership is not None:
+            members = set(self.membership.members())
+            if members != self._ring.nodes:
+                self._ring = HashRing(members, self._replicas)
+        return self._ring
+
+    def share(self, targets) -> list:
+        """Returns ``(index, host, port)`` of this node's targets."""
+        return self.ring().share(list(targets), self.node)
+
+    async def scan(self, targets):
+        """
+        Scans this node's share of ``targets``. Asynchronously yields
+        :class:`~.scanner.ScanResult` objects whose ``index`` refers to
+        ``targets``.
+        """
+        share = self.share(targets)
+        async for result in self.scanner.scan(
+            (host, port) for index, host, port in share
+        ):
+            result.index = share[result.index][0]
+            yield result
+
+
+def scan_nodes(
+    targets,
+    nodes: int = 2,
+    batch_size: int = 16,
+    queue_size: int = 64,
+    max_restarts: int = 3,
+    **options
+):
+    """
+    Runs ``nodes`` local processes as scanner nodes, each scanning the
+    share of its node name on a :class:`HashRing`, and yields their
+    results merged into one stream in completion order. Backpressure
+    and restarts of crashed nodes work as in
+    :class:`~.scanner.ShardedScanner`. Keyword arguments are passed to
+    every node's :class:`~.scanner.Scanner` and must be picklable.
+    """
+    targets = list(targets)
+    ring = HashRing([f'node{i}' for i in range(nodes)])
+    shards = {node: [] for node in sorted(ring.nodes)}
+    for index, (host, port) in enumerate(targets):
+        shards[ring.node_for(host, port)].append(index)
+
+    scanner = ShardedScanner(
+        nodes, queue_size, batch_size, max_restarts, **options
+    )
+    yield from scanner._scan_shards(
+        targets, list(shards.values()), ordered=False
+    )
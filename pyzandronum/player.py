@@ -1,3 +1,7 @@
+from .enums import MAX_STRING_LENGTH
+from .exceptions import MalformedResponse
+
+
 class Player:
     """
     Represents a Zandronum player object.
@@ -7,7 +11,8 @@ class Player:
         self,
         byte_stream: bytes,
         byte_pos: int,
-        teamgame: bool
+        teamgame: bool,
+        validate: bool = False
     ) -> None:
         self.player_dict = {
             'name': None,
@@ -19,6 +24,7 @@ class Player:
             'time': None
         }
         self.teamgame: bool = teamgame
+        self.validate: bool = validate
 
         self._bytestartpos: int = byte_pos
         self._byteendpos: int = 0
@@ -57,6 +63,21 @@ class Player:
         # Set our "end byte position" marker
         self._byteendpos = self._bytepos
 
+    @classmethod
+    def from_dict(cls, player_dict: dict, teamgame: bool) -> "Player":
+        """
+        Creates a player from an already parsed ``player_dict``.
+        """
+        player = cls.__new__(cls)
+        player.player_dict = dict(player_dict)
+        player.teamgame = teamgame
+        player.validate = False
+        player._bytestartpos = 0
+        player._byteendpos = 0
+        player._bytepos = 0
+        player._raw_data = b''
+        return player
+
     def __repr__(self) -> str:
         return f'<Player {self.name!r}>'
 
@@ -98,6 +119,16 @@ class Player:
     def _next_string(self) -> str:
         ret_str = ''
 
+        if self.validate:
+            # A terminator within bounds keeps the loops below in range
+            end = self._raw_data.find(
+                0, self._bytepos, self._bytepos + MAX_STRING_LENGTH + 1
+            )
+            if end < 0:
+                raise MalformedResponse(
+                    'unterminated or too long player name', self._bytepos
+                )
+
         # Read characters until we hit a null, and add them to our string
         while int(self._raw_data[self._bytepos]) != 0:
             tmp_char = ''
@@ -143,6 +174,9 @@ class Player:
         return ret_str
 
     def _next_bytes(self, bytes_length: int):
+        if self.validate and \
+                self._bytepos + bytes_length > len(self._raw_data):
+            raise MalformedResponse('truncated player data', self._bytepos)
         ret_int = int.from_bytes(
             self._raw_data[self._bytepos:self._bytepos + bytes_length],
             byteorder='little', signed=False
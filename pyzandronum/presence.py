@@ -0,0 +1,239 @@
+"""
+Player presence tracking module for pyzandronum.
+
+:class:`PresenceTracker` ingests successive scans and indexes who is
+playing where, so "where is player X" and "how long did X play today"
+are dictionary lookups instead of walks over every server's player
+list. Names are matched without color codes and case-insensitively, so
+raw (color-coded) and stripped names find the same player.
+
+Finished sessions are kept per player as packed ``(server id, start,
+end)`` integer triples and dropped after ``retention`` seconds.
+"""
+
+import array
+import datetime
+import time
+
+from .zandronum import strip_colors
+
+
+def normalize_name(name: str) -> str:
+    """Returns the lookup key of a raw or color-stripped player name."""
+    return strip_colors(name).strip().casefold()
+
+
+class Presence:
+    """
+    Represents a player currently seen on a server.
+    """
+
+    __slots__ = ('name', 'server', 'since', 'last_seen')
+
+    def __init__(
+        self,
+        name: str,
+        server: str,
+        since: float,
+        last_seen: float
+    ) -> None:
+        # Name as last seen, without color codes
+        self.name: str = name
+        # ``address:port`` of the server
+        self.server: str = server
+        # Time the player was first seen in this session
+        self.since: float = since
+        # Time of the last scan that saw the player
+        self.last_seen: float = last_seen
+
+    def __repr__(self) -> str:
+        return f'<Presence {self.name!r} on {self.server}>'
+
+
+class PresenceTracker:
+    """
+    Indexes players over successive scans.
+
+    A player leaves a server when a later answer from that server no
+    longer lists them, or when the server has not answered for
+    ``grace`` seconds; the session then ends at the last scan that saw
+    them. Bots are ignored unless ``bots`` is True.
+    """
+
+    def __init__(
+        self,
+        retention: float = 7 * 86400,
+        grace: float = 300.0,
+        bots: bool = False
+    ) -> None:
+        self.retention: float = retention
+        self.grace: float = grace
+        self.bots: bool = bots
+
+        self.servers: list[str] = []
+        self._server_ids: dict = {}
+        # key -> {server id: Presence}
+        self._online: dict = {}
+        # server id -> (keys listed by its last answer, time of it)
+        self._rosters: dict = {}
+        # key -> array of (server id, start, end) triples by end time
+        self._sessions: dict = {}
+        self._swept = 0.0
+
+    def __len__(self) -> int:
+        """Returns the number of players online."""
+        return len(self._online)
+
+    def _server_id(self, key: str) -> int:
+        index = self._server_ids.get(key)
+        if index is None:
+            index = len(self.servers)
+            self._server_ids[key] = index
+            self.servers.append(key)
+        return index
+
+    def ingest(self, results, timestamp: float = None) -> None:
+        """
+        Updates the index from one scan of ``ScanResult`` or ``Server``
+        objects. Only servers that answered are updated.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+
+        for item in results:
+            server = getattr(item, 'server', item)
+            if server is None or getattr(item, 'error', None) is not None:
+                continue
+            server_id = self._server_id(f'{server.address}:{server.port}')
+
+            roster = {}
+            for player in server.players:
+                if player.bot and not self.bots:
+                    continue
+                name = strip_colors(player.name)
+                roster[normalize_name(name)] = name
+
+            previous = self._rosters.get(server_id, ((), 0.0))[0]
+            for key in previous:
+                if key not in roster:
+                    self._leave(key, server_id)
+            for key, name in roster.items():
+                self._seen(key, name, server_id, timestamp)
+            self._rosters[server_id] = (roster.keys(), timestamp)
+
+        self._expire(timestamp)
+
+    def _seen(self, key: str, name: str, server_id: int, now: float) -> None:
+        servers = self._online.get(key)
+        if servers is None:
+            servers = self._online[key] = {}
+        presence = servers.get(server_id)
+        if presence is None:
+            servers[server_id] = Presence(
+                name, self.servers[server_id], now, now
+            )
+        else:
+            presence.name = name
+            presence.last_seen = now
+
+    def _leave(self, key: str, server_id: int) -> None:
+        servers = self._online.get(key)
+        presence = servers.pop(server_id, None) if servers else None
+        if presence is None:
+            return
+        if not servers:
+            del self._online[key]
+
+        sessions = self._sessions.get(key)
+        if sessions is None:
+            sessions = self._sessions[key] = array.array('L')
+        # Sessions of silent servers end at their last sighting, which
+        # can be earlier than sessions already stored; keep end order
+        end = int(presence.last_seen)
+        position = len(sessions)
+        while position and sessions[position - 1] > end:
+            position -= 3
+        sessions[position:position] = array.array(
+            'L', (server_id, int(presence.since), end)
+        )
+        self._trim(sessions, presence.last_seen - self.retention)
+
+    @staticmethod
+    def _trim(sessions: array.array, cutoff: float) -> None:
+        # Sessions end in order, so expired ones are at the front
+        drop = 0
+        while drop < len(sessions) and sessions[drop + 2] < cutoff:
+            drop += 3
+        if drop:
+            del sessions[:drop]
+
+    def _expire(self, now: float) -> None:
+        # Servers silent for longer than the grace period lose their
+        # players; checked at most once per grace period
+        if now - self._swept < min(self.grace, self.retention):
+            return
+        self._swept = now
+
+        for server_id, (roster, seen) in list(self._rosters.items()):
+            if now - seen > self.grace:
+                for key in list(roster):
+                    self._leave(key, server_id)
+                del self._rosters[server_id]
+
+        cutoff = now - self.retention
+        for key, sessions in list(self._sessions.items()):
+            self._trim(sessions, cutoff)
+            if not sessions:
+                del self._sessions[key]
+
+    def where(self, name: str) -> list[Presence]:
+        """Returns where a player is online now (several if ambiguous)."""
+        servers = self._online.get(normalize_name(name))
+        return list(servers.values()) if servers else []
+
+    def sessions(
+        self,
+        name: str,
+        start: float = None,
+        end: float = None
+    ) -> list[tuple]:
+        """
+        Returns ``(server, start, end)`` of a player's sessions that
+        overlap ``start``-``end``, oldest first, the current ones last
+        (ending at their last sighting).
+        """
+        key = normalize_name(name)
+        found = []
+        sessions = self._sessions.get(key, ())
+        for i in range(0, len(sessions), 3):
+            found.append((
+                self.servers[sessions[i]], sessions[i + 1], sessions[i + 2]
+            ))
+        for presence in self._online.get(key, {}).values():
+            found.append((presence.server, presence.since, presence.last_seen))
+
+        return [
+            session for session in found
+            if (start is None or session[2] >= start) and
+            (end is None or session[1] < end)
+        ]
+
+    def played(self, name: str, start: float, end: float = None) -> float:
+        """Returns the seconds a player played between start and end."""
+        if end is None:
+            end = time.time()
+        return sum(
+            max(0.0, min(session_end, end) - max(session_start, start))
+            for server, session_start, session_end
+            in self.sessions(name, start, end)
+        )
+
+    def played_today(
+        self,
+        name: str,
+        tz: datetime.tzinfo = datetime.timezone.utc
+    ) -> float:
+        """Returns the seconds a player played since midnight in ``tz``."""
+        now = datetime.datetime.now(tz)
+        midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        return self.played(name, midnight.timestamp(), now.timestamp())
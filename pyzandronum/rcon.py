@@ -0,0 +1,436 @@
+"""
+Remote console (RCON) module for pyzandronum.
+
+:class:`RCONClient` keeps an authenticated RCON session open with a
+Zandronum server: it answers the server's keep-alive expectations with
+heartbeats, sends commands without waiting for earlier ones to finish,
+and streams console output. :class:`RCONGroup` administers many servers
+from one event loop. RCON packets use the same Huffman compression as
+launcher queries.
+
+    async with RCONClient('127.0.0.1', 10666, 'secret') as rcon:
+        print(await rcon.execute('status'))
+        async for line in rcon.messages():
+            print(line)
+"""
+
+import asyncio
+import hashlib
+
+from . import exceptions
+from . import huffman
+from .resolver import Resolver, get_resolver
+
+RCON_PROTOCOL_VERSION = 4
+
+# Client -> server commands
+CLRC_BEGINCONNECTION = 52
+CLRC_PASSWORD = 53
+CLRC_COMMAND = 54
+CLRC_PONG = 55
+CLRC_DISCONNECT = 56
+CLRC_TABCOMPLETE = 57
+
+# Server -> client commands
+SVRC_OLDPROTOCOL = 32
+SVRC_BANNED = 33
+SVRC_SALT = 34
+SVRC_LOGGEDIN = 35
+SVRC_INVALIDPASSWORD = 36
+SVRC_MESSAGE = 37
+SVRC_UPDATE = 38
+SVRC_TABCOMPLETE = 39
+SVRC_TOOMANYTABCOMPLETES = 40
+
+# SVRC_UPDATE types
+SVRCU_PLAYERDATA = 0
+SVRCU_ADMINCOUNT = 1
+SVRCU_MAP = 2
+
+
+class RCONError(Exception):
+    """
+    Raises when an RCON session can not be established or was lost.
+    """
+
+
+class InvalidPassword(RCONError):
+    """
+    Raises when the server rejected the RCON password.
+    """
+
+    def __str__(self):
+        return 'RCON password was rejected by server'
+
+
+def _read_string(data: bytes, pos: int) -> tuple:
+    end = data.index(0, pos)
+    return data[pos:end].decode('latin-1'), end + 1
+
+
+def _read_strings(data: bytes, pos: int) -> tuple:
+    count = data[pos]
+    pos += 1
+    strings = []
+    for i in range(count):
+        string, pos = _read_string(data, pos)
+        strings.append(string)
+    return strings, pos
+
+
+def _string(value: str) -> bytes:
+    return value.encode('latin-1', 'replace') + b'\x00'
+
+
+def password_hash(salt: str, password: str) -> str:
+    """Returns the hex MD5 of ``salt + password`` sent to log in."""
+    return hashlib.md5((salt + password).encode('latin-1')).hexdigest()
+
+
+class _RCONProtocol(asyncio.DatagramProtocol):
+    def __init__(self, client: "RCONClient") -> None:
+        self._client = client
+
+    def datagram_received(self, data: bytes, addr: tuple) -> None:
+        self._client._received(data)
+
+    def error_received(self, exc: Exception) -> None:
+        pass
+
+    def connection_lost(self, exc: Exception) -> None:
+        self._client._lost()
+
+
+class RCONClient:
+    """
+    A persistent RCON session with one server.
+
+    ``heartbeat`` is the interval of keep-alive packets; the server
+    drops sessions that stay silent for about ten seconds. Console
+    output is buffered (the newest ``history`` lines) until read with
+    :meth:`messages`. ``on_message`` is called with every console line
+    as it arrives.
+    """
+
+    def __init__(
+        self,
+        address: str,
+        port: int = 10666,
+        password: str = '',
+        heartbeat: float = 5.0,
+        timeout: float = 5.0,
+        history: int = 1000,
+        on_message=None,
+        resolver: Resolver = None
+    ) -> None:
+        self.address: str = address
+        self.port: int = port
+        self.hostname: str = None
+        self.map: str = None
+        self.players: list[str] = []
+        self.admins: int = 0
+        self.connected: bool = False
+
+        self._password = password
+        self._heartbeat = heartbeat
+        self._timeout = timeout
+        self._on_message = on_message
+        self._resolver = resolver or get_resolver()
+        self._huffman = huffman.get_codec()
+        self._transport = None
+        self._heartbeat_task = None
+        # Future waiting for the next handshake or tab completion reply;
+        # replies are not tagged, so one request is in flight at a time
+        self._waiter = None
+        self._request_lock = asyncio.Lock()
+        self._lines = asyncio.Queue(maxsize=history)
+        self._collectors = []
+
+    def __repr__(self) -> str:
+        return f'<RCONClient {self.address}:{self.port}>'
+
+    async def __aenter__(self) -> "RCONClient":
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def _send(self, data: bytes) -> None:
+        if self._transport is None or self._transport.is_closing():
+            raise RCONError('RCON session is closed')
+        self._transport.sendto(self._huffman.encode(data))
+
+    async def _request(self, data: bytes) -> tuple:
+        async with self._request_lock:
+            loop = asyncio.get_running_loop()
+            self._waiter = loop.create_future()
+            try:
+                self._send(data)
+                return await asyncio.wait_for(self._waiter, self._timeout)
+            except asyncio.TimeoutError:
+                raise exceptions.QueryTimeout from None
+            finally:
+                self._waiter = None
+
+    async def connect(self) -> None:
+        """
+        Opens the session and logs in. Raises :class:`InvalidPassword`,
+        :class:`~.exceptions.QueryBanned`, :class:`RCONError` or
+        :class:`~.exceptions.QueryTimeout`.
+        """
+        addr = await self._resolver.resolve_async(self.address, self.port)
+        loop = asyncio.get_running_loop()
+        self._transport, protocol = await loop.create_datagram_endpoint(
+            lambda: _RCONProtocol(self), remote_addr=addr
+        )
+
+        try:
+            command, salt = await self._request(
+                bytes([CLRC_BEGINCONNECTION, RCON_PROTOCOL_VERSION])
+            )
+            if command == SVRC_SALT:
+                command, value = await self._request(
+                    bytes([CLRC_PASSWORD]) +
+                    _string(password_hash(salt, self._password))
+                )
+        except BaseException:
+            self.close()
+            raise
+
+        if command != SVRC_LOGGEDIN:
+            self.close()
+            if command == SVRC_INVALIDPASSWORD:
+                raise InvalidPassword
+            if command == SVRC_BANNED:
+                raise exceptions.QueryBanned
+            if command == SVRC_OLDPROTOCOL:
+                raise RCONError('Server uses an unsupported RCON protocol')
+            raise RCONError(f'Unexpected RCON reply {command}')
+
+        self.connected = True
+        self._heartbeat_task = asyncio.ensure_future(self._keep_alive())
+
+    async def _keep_alive(self) -> None:
+        while True:
+            await asyncio.sleep(self._heartbeat)
+            try:
+                self._send(bytes([CLRC_PONG]))
+            except RCONError:
+                return
+
+    def send(self, *commands: str) -> None:
+        """
+        Sends console commands without waiting for their output.
+        Output arrives through :meth:`messages`.
+        """
+        for command in commands:
+            self._send(bytes([CLRC_COMMAND]) + _string(command))
+
+    async def execute(
+        self,
+        command: str,
+        quiet: float = 0.25,
+        limit: float = 5.0
+    ) -> list[str]:
+        """
+        Sends a command and returns the console lines received until
+        no output arrived for ``quiet`` seconds (at most ``limit``
+        seconds). RCON does not tie output to commands, so lines from
+        other activity on the server may be included. Lines are still
+        delivered to :meth:`messages` too.
+        """
+        lines = []
+        self._collectors.append(lines)
+        try:
+            self.send(command)
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + limit
+            seen = -1
+            while seen != len(lines) and loop.time() < deadline:
+                seen = len(lines)
+                await asyncio.sleep(min(quiet, deadline - loop.time()))
+        finally:
+            self._collectors.remove(lines)
+        return lines
+
+    async def tab_complete(self, partial: str) -> list[str]:
+        """Returns the server's completions of a partial command."""
+        command, value = await self._request(
+            bytes([CLRC_TABCOMPLETE]) + _string(partial)
+        )
+        return value if command == SVRC_TABCOMPLETE else []
+
+    async def messages(self):
+        """
+        Yields console lines as they arrive, until the session closes.
+        """
+        while True:
+            line = await self._lines.get()
+            if line is None:
+                return
+            yield line
+
+    def _received(self, data: bytes) -> None:
+        try:
+            data = self._huffman.decode(data)
+            pos = 0
+            while pos < len(data):
+                pos = self._dispatch(data, pos)
+        except (IndexError, ValueError, KeyError):
+            # Drop the rest of a malformed packet
+            pass
+
+    def _reply(self, command: int, value=None) -> None:
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result((command, value))
+
+    def _dispatch(self, data: bytes, pos: int) -> int:
+        command = data[pos]
+        pos += 1
+
+        if command == SVRC_MESSAGE:
+            line, pos = _read_string(data, pos)
+            self._message(line)
+        elif command == SVRC_UPDATE:
+            pos = self._update(data, pos)
+        elif command == SVRC_SALT:
+            salt, pos = _read_string(data, pos)
+            self._reply(command, salt)
+        elif command == SVRC_LOGGEDIN:
+            # Protocol version, host name, current state, recent output
+            pos += 1
+            self.hostname, pos = _read_string(data, pos)
+            updates = data[pos]
+            pos += 1
+            for i in range(updates):
+                pos = self._update(data, pos)
+            lines, pos = _read_strings(data, pos)
+            for line in lines:
+                self._message(line)
+            self._reply(command)
+        elif command == SVRC_TABCOMPLETE:
+            completions, pos = _read_strings(data, pos)
+            self._reply(command, completions)
+        elif command == SVRC_TOOMANYTABCOMPLETES:
+            # Number of matches, too many to list
+            pos += 2
+            self._reply(command)
+        elif command in (SVRC_OLDPROTOCOL, SVRC_BANNED, SVRC_INVALIDPASSWORD):
+            self._reply(command)
+        else:
+            raise ValueError(f'Unknown RCON command {command}')
+
+        return pos
+
+    def _update(self, data: bytes, pos: int) -> int:
+        update = data[pos]
+        pos += 1
+        if update == SVRCU_PLAYERDATA:
+            self.players, pos = _read_strings(data, pos)
+        elif update == SVRCU_ADMINCOUNT:
+            self.admins = data[pos]
+            pos += 1
+        elif update == SVRCU_MAP:
+            self.map, pos = _read_string(data, pos)
+        else:
+            raise ValueError(f'Unknown RCON update {update}')
+        return pos
+
+    def _message(self, line: str) -> None:
+        if self._lines.full():
+            # Keep the newest output when nobody is reading
+            self._lines.get_nowait()
+        self._lines.put_nowait(line)
+        for lines in self._collectors:
+            lines.append(line)
+        if self._on_message is not None:
+            self._on_message(self, line)
+
+    def _lost(self) -> None:
+        self.connected = False
+        if self._lines.full():
+            self._lines.get_nowait()
+        self._lines.put_nowait(None)
+
+    def close(self) -> None:
+        """Logs out and closes the session."""
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            self._heartbeat_task = None
+        if self._transport is not None:
+            if self.connected:
+                self._send(bytes([CLRC_DISCONNECT]))
+            self._transport.close()
+            self._transport = None
+
+
+class RCONGroup:
+    """
+    RCON sessions with many servers sharing one event loop.
+    """
+
+    def __init__(self, heartbeat: float = 5.0, timeout: float = 5.0) -> None:
+        self.clients: list[RCONClient] = []
+
+        self._heartbeat = heartbeat
+        self._timeout = timeout
+        self._lines = asyncio.Queue()
+
+    async def __aenter__(self) -> "RCONGroup":
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def add(self, address: str, port: int, password: str) -> RCONClient:
+        """Adds a server; call :meth:`connect` to log in."""
+        client = RCONClient(
+            address, port, password, self._heartbeat, self._timeout,
+            on_message=lambda client, line: self._lines.put_nowait(
+                (client, line)
+            )
+        )
+        self.clients.append(client)
+        return client
+
+    async def connect(self) -> list:
+        """
+        Logs in to every server not connected yet. Returns the clients
+        that failed, paired with their exception.
+        """
+        pending = [client for client in self.clients if not client.connected]
+        results = await asyncio.gather(
+            *(client.connect() for client in pending), return_exceptions=True
+        )
+        return [
+            (client, result) for client, result in zip(pending, results)
+            if isinstance(result, BaseException)
+        ]
+
+    def send(self, *commands: str) -> None:
+        """Sends commands to every connected server."""
+        for client in self.clients:
+            if client.connected:
+                client.send(*commands)
+
+    async def execute(self, command: str, quiet: float = 0.25) -> dict:
+        """
+        Runs a command on every connected server at once and returns
+        their output keyed by client.
+        """
+        clients = [client for client in self.clients if client.connected]
+        outputs = await asyncio.gather(
+            *(client.execute(command, quiet) for client in clients)
+        )
+        return dict(zip(clients, outputs))
+
+    async def messages(self):
+        """Yields ``(client, line)`` console output of all servers."""
+        while True:
+            yield await self._lines.get()
+
+    def close(self) -> None:
+        """Closes every session."""
+        for client in self.clients:
+            client.close()
@@ -0,0 +1,503 @@
+"""
+Fleet state replication module for pyzandronum.
+
+One node scans and publishes the results; subscribers rebuild the same
+state locally instead of querying the game servers themselves. After a
+full keyframe, each message only carries what changed since the previous
+sequence number: changed and dropped fields per server, player slot
+differences and servers that disappeared. Keyframes are repeated every
+``keyframe_interval`` messages, and on request, so subscribers recover
+from lost messages. Every message carries the publisher's random epoch,
+so subscribers notice a restarted publisher and start over from its
+first keyframe.
+
+Messages use the compact value encoding of :mod:`~pyzandronum.export`,
+send server keys and field names only once, and travel over TCP
+(length-prefixed) or UDP (split into datagrams).
+"""
+
+import asyncio
+import random
+import socket
+import struct
+
+from . import zandronum
+from .export import record, _pack_value, _unpack_value, ExportError
+
+KEYFRAME = 0
+DELTA = 1
+
+# Record fields stored outside the query dict
+_HEADER_FIELDS = frozenset([
+    'address', 'port', 'response', 'response_time', 'response_flags',
+    'latency', 'error'
+])
+
+_LENGTH = struct.Struct('<I')
+# UDP chunk header: magic, epoch, message number, part, number of parts
+_CHUNK = struct.Struct('<3sIIHH')
+_CHUNK_MAGIC = b'PZR'
+_CHUNK_SIZE = 1200
+_RCVBUF = 4 * 1024 * 1024
+
+# UDP control datagrams sent by subscribers
+_SUBSCRIBE = b'PZR:SUB'
+_UNSUBSCRIBE = b'PZR:UNSUB'
+_KEYFRAME_REQUEST = b'PZR:KEY'
+
+
+def _flatten(data: dict) -> tuple:
+    """Splits a record into a flat field dict and a slot->player dict."""
+    fields = {key: data[key] for key in _HEADER_FIELDS}
+    fields.update(data['query'])
+    # Names are not unique, so players are keyed by their list position
+    players = dict(enumerate(data['players']))
+    return fields, players
+
+
+def _changed(old: dict, new: dict, intern) -> list:
+    return [
+        [intern(key), value] for key, value in new.items()
+        if key not in old or old[key] != value
+    ]
+
+
+def _diff(old: tuple, new: tuple, intern) -> tuple:
+    """
+    Returns the changed fields, dropped fields, removed player slots and
+    changed player slots of a server. Field names are replaced by
+    ``intern(name)``.
+    """
+    old_fields, old_players = old
+    new_fields, new_players = new
+
+    changes = _changed(old_fields, new_fields, intern)
+    # A server that stops answering has no query fields left
+    dropped = [intern(key) for key in old_fields if key not in new_fields]
+    removed = [slot for slot in old_players if slot not in new_players]
+    players = []
+    for slot, player in new_players.items():
+        changed = _changed(old_players.get(slot, {}), player, intern)
+        if changed:
+            players.append([slot, changed])
+
+    return changes, dropped, removed, players
+
+
+class Publisher:
+    """
+    Encodes successive scans as keyframes and delta messages.
+    """
+
+    def __init__(self, keyframe_interval: int = 30) -> None:
+        self.keyframe_interval: int = keyframe_interval
+        self.sequence: int = 0
+        # Tells this publisher's messages from those of an earlier run
+        self.epoch: int = random.getrandbits(32)
+        self.stats = {
+            'keyframes': 0,
+            'deltas': 0,
+            'keyframe_bytes': 0,
+            'delta_bytes': 0
+        }
+
+        # key -> flattened state as of the last published message
+        self._state: dict = {}
+        # Server keys and field names are sent once, then by index
+        self._names: list[str] = []
+        self._ids: dict = {}
+        self._new_names: list[str] = []
+
+    def _intern(self, name: str) -> int:
+        index = self._ids.get(name)
+        if index is None:
+            index = len(self._names)
+            self._ids[name] = index
+            self._names.append(name)
+            self._new_names.append(name)
+        return index
+
+    def _encode(
+        self,
+        kind: int,
+        names: list,
+        entries: list,
+        removed: list
+    ) -> bytes:
+        out = bytearray()
+        _pack_value(
+            out, [kind, self.epoch, self.sequence, names, entries, removed]
+        )
+        return bytes(out)
+
+    def keyframe(self) -> bytes:
+        """Returns the full current state as a keyframe message."""
+        empty = ({}, {})
+        entries = [
+            [self._intern(key), *_diff(empty, state, self._intern)]
+            for key, state in self._state.items()
+        ]
+        message = self._encode(KEYFRAME, self._names, entries, [])
+        self.stats['keyframes'] += 1
+        self.stats['keyframe_bytes'] += len(message)
+        return message
+
+    def publish(self, results) -> bytes:
+        """
+        Updates the state from a scan (``ScanResult`` or ``Server``
+        objects) and returns the message to send to subscribers.
+        Servers missing from the scan are removed from the state.
+        """
+        state = {}
+        for item in results:
+            data = record(item)
+            state[f'{data["address"]}:{data["port"]}'] = _flatten(data)
+
+        previous = self._state
+        self._state = state
+        self.sequence += 1
+
+        if (self.sequence - 1) % self.keyframe_interval == 0 or \
+                not previous:
+            message = self.keyframe()
+            self._new_names = []
+            return message
+
+        empty = ({}, {})
+        entries = []
+        for key, new in state.items():
+            changes, dropped, removed, players = _diff(
+                previous.get(key, empty), new, self._intern
+            )
+            if changes or dropped or removed or players:
+                entries.append(
+                    [self._intern(key), changes, dropped, removed, players]
+                )
+        removed = [self._ids[key] for key in previous if key not in state]
+
+        message = self._encode(DELTA, self._new_names, entries, removed)
+        self._new_names = []
+        self.stats['deltas'] += 1
+        self.stats['delta_bytes'] += len(message)
+        return message
+
+
+class Subscriber:
+    """
+    Rebuilds fleet state from publisher messages.
+    """
+
+    def __init__(self) -> None:
+        # Epoch and sequence of the last applied message, None before a
+        # keyframe
+        self.epoch: int = None
+        self.sequence: int = None
+        self.stats = {'applied': 0, 'gaps': 0}
+
+        self._state: dict = {}
+        self._names: list[str] = []
+
+    def apply(self, message: bytes) -> bool:
+        """
+        Applies one message. Returns False if it can not be applied
+        because earlier messages were missed; a keyframe is needed then.
+        """
+        try:
+            (kind, epoch, sequence, names, entries, removed), pos = (
+                _unpack_value(message, 0)
+            )
+        except (IndexError, ValueError, ExportError):
+            return False
+
+        if epoch != self.epoch:
+            # First message, or the publisher restarted: the state so
+            # far is meaningless and only a keyframe can be applied
+            if kind != KEYFRAME:
+                self.stats['gaps'] += 1
+                return False
+            self.epoch = None
+            self.sequence = None
+
+        if kind == KEYFRAME:
+            if self.sequence is not None and sequence <= self.sequence:
+                # Older than the state already applied
+                return True
+            self._state = {}
+            self._names = list(names)
+        elif self.sequence is None or sequence != self.sequence + 1:
+            if self.sequence is None or sequence > self.sequence:
+                self.stats['gaps'] += 1
+                return False
+            # Already applied (duplicate)
+            return True
+        else:
+            self._names += names
+
+        names = self._names
+        for key in removed:
+            self._state.pop(names[key], None)
+
+        for key, changes, dropped, removed_players, players in entries:
+            fields, current = self._state.setdefault(names[key], ({}, {}))
+            for field, value in changes:
+                fields[names[field]] = value
+            for field in dropped:
+                fields.pop(names[field], None)
+            for slot in removed_players:
+                current.pop(slot, None)
+            for slot, changed in players:
+                player = current.setdefault(slot, {})
+                for field, value in changed:
+                    player[names[field]] = value
+
+        self.epoch = epoch
+        self.sequence = sequence
+        self.stats['applied'] += 1
+        return True
+
+    def records(self) -> list:
+        """Returns the state as records shaped like ``export.record``."""
+        records = []
+        for fields, players in self._state.values():
+            data = {
+                'query': {},
+                'players': [players[slot] for slot in sorted(players)]
+            }
+            for field, value in fields.items():
+                if field in _HEADER_FIELDS:
+                    data[field] = value
+                else:
+                    data['query'][field] = value
+            records.append(data)
+        return records
+
+    def servers(self) -> list:
+        """Returns a ``Server`` for every server that responded."""
+        return [
+            zandronum.Server.from_snapshot(data) for data in self.records()
+            if data['response'] is not None
+        ]
+
+
+class TCPPublisher(Publisher):
+    """
+    Publishes messages to subscribers connected over TCP. New
+    subscribers get the current keyframe first.
+    """
+
+    def __init__(
+        self,
+        host: str = '127.0.0.1',
+        port: int = 0,
+        keyframe_interval: int = 30
+    ) -> None:
+        super().__init__(keyframe_interval)
+        self.host: str = host
+        self.port: int = port
+
+        self._server = None
+        self._writers = set()
+        self._handlers = set()
+
+    async def start(self) -> None:
+        """Starts accepting subscribers."""
+        self._server = await asyncio.start_server(
+            self._accept, self.host, self.port
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def _accept(self, reader, writer) -> None:
+        handler = asyncio.current_task()
+        self._handlers.add(handler)
+        if self.sequence:
+            self._send(writer, self.keyframe())
+        self._writers.add(writer)
+        try:
+            # Subscribers do not send anything; wait for disconnection
+            await reader.read()
+        except ConnectionError:
+            pass
+        finally:
+            self._writers.discard(writer)
+            self._handlers.discard(handler)
+            writer.close()
+
+    @staticmethod
+    def _send(writer, message: bytes) -> None:
+        writer.write(_LENGTH.pack(len(message)) + message)
+
+    async def publish_scan(self, results) -> None:
+        """Publishes a scan to every connected subscriber."""
+        message = self.publish(results)
+        writers = list(self._writers)
+        for writer in writers:
+            self._send(writer, message)
+        for writer in writers:
+            try:
+                await writer.drain()
+            except ConnectionError:
+                self._writers.discard(writer)
+
+    async def close(self) -> None:
+        """Disconnects all subscribers and stops accepting new ones."""
+        for writer in list(self._writers):
+            writer.close()
+        if self._handlers:
+            await asyncio.wait(list(self._handlers))
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+
+class _UDPPublisherProtocol(asyncio.DatagramProtocol):
+    def __init__(self, publisher: "UDPPublisher") -> None:
+        self._publisher = publisher
+
+    def datagram_received(self, data: bytes, addr: tuple) -> None:
+        self._publisher._control(data, addr)
+
+    def error_received(self, exc: Exception) -> None:
+        pass
+
+
+class UDPPublisher(Publisher):
+    """
+    Publishes messages to subscribers over UDP. Subscribers register
+    (and request keyframes after losses) with control datagrams.
+    """
+
+    def __init__(
+        self,
+        host: str = '127.0.0.1',
+        port: int = 0,
+        keyframe_interval: int = 30
+    ) -> None:
+        super().__init__(keyframe_interval)
+        self.host: str = host
+        self.port: int = port
+        self.subscribers: set = set()
+
+        self._transport = None
+        # Numbers the messages sent, so that a keyframe sent on request
+        # and a delta of the same sequence never mix their chunks
+        self._messages = 0
+
+    async def start(self) -> None:
+        """Starts listening for subscribers."""
+        loop = asyncio.get_running_loop()
+        self._transport, protocol = await loop.create_datagram_endpoint(
+            lambda: _UDPPublisherProtocol(self),
+            local_addr=(self.host, self.port)
+        )
+        self.port = self._transport.get_extra_info('sockname')[1]
+
+    def _control(self, data: bytes, addr: tuple) -> None:
+        if data == _SUBSCRIBE:
+            self.subscribers.add(addr)
+        elif data == _UNSUBSCRIBE:
+            self.subscribers.discard(addr)
+            return
+        elif data != _KEYFRAME_REQUEST:
+            return
+        if self.sequence:
+            self._send(self.keyframe(), [addr])
+
+    def _send(self, message: bytes, addresses) -> None:
+        parts = max(1, -(-len(message) // _CHUNK_SIZE))
+        self._messages = (self._messages + 1) & 0xffffffff
+        chunks = [
+            _CHUNK.pack(
+                _CHUNK_MAGIC, self.epoch, self._messages, part, parts
+            ) +
+            message[part * _CHUNK_SIZE:(part + 1) * _CHUNK_SIZE]
+            for part in range(parts)
+        ]
+        for addr in addresses:
+            for chunk in chunks:
+                self._transport.sendto(chunk, addr)
+
+    async def publish_scan(self, results) -> None:
+        """Publishes a scan to every registered subscriber."""
+        self._send(self.publish(results), self.subscribers)
+
+    async def close(self) -> None:
+        """Stops listening."""
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+
+async def subscribe_tcp(subscriber: Subscriber, host: str, port: int) -> None:
+    """
+    Feeds ``subscriber`` from a :class:`TCPPublisher` until the
+    connection closes.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while True:
+            header = await reader.readexactly(_LENGTH.size)
+            message = await reader.readexactly(_LENGTH.unpack(header)[0])
+            subscriber.apply(message)
+    except asyncio.IncompleteReadError:
+        pass
+    finally:
+        writer.close()
+
+
+class _UDPSubscriberProtocol(asyncio.DatagramProtocol):
+    def __init__(self, subscriber: Subscriber) -> None:
+        self._subscriber = subscriber
+        self._parts = {}
+        self.transport = None
+
+    def connection_made(self, transport) -> None:
+        self.transport = transport
+        # Keyframes arrive as a burst of datagrams
+        transport.get_extra_info('socket').setsockopt(
+            socket.SOL_SOCKET, socket.SO_RCVBUF, _RCVBUF
+        )
+        transport.sendto(_SUBSCRIBE)
+
+    def datagram_received(self, data: bytes, addr: tuple) -> None:
+        if len(data) < _CHUNK.size:
+            return
+        magic, epoch, number, part, parts = _CHUNK.unpack_from(data)
+        if magic != _CHUNK_MAGIC:
+            return
+
+        key = (epoch, number, parts)
+        chunks = self._parts.setdefault(key, {})
+        chunks[part] = data[_CHUNK.size:]
+        if len(chunks) < parts:
+            return
+
+        del self._parts[key]
+        # Forget incomplete older messages, they will never complete
+        for other in list(self._parts):
+            if other[0] != epoch or other[1] < number:
+                del self._parts[other]
+
+        message = b''.join(chunks[i] for i in range(parts))
+        if not self._subscriber.apply(message):
+            self.transport.sendto(_KEYFRAME_REQUEST)
+
+    def error_received(self, exc: Exception) -> None:
+        pass
+
+
+async def subscribe_udp(
+    subscriber: Subscriber,
+    host: str,
+    port: int
+) -> asyncio.DatagramTransport:
+    """
+    Registers ``subscriber`` with a :class:`UDPPublisher`. Returns the
+    transport; close it to stop receiving.
+    """
+    loop = asyncio.get_running_loop()
+    transport, protocol = await loop.create_datagram_endpoint(
+        lambda: _UDPSubscriberProtocol(subscriber),
+        remote_addr=(host, port)
+    )
+    return transport
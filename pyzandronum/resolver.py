@@ -0,0 +1,157 @@
+"""
+Hostname resolution module for pyzandronum.
+
+Resolves server hostnames once and caches the results for a limited
+time, so repeated queries do not block on ``getaddrinfo``. Many targets
+can be resolved concurrently with :meth:`Resolver.resolve_many`.
+"""
+
+import asyncio
+import ipaddress
+import socket
+import time
+
+
+class Resolver:
+    """
+    Hostname resolver with a TTL cache.
+
+    Successful lookups are cached for ``ttl`` seconds, failed lookups
+    for ``negative_ttl`` seconds. Only IPv4 addresses are returned by
+    default, as query sockets are IPv4.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 300.0,
+        negative_ttl: float = 30.0,
+        family: int = socket.AF_INET
+    ) -> None:
+        self.ttl: float = ttl
+        self.negative_ttl: float = negative_ttl
+        self.family: int = family
+
+        # host -> (expiry time, IP address or exception)
+        self._cache: dict = {}
+        # host -> future of an in-flight asynchronous lookup
+        self._pending: dict = {}
+
+    def _cached(self, host: str):
+        entry = self._cache.get(host)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._cache[host]
+            return None
+        return entry[1]
+
+    def _store(self, host: str, result) -> None:
+        if isinstance(result, Exception):
+            ttl = self.negative_ttl
+        else:
+            ttl = self.ttl
+        self._cache[host] = (time.monotonic() + ttl, result)
+
+    @staticmethod
+    def _is_ip(host: str) -> bool:
+        try:
+            ipaddress.ip_address(host)
+        except ValueError:
+            return False
+        return True
+
+    def resolve(self, host: str, port: int) -> tuple:
+        """
+        Returns ``(ip, port)`` for ``host``, looking it up if it is not
+        cached. Raises :class:`socket.gaierror` if it can not be resolved.
+        """
+        if self._is_ip(host):
+            return host, port
+
+        result = self._cached(host)
+        if result is None:
+            try:
+                infos = socket.getaddrinfo(
+                    host, None, self.family, socket.SOCK_DGRAM
+                )
+                result = infos[0][4][0]
+            except socket.gaierror as e:
+                result = e
+            self._store(host, result)
+
+        if isinstance(result, Exception):
+            raise result
+        return result, port
+
+    async def resolve_async(self, host: str, port: int) -> tuple:
+        """
+        Asynchronous version of :meth:`resolve`. Concurrent lookups of
+        the same host share one ``getaddrinfo`` call.
+        """
+        if self._is_ip(host):
+            return host, port
+
+        result = self._cached(host)
+        if result is None:
+            future = self._pending.get(host)
+            if future is None:
+                future = asyncio.ensure_future(self._lookup(host))
+                self._pending[host] = future
+            result = await asyncio.shield(future)
+
+        if isinstance(result, Exception):
+            raise result
+        return result, port
+
+    async def _lookup(self, host: str):
+        loop = asyncio.get_running_loop()
+        try:
+            infos = await loop.getaddrinfo(
+                host, None, family=self.family, type=socket.SOCK_DGRAM
+            )
+            result = infos[0][4][0]
+        except socket.gaierror as e:
+            result = e
+        finally:
+            self._pending.pop(host, None)
+
+        self._store(host, result)
+        return result
+
+    async def resolve_many(self, targets: list, concurrency: int = 64) -> list:
+        """
+        Resolves a list of ``(host, port)`` targets concurrently; further
+        items of a target are ignored. Returns a list in the same order
+        holding ``(ip, port)`` or the exception raised for that target.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def resolve(host, port):
+            async with semaphore:
+                try:
+                    return await self.resolve_async(host, port)
+                except socket.gaierror as e:
+                    return e
+
+        return await asyncio.gather(
+            *(resolve(target[0], target[1]) for target in targets)
+        )
+
+    def clear(self) -> None:
+        """Forgets all cached lookups."""
+        self._cache.clear()
+
+
+_resolver = None
+
+
+def get_resolver() -> Resolver:
+    """
+    Returns the shared resolver used by servers by default.
+    """
+    global _resolver
+
+    if _resolver is None:
+        _resolver = Resolver()
+
+    return _resolver
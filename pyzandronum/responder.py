@@ -0,0 +1,747 @@
+"""
+Local stand-in Zandronum query server for pyzandronum.
+
+The responder answers launcher queries with synthetic server state, so
+scanners can be load-tested end to end on one machine. It can emulate
+many servers either on separate local ports, or on one port where the
+emulated server is picked by the request's time stamp field (see
+:func:`~pyzandronum.zandronum.build_request`), which is echoed back.
+:class:`~pyzandronum.scanner.Scanner` sends the token given as third
+item of a target, so such a fleet needs no socket per server.
+
+:class:`RCONResponder` likewise stands in for a server's remote console.
+"""
+
+import asyncio
+import hashlib
+import random
+import struct
+import time
+
+from . import enums
+from . import huffman
+from . import rcon
+
+RESPONDER_VERSION = '3.1-pyzandronum'
+
+_PLAYER_NAMES = [
+    'Doomguy', 'Marine', 'Corvus', 'Parias', 'Cyborg', 'Imp', 'Revenant',
+    'Mancubus', 'Cacodemon', 'Archvile', 'Baron', 'Spectre', 'Lost Soul',
+    'Arachnotron', 'Pain', 'Zombieman', 'Chaingunner', 'Keen', 'Wolf',
+    'Icon'
+]
+_MAPS = ['MAP01', 'MAP07', 'MAP15', 'MAP29', 'E1M1', 'E2M8', 'D2DM1']
+_PWADS = [
+    'zandronum-dm.pk3', 'skulltag_actors.pk3', 'zdactf.pk3', 'hexdd.wad',
+    'dwango5.wad', 'brutalv21.pk3', 'zvox.wad'
+]
+_COLOR_CODES = ['A', 'C', 'D', 'F', 'G', 'H', 'K', '[b1]', '[red]']
+_IWADS = [('DOOM II', 'doom2.wad'), ('DOOM', 'doom.wad'), ('HERETIC', 'heretic.wad')]
+_TEAMS = [('Blue', 0x0000FF), ('Red', 0xFF0000)]
+_COUNTRIES = ['USA', 'DEU', 'BRA', 'RUS', 'POL', 'XUN']
+
+
+class _PacketWriter:
+    """
+    Little-endian packet builder mirroring the server's NETWORK_Write*.
+    """
+
+    def __init__(self) -> None:
+        self.data = bytearray()
+
+    def byte(self, value: int) -> None:
+        self.data.append(value & 0xFF)
+
+    def short(self, value: int) -> None:
+        self.data += struct.pack('<H', value & 0xFFFF)
+
+    def long(self, value: int) -> None:
+        self.data += struct.pack('<L', value & 0xFFFFFFFF)
+
+    def float(self, value: float) -> None:
+        self.data += struct.pack('<f', value)
+
+    def string(self, value: str) -> None:
+        self.data += value.encode('latin-1') + b'\x00'
+
+
+def colorize(name: str, rng: random.Random) -> str:
+    """
+    Inserts random Zandronum color codes (``\\x1c``) into a name.
+    """
+    return ''.join(
+        '\x1c' + rng.choice(_COLOR_CODES) + char if rng.random() < 0.3
+        else char
+        for char in name
+    )
+
+
+def generate_state(
+    rng: random.Random = None,
+    players: tuple = (0, 16),
+    pwads: tuple = (0, 3),
+    colored_names: float = 0.5,
+    gamemode: enums.Gamemode = None
+) -> dict:
+    """
+    Generates synthetic server state. ``players`` and ``pwads`` are
+    inclusive ``(min, max)`` ranges. Keys match ``Server.query_dict``,
+    plus ``players`` (list of player dicts with raw, color-coded names).
+    """
+    if rng is None:
+        rng = random.Random()
+    if gamemode is None:
+        gamemode = rng.choice(list(enums.Gamemode))
+
+    teamgame = gamemode in enums.TEAM_GAMEMODES
+    maxclients = max(players[1], 1)
+    gamename, iwad = rng.choice(_IWADS)
+    timelimit = rng.choice([0, 0, 10, 20])
+
+    player_list = []
+    for i in range(rng.randint(players[0], players[1])):
+        name = f'{rng.choice(_PLAYER_NAMES)}{i}'
+        if rng.random() < colored_names:
+            name = colorize(name, rng)
+        player_list.append({
+            'name': name,
+            'score': rng.randint(0, 200),
+            'ping': rng.randint(5, 300),
+            'spectator': rng.random() < 0.1,
+            'bot': rng.random() < 0.2,
+            'team': rng.randint(0, 1) if teamgame else None,
+            'time': rng.randint(0, 255)
+        })
+
+    pwads_list = rng.sample(_PWADS, rng.randint(pwads[0], pwads[1]))
+
+    team_scores = [0] * len(_TEAMS)
+    for player in player_list:
+        if player['team'] is not None:
+            team_scores[player['team']] += player['score']
+
+    return {
+        'response': enums.Response.ACCEPTED,
+        'version': RESPONDER_VERSION,
+        'hostname': f'\x1cD:: \x1c-Synthetic {gamemode} server',
+        'url': 'https://example.org/wads/',
+        'hostemail': 'admin@example.org',
+        'map': rng.choice(_MAPS),
+        'maxclients': maxclients,
+        'maxplayers': maxclients,
+        'pwads_list': pwads_list,
+        'gamemode': gamemode,
+        'teamgame': teamgame,
+        'instagib': False,
+        'buckshot': False,
+        'gamename': gamename,
+        'iwad': iwad,
+        'forcepassword': False,
+        'forcejoinpassword': False,
+        'skill': rng.randint(0, 4),
+        'botskill': rng.randint(0, 4),
+        'fraglimit': rng.choice([0, 20, 50]),
+        'timelimit': timelimit,
+        'timelimit_left': rng.randint(0, timelimit),
+        'duellimit': 0,
+        'pointlimit': 0,
+        'winlimit': 0,
+        'teamdamage': 0.0,
+        'players': player_list,
+        'testing_server': False,
+        'testing_server_archive': '',
+        'dmflags_list': [0, 0, 0, 0, 0, 0],
+        'security_settings': 1,
+        'optional_pwads': [],
+        'deh_list': [],
+        'team_names': [name for name, color in _TEAMS],
+        'team_colors': [color for name, color in _TEAMS],
+        'team_scores': team_scores,
+        'pwad_hashes': [
+            hashlib.md5(pwad.encode('latin-1')).hexdigest()
+            for pwad in pwads_list
+        ],
+        'country': rng.choice(_COUNTRIES),
+        'gamemode_name': str(gamemode),
+        'gamemode_shortname': gamemode.name,
+        'voicechat': 0
+    }
+
+
+def build_response(
+    state: dict,
+    flags: int,
+    timestamp: int,
+    extended_flags: int = 0
+) -> bytes:
+    """
+    Builds a raw (not Huffman-encoded) launcher response for ``state``,
+    containing only the fields requested by ``flags`` and, with
+    ``SQF_EXTENDED_INFO``, by ``extended_flags``.
+    """
+    F = enums.RequestFlags
+    F2 = enums.ExtendedFlags
+    packet = _PacketWriter()
+
+    response = state.get('response', enums.Response.ACCEPTED)
+    packet.long(response.value)
+    packet.long(timestamp)
+
+    if response is not enums.Response.ACCEPTED:
+        return bytes(packet.data)
+
+    players = state['players']
+
+    # Like the server, send the counts the per-item fields depend on
+    if flags & F.SQF_PLAYERDATA.value:
+        flags |= F.SQF_NUMPLAYERS.value
+    if flags & enums.TEAMINFO_FIELDS.value:
+        flags |= F.SQF_TEAMINFO_NUMBER.value
+    # Team info is only sent in game modes with teams
+    if not state['teamgame']:
+        flags &= ~(F.SQF_TEAMINFO_NUMBER.value | enums.TEAMINFO_FIELDS.value)
+
+    packet.string(state['version'])
+    packet.long(flags)
+
+    if flags & F.SQF_NAME.value:
+        packet.string(state['hostname'])
+    if flags & F.SQF_URL.value:
+        packet.string(state['url'])
+    if flags & F.SQF_EMAIL.value:
+        packet.string(state['hostemail'])
+    if flags & F.SQF_MAPNAME.value:
+        packet.string(state['map'])
+    if flags & F.SQF_MAXCLIENTS.value:
+        packet.byte(state['maxclients'])
+    if flags & F.SQF_MAXPLAYERS.value:
+        packet.byte(state['maxplayers'])
+    if flags & F.SQF_PWADS.value:
+        packet.byte(len(state['pwads_list']))
+        for pwad in state['pwads_list']:
+            packet.string(pwad)
+    if flags & F.SQF_GAMETYPE.value:
+        packet.byte(state['gamemode'].value)
+        packet.byte(state['instagib'])
+        packet.byte(state['buckshot'])
+    if flags & F.SQF_GAMENAME.value:
+        packet.string(state['gamename'])
+    if flags & F.SQF_IWAD.value:
+        packet.string(state['iwad'])
+    if flags & F.SQF_FORCEPASSWORD.value:
+        packet.byte(state['forcepassword'])
+    if flags & F.SQF_FORCEJOINPASSWORD.value:
+        packet.byte(state['forcejoinpassword'])
+    if flags & F.SQF_GAMESKILL.value:
+        packet.byte(state['skill'])
+    if flags & F.SQF_BOTSKILL.value:
+        packet.byte(state['botskill'])
+    if flags & F.SQF_DMFLAGS.value:
+        for value in state['dmflags_list'][:3]:
+            packet.long(value)
+    if flags & F.SQF_LIMITS.value:
+        packet.short(state['fraglimit'])
+        packet.short(state['timelimit'])
+        if state['timelimit']:
+            packet.short(state['timelimit_left'])
+        packet.short(state['duellimit'])
+        packet.short(state['pointlimit'])
+        packet.short(state['winlimit'])
+    if flags & F.SQF_TEAMDAMAGE.value:
+        packet.float(state['teamdamage'])
+    if flags & F.SQF_TEAMSCORES.value:
+        packet.short(0)
+        packet.short(0)
+    if flags & F.SQF_NUMPLAYERS.value:
+        packet.byte(len(players))
+    if flags & F.SQF_PLAYERDATA.value:
+        for player in players:
+            packet.string(player['name'])
+            packet.short(player['score'])
+            packet.short(player['ping'])
+            packet.byte(player['spectator'])
+            packet.byte(player['bot'])
+            if state['teamgame']:
+                packet.byte(player['team'])
+            packet.byte(player['time'])
+    if flags & F.SQF_TEAMINFO_NUMBER.value:
+        packet.byte(len(state['team_names']))
+    if flags & F.SQF_TEAMINFO_NAME.value:
+        for name in state['team_names']:
+            packet.string(name)
+    if flags & F.SQF_TEAMINFO_COLOR.value:
+        for color in state['team_colors']:
+            packet.long(color)
+    if flags & F.SQF_TEAMINFO_SCORE.value:
+        for score in state['team_scores']:
+            packet.short(score)
+    if flags & F.SQF_TESTING_SERVER.value:
+        packet.byte(state['testing_server'])
+        packet.string(state['testing_server_archive'])
+    if flags & F.SQF_DATA_MD5SUM.value:
+        packet.string('')
+    if flags & F.SQF_ALL_DMFLAGS.value:
+        packet.byte(len(state['dmflags_list']))
+        for value in state['dmflags_list']:
+            packet.long(value)
+    if flags & F.SQF_SECURITY_SETTINGS.value:
+        packet.byte(state['security_settings'])
+    if flags & F.SQF_OPTIONAL_WADS.value:
+        packet.byte(len(state['optional_pwads']))
+        for pwad in state['optional_pwads']:
+            packet.byte(state['pwads_list'].index(pwad))
+    if flags & F.SQF_DEH.value:
+        packet.byte(len(state['deh_list']))
+        for deh in state['deh_list']:
+            packet.string(deh)
+    if flags & F.SQF_EXTENDED_INFO.value:
+        extended_flags &= F2.all().value
+        packet.long(extended_flags)
+        if extended_flags & F2.SQF2_PWAD_HASHES.value:
+            packet.byte(len(state['pwad_hashes']))
+            for pwad_hash in state['pwad_hashes']:
+                packet.string(pwad_hash)
+        if extended_flags & F2.SQF2_COUNTRY.value:
+            packet.data += state['country'].encode('latin-1')[:3]
+        if extended_flags & F2.SQF2_GAMEMODE_NAME.value:
+            packet.string(state['gamemode_name'])
+        if extended_flags & F2.SQF2_GAMEMODE_SHORTNAME.value:
+            packet.string(state['gamemode_shortname'])
+        if extended_flags & F2.SQF2_VOICECHAT.value:
+            packet.byte(state['voicechat'])
+
+    return bytes(packet.data)
+
+
+class _ResponderProtocol(asyncio.DatagramProtocol):
+    def __init__(self, responder: "Responder", index: int = None) -> None:
+        self._responder = responder
+        self._index = index
+        self.transport = None
+
+    def connection_made(self, transport) -> None:
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr: tuple) -> None:
+        self._responder._handle(self.transport, self._index, data, addr)
+
+    def error_received(self, exc: Exception) -> None:
+        pass
+
+
+class Responder:
+    """
+    Asyncio UDP responder emulating one or many Zandronum servers.
+
+    ``loss`` is the probability of silently dropping a request,
+    ``latency`` and ``jitter`` (seconds) delay each reply, and
+    ``deny_rate``/``ban_rate`` answer with ``DENIED_QUERY`` or
+    ``DENIED_BANNED`` at random. A state whose ``response`` key is not
+    ``ACCEPTED`` always answers with that response.
+    """
+
+    def __init__(
+        self,
+        states: list,
+        loss: float = 0.0,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        deny_rate: float = 0.0,
+        ban_rate: float = 0.0,
+        seed: int = None
+    ) -> None:
+        self.states: list[dict] = states
+        self.loss: float = loss
+        self.latency: float = latency
+        self.jitter: float = jitter
+        self.deny_rate: float = deny_rate
+        self.ban_rate: float = ban_rate
+        self.addresses: list[tuple] = []
+        self.stats = {
+            'requests': 0,
+            'replies': 0,
+            'dropped': 0,
+            'malformed': 0
+        }
+
+        self._rng = random.Random(seed)
+        self._huffman = huffman.get_codec()
+        self._transports = []
+        self._cache = {}
+
+    @classmethod
+    def synthetic(cls, count: int, seed: int = None, **kwargs) -> "Responder":
+        """
+        Creates a responder for ``count`` randomly generated servers.
+        Keyword arguments are passed to the constructor.
+        """
+        rng = random.Random(seed)
+        states = [generate_state(rng) for i in range(count)]
+        return cls(states, seed=seed, **kwargs)
+
+    async def __aenter__(self) -> "Responder":
+        if not self._transports:
+            await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    async def start(
+        self,
+        host: str = '127.0.0.1',
+        port: int = 0,
+        multiplex: bool = False
+    ) -> list:
+        """
+        Starts listening and returns the list of scan targets, one per
+        emulated server. These are ``(host, port)`` addresses, or with
+        ``multiplex``, ``(host, port, token)`` targets sharing one port,
+        where the token is the index of the emulated server. With
+        ``port=0`` ephemeral ports are used, otherwise consecutive ports
+        starting at ``port``.
+        """
+        loop = asyncio.get_running_loop()
+
+        if multiplex:
+            transport, protocol = await loop.create_datagram_endpoint(
+                lambda: _ResponderProtocol(self),
+                local_addr=(host, port)
+            )
+            self._transports.append(transport)
+            host, port = transport.get_extra_info('sockname')[:2]
+            self.addresses = [
+                (host, port, index) for index in range(len(self.states))
+            ]
+            return self.addresses
+
+        for index in range(len(self.states)):
+            transport, protocol = await loop.create_datagram_endpoint(
+                lambda index=index: _ResponderProtocol(self, index),
+                local_addr=(host, port + index if port else 0)
+            )
+            self._transports.append(transport)
+            self.addresses.append(transport.get_extra_info('sockname')[:2])
+
+        return self.addresses
+
+    def close(self) -> None:
+        """Stops listening on all ports."""
+        for transport in self._transports:
+            transport.close()
+        self._transports = []
+
+    def _handle(self, transport, index: int, data: bytes, addr: tuple) -> None:
+        self.stats['requests'] += 1
+
+        try:
+            request = self._huffman.decode(data)
+            challenge, flags, token = struct.unpack_from('<lLl', request)
+            extended_flags = 0
+            if len(request) >= 16:
+                extended_flags = struct.unpack_from('<L', request, 12)[0]
+        except (IndexError, ValueError, KeyError, struct.error):
+            self.stats['malformed'] += 1
+            return
+
+        if challenge != enums.LAUNCHER_CHALLENGE:
+            self.stats['malformed'] += 1
+            return
+
+        if index is None:
+            # One port for all servers: the token picks the server
+            if not 0 <= token < len(self.states):
+                self.stats['malformed'] += 1
+                return
+            index = token
+
+        rng = self._rng
+        if self.loss and rng.random() < self.loss:
+            self.stats['dropped'] += 1
+            return
+
+        if self.ban_rate and rng.random() < self.ban_rate:
+            reply = self._encode(
+                None, enums.Response.DENIED_BANNED, 0, 0, token
+            )
+        elif self.deny_rate and rng.random() < self.deny_rate:
+            reply = self._encode(
+                None, enums.Response.DENIED_QUERY, 0, 0, token
+            )
+        else:
+            reply = self._encode(index, None, flags, extended_flags, token)
+
+        delay = self.latency
+        if self.jitter:
+            delay += rng.random() * self.jitter
+
+        if delay > 0:
+            asyncio.get_running_loop().call_later(
+                delay, self._send, transport, reply, addr
+            )
+        else:
+            self._send(transport, reply, addr)
+
+    def _encode(
+        self,
+        index: int,
+        response: enums.Response,
+        flags: int,
+        extended_flags: int,
+        token: int
+    ) -> bytes:
+        # Encoded replies only differ by their token within a burst,
+        # so cache them instead of Huffman-encoding every reply
+        key = (index, response, flags, extended_flags, token)
+        reply = self._cache.get(key)
+
+        if reply is None:
+            if len(self._cache) > 65536:
+                self._cache.clear()
+
+            if response is None:
+                state = self.states[index]
+            else:
+                state = {'response': response}
+
+            reply = self._huffman.encode(
+                build_response(state, flags, token, extended_flags)
+            )
+            self._cache[key] = reply
+
+        return reply
+
+    def _send(self, transport, reply: bytes, addr: tuple) -> None:
+        if not transport.is_closing():
+            transport.sendto(reply, addr)
+            self.stats['replies'] += 1
+
+
+class _RCONResponderProtocol(asyncio.DatagramProtocol):
+    def __init__(self, responder: "RCONResponder") -> None:
+        self._responder = responder
+
+    def datagram_received(self, data: bytes, addr: tuple) -> None:
+        self._responder._handle(data, addr)
+
+    def error_received(self, exc: Exception) -> None:
+        pass
+
+
+class RCONResponder:
+    """
+    Asyncio UDP stand-in for a Zandronum server's remote console.
+
+    Understands ``map <name>`` (announces the map change), ``say <text>``
+    and ``echo <text>``; ``commands`` maps more command names to
+    callables taking the argument string and returning a line or a list
+    of lines. Sessions that send no heartbeat for ``timeout`` seconds
+    are dropped, like the real server does.
+    """
+
+    def __init__(
+        self,
+        password: str,
+        hostname: str = 'pyzandronum RCON test server',
+        map: str = 'MAP01',
+        players: list = None,
+        commands: dict = None,
+        timeout: float = 10.0,
+        seed: int = None
+    ) -> None:
+        self.password: str = password
+        self.hostname: str = hostname
+        self.map: str = map
+        self.players: list[str] = list(players or [])
+        self.commands: dict = dict(commands or {})
+        self.timeout: float = timeout
+        self.history: list[str] = []
+        self.address: tuple = None
+        # addr -> {'salt', 'authenticated', 'last_seen'}
+        self.sessions: dict = {}
+        self.stats = {
+            'sessions': 0,
+            'logins': 0,
+            'failed_logins': 0,
+            'commands': 0,
+            'pongs': 0,
+            'expired': 0,
+            'malformed': 0
+        }
+
+        self._rng = random.Random(seed)
+        self._huffman = huffman.get_codec()
+        self._transport = None
+        self._expiry = None
+
+    async def __aenter__(self) -> "RCONResponder":
+        if self._transport is None:
+            await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> tuple:
+        """Starts listening and returns the ``(host, port)`` address."""
+        loop = asyncio.get_running_loop()
+        self._transport, protocol = await loop.create_datagram_endpoint(
+            lambda: _RCONResponderProtocol(self),
+            local_addr=(host, port)
+        )
+        self.address = self._transport.get_extra_info('sockname')[:2]
+        self._expire()
+        return self.address
+
+    def close(self) -> None:
+        """Stops listening."""
+        if self._expiry is not None:
+            self._expiry.cancel()
+            self._expiry = None
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        for addr, session in list(self.sessions.items()):
+            if now - session['last_seen'] > self.timeout:
+                del self.sessions[addr]
+                self.stats['expired'] += 1
+        self._expiry = asyncio.get_running_loop().call_later(
+            min(self.timeout, 1.0), self._expire
+        )
+
+    def _send(self, addr: tuple, packet: _PacketWriter) -> None:
+        if self._transport is not None:
+            self._transport.sendto(
+                self._huffman.encode(bytes(packet.data)), addr
+            )
+
+    def broadcast(self, line: str) -> None:
+        """Prints a console line to every logged in session."""
+        self.history = (self.history + [line])[-20:]
+        packet = _PacketWriter()
+        packet.byte(rcon.SVRC_MESSAGE)
+        packet.string(line)
+        for addr, session in self.sessions.items():
+            if session['authenticated']:
+                self._send(addr, packet)
+
+    def _broadcast_map(self) -> None:
+        packet = _PacketWriter()
+        packet.byte(rcon.SVRC_UPDATE)
+        packet.byte(rcon.SVRCU_MAP)
+        packet.string(self.map)
+        for addr, session in self.sessions.items():
+            if session['authenticated']:
+                self._send(addr, packet)
+
+    def _handle(self, data: bytes, addr: tuple) -> None:
+        try:
+            data = self._huffman.decode(data)
+            command = data[0]
+            argument = data[1:].split(b'\x00', 1)[0].decode('latin-1')
+        except (IndexError, ValueError, KeyError):
+            self.stats['malformed'] += 1
+            return
+
+        session = self.sessions.get(addr)
+        packet = _PacketWriter()
+
+        if command == rcon.CLRC_BEGINCONNECTION:
+            if data[1:2] != bytes([rcon.RCON_PROTOCOL_VERSION]):
+                packet.byte(rcon.SVRC_OLDPROTOCOL)
+                self._send(addr, packet)
+                return
+            salt = '%032x' % self._rng.getrandbits(128)
+            self.sessions[addr] = {
+                'salt': salt,
+                'authenticated': False,
+                'last_seen': time.monotonic()
+            }
+            self.stats['sessions'] += 1
+            packet.byte(rcon.SVRC_SALT)
+            packet.string(salt)
+            self._send(addr, packet)
+            return
+
+        if session is None:
+            return
+        session['last_seen'] = time.monotonic()
+
+        if command == rcon.CLRC_PASSWORD:
+            if argument != rcon.password_hash(session['salt'], self.password):
+                del self.sessions[addr]
+                self.stats['failed_logins'] += 1
+                packet.byte(rcon.SVRC_INVALIDPASSWORD)
+                self._send(addr, packet)
+                return
+            session['authenticated'] = True
+            self.stats['logins'] += 1
+            packet.byte(rcon.SVRC_LOGGEDIN)
+            packet.byte(rcon.RCON_PROTOCOL_VERSION)
+            packet.string(self.hostname)
+            packet.byte(3)
+            packet.byte(rcon.SVRCU_PLAYERDATA)
+            packet.byte(len(self.players))
+            for player in self.players:
+                packet.string(player)
+            packet.byte(rcon.SVRCU_ADMINCOUNT)
+            packet.byte(sum(
+                session['authenticated'] for session in self.sessions.values()
+            ))
+            packet.byte(rcon.SVRCU_MAP)
+            packet.string(self.map)
+            packet.byte(len(self.history))
+            for line in self.history:
+                packet.string(line)
+            self._send(addr, packet)
+            return
+
+        if not session['authenticated']:
+            return
+
+        if command == rcon.CLRC_PONG:
+            self.stats['pongs'] += 1
+        elif command == rcon.CLRC_DISCONNECT:
+            del self.sessions[addr]
+        elif command == rcon.CLRC_COMMAND:
+            self.stats['commands'] += 1
+            self._command(argument)
+        elif command == rcon.CLRC_TABCOMPLETE:
+            names = sorted(
+                name for name in ('echo', 'map', 'say', *self.commands)
+                if name.startswith(argument)
+            )
+            if len(names) > 50:
+                packet.byte(rcon.SVRC_TOOMANYTABCOMPLETES)
+                packet.short(len(names))
+            else:
+                packet.byte(rcon.SVRC_TABCOMPLETE)
+                packet.byte(len(names))
+                for name in names:
+                    packet.string(name)
+            self._send(addr, packet)
+
+    def _command(self, text: str) -> None:
+        name, _, argument = text.strip().partition(' ')
+        argument = argument.strip()
+
+        if name == 'map' and argument:
+            self.map = argument
+            self._broadcast_map()
+            lines = [f'Changing map to {argument}']
+        elif name == 'say':
+            lines = [f'<server>: {argument}']
+        elif name == 'echo':
+            lines = [argument]
+        elif name in self.commands:
+            lines = self.commands[name](argument)
+            if isinstance(lines, str):
+                lines = [lines]
+        else:
+            lines = [f'Unknown command "{name}"']
+
+        for line in lines:
+            self.broadcast(line)
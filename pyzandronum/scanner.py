@@ -0,0 +1,813 @@
+"""
+Fleet scanning module for pyzandronum.
+
+:class:`Scanner` queries many servers from a single asynchronous UDP
+socket, keeping a bounded number of queries in flight. For fleets large
+enough to saturate one core with decoding and parsing,
+:class:`ShardedScanner` splits the targets across worker processes.
+"""
+
+import asyncio
+import collections
+import gzip
+import json
+import multiprocessing
+import os
+import queue
+import struct
+import time
+
+from . import asyncudp
+from . import enums
+from . import exceptions
+from . import huffman
+from . import zandronum
+from .capture import CaptureWriter
+from .engine import DatagramEngine
+from .export import _json_default
+from .health import HealthTracker, CircuitOpen
+from .metrics import Metrics, NULL_TIMER
+from .resolver import Resolver, get_resolver
+
+
+# Lower bound of per-server retransmission timeouts in seconds, like
+# Linux TCP's; below it, replies still queued behind others on a busy
+# host would be taken for losses
+_MIN_RTO = 0.2
+
+# Socket receive buffer size, enough for the replies of every query in
+# flight to queue up while the event loop is busy parsing
+_RCVBUF = 4 * 1024 * 1024
+
+# Time stamp field of a decoded reply, after the response code
+_TOKEN = struct.Struct('<l')
+
+
+class WorkerCrashed(Exception):
+    """
+    Raises for targets left unscanned by a worker process that crashed
+    more often than allowed.
+    """
+
+    def __str__(self):
+        return 'Scan worker process crashed'
+
+
+class ScanPending(Exception):
+    """
+    Marks targets that had not answered by the deadline of
+    :meth:`Scanner.scan_deadline`.
+    """
+
+    def __str__(self):
+        return 'Server has not answered yet'
+
+
+class ScanResult:
+    """
+    Represents the outcome of querying one scan target.
+    """
+
+    __slots__ = ('index', 'address', 'port', 'server', 'error', 'latency')
+
+    def __init__(
+        self,
+        index: int,
+        address: str,
+        port: int,
+        server: zandronum.Server = None,
+        error: Exception = None,
+        latency: float = None
+    ) -> None:
+        # Position of the target in the scanned list
+        self.index: int = index
+        self.address: str = address
+        self.port: int = port
+        # The parsed server if it responded (also set on denials)
+        self.server: zandronum.Server = server
+        # The exception if the query failed
+        self.error: Exception = error
+        # Round-trip time in seconds, if it responded
+        self.latency: float = latency
+
+    def __repr__(self) -> str:
+        status = 'ok' if self.error is None else type(self.error).__name__
+        return f'<ScanResult {self.address}:{self.port} {status}>'
+
+    @property
+    def ok(self) -> bool:
+        """:class:`bool`: Returns True if the server answered the query."""
+        return self.error is None
+
+    @property
+    def pending(self) -> bool:
+        """:class:`bool`: Returns True if the result is not known yet."""
+        return isinstance(self.error, ScanPending)
+
+
+class DeadlineScan:
+    """
+    Results of :meth:`Scanner.scan_deadline` at its deadline.
+
+    ``results`` holds one :class:`ScanResult` per target in target
+    order; targets that had not answered yet are marked ``pending`` and
+    replaced as their results arrive. :meth:`late` yields those late
+    results.
+    """
+
+    def __init__(self, results: list, task: asyncio.Task) -> None:
+        self.results: list[ScanResult] = results
+        self.pending: set[int] = {
+            result.index for result in results if result.pending
+        }
+
+        self._task = task
+        self._late = asyncio.Queue()
+
+    @property
+    def done(self) -> bool:
+        """:class:`bool`: Returns True once no target is pending."""
+        return not self.pending
+
+    def _deliver(self, result: ScanResult) -> None:
+        self.results[result.index] = result
+        self.pending.discard(result.index)
+        self._late.put_nowait(result)
+
+    async def late(self):
+        """Yields late results in completion order until none is left."""
+        while self.pending or not self._late.empty():
+            result = await self._late.get()
+            if result is None:
+                return
+            yield result
+
+    def cancel(self) -> None:
+        """Stops waiting; results still pending stay pending."""
+        self._task.cancel()
+        self.pending.clear()
+        self._late.put_nowait(None)
+
+
+class Scanner:
+    """
+    Queries many Zandronum servers concurrently from one UDP socket.
+
+    At most ``concurrency`` queries are in flight at once. Targets that
+    do not answer within ``timeout`` seconds are retried ``retries``
+    times before being reported with :class:`~.exceptions.QueryTimeout`.
+    Targets resolving to the same address are queried only once. A
+    target may carry a token as third item, ``(host, port, token)``;
+    it is sent in the request's time stamp field, and targets on the
+    same address with different tokens are queried and matched
+    separately, e.g. the servers of a multiplexed
+    :class:`~.responder.Responder`.
+
+    With ``rate``, new queries are paced to that many per second. With
+    ``engine``, the socket is a :class:`~.engine.DatagramEngine`, which
+    receives into a reusable buffer ring instead of a queue, and new
+    queries are sent with :meth:`~.engine.DatagramEngine.send_burst`. With
+    ``validate``, responses are parsed in validating mode and broken
+    ones are reported with :class:`~.exceptions.MalformedResponse`.
+
+    With ``health``, a :class:`~.health.HealthTracker`, servers whose
+    circuit is open are skipped and reported with
+    :class:`~.health.CircuitOpen`, every outcome is recorded, and the
+    tracker is saved after each scan.
+
+    Each scanner remembers the round-trip time, player count and last
+    snapshot of every address it has scanned. Later scans query servers
+    with players and low latency first, and retry a server as soon as
+    its answer is overdue according to its own round-trip times (the
+    last attempt still waits ``timeout``). With ``state``, this memory,
+    the circuit breakers and the rate limit are saved to that file after
+    every scan and restored from it lazily, so a restarted scanner does
+    not start cold.
+    """
+
+    def __init__(
+        self,
+        flags: enums.RequestFlags = enums.RequestFlags.default(),
+        timeout: float = 5.0,
+        concurrency: int = 256,
+        retries: int = 1,
+        metrics: Metrics = None,
+        resolver: Resolver = None,
+        capture: CaptureWriter = None,
+        local_addr: tuple = ('0.0.0.0', 0),
+        rate: float = None,
+        engine: bool = False,
+        validate: bool = False,
+        health: HealthTracker = None,
+        state: str = None
+    ) -> None:
+        self.flags: enums.RequestFlags = flags
+        self.timeout: float = timeout
+        self.concurrency: int = concurrency
+        self.retries: int = retries
+        self.metrics: Metrics = metrics
+        self.resolver: Resolver = resolver or get_resolver()
+        self.capture: CaptureWriter = capture
+        self.local_addr: tuple = local_addr
+        self.rate: float = rate
+        self.engine: bool = engine
+        self.validate: bool = validate
+        self.health: HealthTracker = health
+        self.state: str = state
+
+        self._huffman = huffman.get_codec()
+        # address -> (smoothed RTT, RTT variation, number of players)
+        self._history = {}
+        # address -> last Server that answered, or its snapshot once
+        # restored from the state file; snapshots are taken on demand
+        self._snapshots = {}
+        # Token bucket for pacing new queries: tokens, last refill
+        self._tokens = 1.0
+        self._refilled = time.time()
+        self._state_loaded = state is None
+
+    def _priority(self, addr: tuple) -> tuple:
+        # Busy, fast servers first; unknown ones before dead ones
+        srtt, rttvar, players = self._history.get(
+            addr, (self.timeout / 2, 0.0, 0)
+        )
+        return (players == 0, srtt)
+
+    def _rto(self, addr: tuple, attempt: int) -> float:
+        """Returns how long to wait for an answer to ``attempt``."""
+        history = self._history.get(addr)
+        if history is None or attempt > self.retries:
+            return self.timeout
+        # Retransmission timeout like TCP's (RFC 6298), doubled per retry
+        rto = max(_MIN_RTO, history[0] + 4 * history[1])
+        return min(rto * 2 ** (attempt - 1), self.timeout)
+
+    def _remember(self, addr: tuple, latency: float, server) -> None:
+        previous = self._history.get(addr)
+        if latency is None:
+            # Timed out: treat it as slower than any reply
+            self._history[addr] = (self.timeout, self.timeout / 2, 0)
+            return
+
+        if previous is None or previous[0] >= self.timeout:
+            srtt, rttvar = latency, latency / 2
+        else:
+            rttvar = 0.75 * previous[1] + 0.25 * abs(previous[0] - latency)
+            srtt = 0.875 * previous[0] + 0.125 * latency
+        players = server.query_dict.get('numplayers') or 0
+        self._history[addr] = (srtt, rttvar, players)
+        self._snapshots[addr] = server
+
+    def _snapshot(self, addr: tuple) -> dict:
+        snapshot = self._snapshots.get(addr)
+        if isinstance(snapshot, zandronum.Server):
+            try:
+                snapshot = snapshot.snapshot()
+            except exceptions.MalformedResponse:
+                snapshot = None
+            self._snapshots[addr] = snapshot
+        return snapshot
+
+    def last_snapshot(self, address: str, port: int) -> dict:
+        """
+        Returns the last snapshot of a server that answered this
+        scanner (by resolved ``(ip, port)`` address), or None.
+        """
+        self._load_state()
+        return self._snapshot((address, port))
+
+    def _load_state(self) -> None:
+        if self._state_loaded:
+            return
+        self._state_loaded = True
+        if not os.path.exists(self.state):
+            return
+
+        with gzip.open(self.state, 'rt', encoding='utf-8') as fp:
+            data = json.load(fp)
+
+        for ip, port, srtt, rttvar, players, snapshot in data['servers']:
+            addr = (ip, port)
+            self._history[addr] = (srtt, rttvar, players)
+            if snapshot is not None:
+                gamemode = snapshot['query'].get('gamemode')
+                if gamemode is not None:
+                    snapshot['query']['gamemode'] = enums.Gamemode[gamemode]
+                self._snapshots[addr] = snapshot
+        self._tokens, self._refilled = data['bucket']
+        if self.health is not None and data['health'] is not None and \
+                not len(self.health):
+            self.health.from_dict(data['health'])
+
+    def save_state(self, path: str = None) -> None:
+        """
+        Saves round-trip times, player counts, last snapshots, circuit
+        breakers and the rate limit bucket to ``path`` (default:
+        :attr:`state`) as gzip-compressed JSON.
+        """
+        path = path or self.state
+        self._load_state()
+        data = {
+            'servers': [
+                [addr[0], addr[1], *history, self._snapshot(addr)]
+                for addr, history in self._history.items()
+            ],
+            'bucket': [self._tokens, self._refilled],
+            'health': (
+                self.health.to_dict() if self.health is not None else None
+            )
+        }
+        temp = path + '.tmp'
+        with gzip.open(temp, 'wt', encoding='utf-8', compresslevel=6) as fp:
+            json.dump(data, fp, default=_json_default, separators=(',', ':'))
+        os.replace(temp, path)
+
+    async def scan(self, targets):
+        """
+        Scans a list of ``(address, port)`` targets. Asynchronously
+        yields one :class:`ScanResult` per target in completion order.
+        """
+        targets = list(targets)
+        results = asyncio.Queue()
+        task = asyncio.ensure_future(self._run(targets, results.put_nowait))
+
+        try:
+            for i in range(len(targets)):
+                result = await results.get()
+                if isinstance(result, Exception):
+                    raise result
+                yield result
+        finally:
+            if not task.done():
+                task.cancel()
+
+    async def scan_all(self, targets) -> list:
+        """
+        Scans a list of ``(address, port)`` targets and returns the
+        results in target order.
+        """
+        targets = list(targets)
+        results = [None] * len(targets)
+        async for result in self.scan(targets):
+            results[result.index] = result
+        return results
+
+    async def scan_deadline(
+        self,
+        targets,
+        deadline: float,
+        on_late=None
+    ) -> DeadlineScan:
+        """
+        Scans a list of ``(address, port)`` targets for at most
+        ``deadline`` seconds and returns a :class:`DeadlineScan` with
+        everything that answered by then. The scan continues in the
+        background: late results are passed to ``on_late`` and yielded
+        by :meth:`DeadlineScan.late`.
+        """
+        targets = list(targets)
+        results = [
+            ScanResult(index, target[0], target[1], error=ScanPending())
+            for index, target in enumerate(targets)
+        ]
+        partial = None
+        finished = asyncio.Event()
+        remaining = len(targets)
+
+        def emit(result):
+            nonlocal remaining
+            if isinstance(result, Exception):
+                # The scan itself failed; nothing more will arrive
+                for index, pending in enumerate(results):
+                    if pending.pending:
+                        emit(ScanResult(
+                            index, pending.address, pending.port, error=result
+                        ))
+                return
+            remaining -= 1
+            if partial is None:
+                results[result.index] = result
+            else:
+                partial._deliver(result)
+                if on_late is not None:
+                    on_late(result)
+            if remaining == 0:
+                finished.set()
+
+        task = asyncio.ensure_future(self._run(targets, emit))
+        if targets:
+            try:
+                await asyncio.wait_for(finished.wait(), deadline)
+            except asyncio.TimeoutError:
+                pass
+
+        partial = DeadlineScan(results, task)
+        return partial
+
+    async def _run(self, targets: list, emit) -> None:
+        try:
+            await self._scan(targets, emit)
+        except Exception as e:
+            emit(e)
+
+    async def _scan(self, targets: list, emit) -> None:
+        self._load_state()
+        try:
+            await self._scan_targets(targets, emit)
+        finally:
+            if self.health is not None:
+                self.health.save()
+            if self.state is not None:
+                self.save_state()
+
+    async def _scan_targets(self, targets: list, emit) -> None:
+        metrics = self.metrics
+        health = self.health
+        resolved = await self.resolver.resolve_many(targets)
+
+        # Group targets by resolved address, and token if they have one,
+        # so replies can be matched and duplicate targets are queried
+        # only once
+        stamp = int(time.time()) & 0x7FFFFFFF
+        indices = {}
+        # token target key -> its request
+        requests = {}
+        # addresses with token targets, whose replies must be decoded
+        # far enough to read the token
+        multiplexed = set()
+        skipped = set()
+        for index, (target, addr) in enumerate(zip(targets, resolved)):
+            if isinstance(addr, Exception):
+                emit(ScanResult(index, target[0], target[1], error=addr))
+                continue
+            key = addr
+            if len(target) > 2:
+                key = (*addr, target[2] & 0x7FFFFFFF)
+            if key in indices:
+                indices[key].append(index)
+            elif addr in skipped or (
+                health is not None and not health.allow(addr)
+            ):
+                skipped.add(addr)
+                if metrics is not None:
+                    metrics.inc('skipped')
+                emit(ScanResult(
+                    index, target[0], target[1], error=CircuitOpen()
+                ))
+            else:
+                indices[key] = [index]
+                if len(key) > 2:
+                    multiplexed.add(addr)
+                    requests[key] = self._huffman.encode(
+                        zandronum.build_request(self.flags.value, key[2])
+                    )
+
+        if not indices:
+            return
+
+        pending = collections.deque(
+            sorted(indices, key=lambda key: self._priority(key[:2]))
+        )
+        # key -> [time sent, attempts, timeout of this attempt]
+        inflight = {}
+        wakeup = asyncio.Event()
+
+        request = self._huffman.encode(
+            zandronum.build_request(self.flags.value, stamp)
+        )
+
+        def complete(key, data, latency):
+            addr = key[:2]
+            index = indices[key][0]
+            server = zandronum.Server(
+                targets[index][0], targets[index][1], self.flags,
+                capture=self.capture, metrics=metrics,
+                validate=self.validate
+            )
+            timer = NULL_TIMER
+            if metrics is not None:
+                timer = metrics.timer()
+                metrics.phases['wait'].observe(latency)
+
+            try:
+                server._handle_response(data, addr, timer)
+            except Exception as e:
+                # Malformed responses must not stop the whole scan
+                error = e
+            else:
+                error = None
+                self._remember(addr, latency, server)
+            if health is not None:
+                health.record(addr, error)
+
+            for index in indices[key]:
+                target = targets[index]
+                emit(ScanResult(
+                    index, target[0], target[1], server, error, latency
+                ))
+
+        def timed_out(key):
+            addr = key[:2]
+            self._remember(addr, None, None)
+            if health is not None:
+                health.failure(addr, exceptions.QueryTimeout())
+            for index in indices[key]:
+                target = targets[index]
+                emit(ScanResult(
+                    index, target[0], target[1],
+                    error=exceptions.QueryTimeout()
+                ))
+
+        def received(data, source, received_at):
+            key = source[:2]
+            if key in multiplexed:
+                try:
+                    token = _TOKEN.unpack_from(
+                        self._huffman.decode(data, limit=8), 4
+                    )[0]
+                except (IndexError, KeyError, ValueError, struct.error):
+                    # Too broken to match; the attempt times out
+                    return
+                if token != stamp:
+                    key = (*key, token)
+            entry = inflight.pop(key, None)
+            if entry is None:
+                # Stray or late reply
+                return
+            # Measured up to the arrival, so time spent handling other
+            # replies first does not inflate the round-trip time
+            complete(key, data, max(0.0, received_at - entry[0]))
+            wakeup.set()
+
+        if self.engine:
+            sock = DatagramEngine(
+                lambda view, source: received(view, source, sock.received_at),
+                self.local_addr, rcvbuf=_RCVBUF
+            )
+            sock.open()
+            receiver = None
+        else:
+            sock = await asyncudp.create_socket(
+                local_addr=self.local_addr, rcvbuf=_RCVBUF
+            )
+
+            async def receive():
+                while True:
+                    received(*await sock.recvfrom_timed())
+
+            receiver = asyncio.ensure_future(receive())
+
+        def send(key):
+            data = requests.get(key, request)
+            sock.sendto(data, key[:2])
+            if metrics is not None:
+                metrics.inc('queries')
+                metrics.inc('bytes_out', len(data))
+
+        tick = min(0.05, self.timeout / 4)
+
+        try:
+            while pending or inflight:
+                if receiver is not None and receiver.done():
+                    # Propagate receive errors (e.g. closed socket)
+                    receiver.result()
+
+                now = time.perf_counter()
+                for key, entry in list(inflight.items()):
+                    if now - entry[0] < entry[2]:
+                        continue
+                    if entry[1] <= self.retries:
+                        send(key)
+                        entry[0] = now
+                        entry[1] += 1
+                        entry[2] = self._rto(key[:2], entry[1])
+                    else:
+                        del inflight[key]
+                        if metrics is not None:
+                            metrics.inc('timeouts')
+                        timed_out(key)
+
+                budget = self.concurrency - len(inflight)
+                if self.rate:
+                    # Wall clock time, so a saved bucket stays meaningful
+                    wall = time.time()
+                    self._tokens = min(
+                        self._tokens + (wall - self._refilled) * self.rate,
+                        max(1.0, self.rate * tick)
+                    )
+                    self._refilled = wall
+                    budget = min(budget, int(self._tokens))
+                    self._tokens -= max(0, min(budget, len(pending)))
+
+                batch = [
+                    pending.popleft()
+                    for i in range(min(budget, len(pending)))
+                ]
+                for key in batch:
+                    inflight[key] = [
+                        time.perf_counter(), 1, self._rto(key[:2], 1)
+                    ]
+                if self.engine and len(batch) > 1:
+                    # Waits for socket buffer space instead of dropping
+                    # queries, and receives replies between bursts
+                    datagrams = [
+                        (requests.get(key, request), key[:2])
+                        for key in batch
+                    ]
+                    await sock.send_burst(datagrams)
+                    if metrics is not None:
+                        metrics.inc('queries', len(batch))
+                        metrics.inc('bytes_out', sum(
+                            len(data) for data, addr in datagrams
+                        ))
+                else:
+                    for key in batch:
+                        send(key)
+
+                wakeup.clear()
+                try:
+                    await asyncio.wait_for(wakeup.wait(), tick)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            if receiver is not None:
+                receiver.cancel()
+            sock.close()
+
+
+def _scan_shard(targets: list, options: dict, results, batch_size: int):
+    """
+    Worker process entry point. Scans ``(index, address, port)`` targets
+    and puts batches of compact results on the ``results`` queue.
+    """
+    async def run():
+        loop = asyncio.get_running_loop()
+        scanner = Scanner(**options)
+        batch = []
+
+        async for result in scanner.scan(
+            (address, port) for index, address, port in targets
+        ):
+            snapshot = None
+            error = result.error
+            if result.server is not None:
+                try:
+                    snapshot = result.server.snapshot()
+                except exceptions.MalformedResponse as e:
+                    error = e
+            batch.append((
+                targets[result.index][0], snapshot, error, result.latency
+            ))
+            if len(batch) >= batch_size:
+                # Blocks while the parent is behind (backpressure), without
+                # stalling the event loop that receives replies
+                await loop.run_in_executor(None, results.put, batch)
+                batch = []
+
+        if batch:
+            await loop.run_in_executor(None, results.put, batch)
+
+    asyncio.run(run())
+
+
+class ShardedScanner:
+    """
+    Scans targets with a pool of worker processes, each running its own
+    :class:`Scanner` with its own socket and event loop.
+
+    Results are yielded in target order. Workers block when more than
+    ``queue_size`` result batches are waiting for the parent. A crashed
+    worker is restarted for its unfinished targets up to ``max_restarts``
+    times. Other keyword arguments are passed to each worker's
+    :class:`Scanner` and must be picklable, so ``metrics`` and
+    ``capture`` are not supported; ``health`` and ``state`` files would
+    be overwritten by every worker.
+    """
+
+    def __init__(
+        self,
+        processes: int = None,
+        queue_size: int = 64,
+        batch_size: int = 64,
+        max_restarts: int = 3,
+        **options
+    ) -> None:
+        self.processes: int = processes or os.cpu_count() or 1
+        self.queue_size: int = queue_size
+        self.batch_size: int = batch_size
+        self.max_restarts: int = max_restarts
+        self.options: dict = options
+
+    def scan(self, targets):
+        """
+        Scans a list of ``(address, port)`` targets. Yields one
+        :class:`ScanResult` per target in target order.
+        """
+        targets = list(targets)
+        count = min(self.processes, len(targets))
+        # Interleaved shards keep all workers close to the merge position
+        yield from self._scan_shards(
+            targets,
+            [range(i, len(targets), count) for i in range(count)],
+            ordered=True
+        )
+
+    def _scan_shards(self, targets: list, shards: list, ordered: bool):
+        """
+        Scans every shard (a list of indices into ``targets``) in its
+        own worker process. Yields results in target order if
+        ``ordered``, otherwise as they arrive.
+        """
+        if not targets:
+            return
+
+        context = multiprocessing.get_context()
+        results = context.Queue(self.queue_size)
+        count = len(shards)
+
+        remaining = [set(shard) for shard in shards]
+        owners = {}
+        for shard, indices in enumerate(shards):
+            for index in indices:
+                owners[index] = shard
+        restarts = [0] * count
+        workers = [None] * count
+
+        def start(shard):
+            shard_targets = [
+                (index, targets[index][0], targets[index][1])
+                for index in sorted(remaining[shard])
+            ]
+            workers[shard] = context.Process(
+                target=_scan_shard,
+                args=(shard_targets, self.options, results, self.batch_size),
+                daemon=True
+            )
+            workers[shard].start()
+
+        for shard in range(count):
+            if remaining[shard]:
+                start(shard)
+
+        buffered = {}
+        next_index = 0
+        done = 0
+        checked = time.monotonic()
+
+        try:
+            while done < len(targets):
+                try:
+                    batch = results.get(timeout=0.5)
+                except queue.Empty:
+                    batch = ()
+
+                for index, snapshot, error, latency in batch:
+                    shard_remaining = remaining[owners[index]]
+                    if index not in shard_remaining:
+                        # Duplicate from a worker that was restarted
+                        continue
+                    shard_remaining.discard(index)
+                    buffered[index] = (snapshot, error, latency)
+
+                if ordered:
+                    ready = []
+                    while next_index in buffered:
+                        ready.append(next_index)
+                        next_index += 1
+                else:
+                    ready = list(buffered)
+
+                for index in ready:
+                    snapshot, error, latency = buffered.pop(index)
+                    address, port = targets[index]
+                    server = None
+                    if snapshot is not None:
+                        server = zandronum.Server.from_snapshot(snapshot)
+                    yield ScanResult(
+                        index, address, port, server, error, latency
+                    )
+                    done += 1
+
+                if time.monotonic() - checked < 0.5:
+                    continue
+                checked = time.monotonic()
+
+                for shard, worker in enumerate(workers):
+                    if not remaining[shard] or worker.is_alive():
+                        continue
+                    if worker.exitcode == 0:
+                        # Exited normally, its last results are queued
+                        continue
+                    if restarts[shard] < self.max_restarts:
+                        restarts[shard] += 1
+                        start(shard)
+                        continue
+                    for index in remaining[shard]:
+                        buffered[index] = (None, WorkerCrashed(), None)
+                    remaining[shard].clear()
+        finally:
+            for worker in workers:
+                if worker is not None and worker.is_alive():
+                    worker.terminate()
+            results.cancel_join_thread()
+            results.close()
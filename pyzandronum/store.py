@@ -0,0 +1,306 @@
+"""
+Columnar time-series store module for pyzandronum.
+
+Every scan appended to a :class:`SnapshotStore` adds one row per server
+that answered, split into append-only column files::
+
+    timestamp.f64   scan time (float64)
+    server.u32      server id, see servers.jsonl
+    numplayers.u8   number of players
+    map.u32         map id, see maps.jsonl
+    ping.f32        round-trip time in milliseconds (NaN if unknown)
+    scans.u64       first row of every scan
+
+The id dictionaries hold one JSON string per line, so names sent by
+servers can not break the line structure. Rows of one scan are sorted
+by server id, so readers can look up a server in every scan with a
+binary search. Readers memory-map the columns and only touch the rows
+they need.
+
+After a crash, a store reopened for appending cuts every file back to
+its last complete row.
+"""
+
+import array
+import bisect
+import datetime
+import json
+import math
+import mmap
+import os
+import time
+
+# column name -> (file name, array type code)
+COLUMNS = {
+    'timestamp': ('timestamp.f64', 'd'),
+    'server': ('server.u32', 'I'),
+    'numplayers': ('numplayers.u8', 'B'),
+    'map': ('map.u32', 'I'),
+    'ping': ('ping.f32', 'f')
+}
+_SCANS = ('scans.u64', 'Q')
+
+
+def _load_dictionary(path: str) -> list:
+    # A line without its newline was cut off by a crash and is ignored
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8', newline='\n') as fp:
+        return [json.loads(line) for line in fp.read().split('\n')[:-1]]
+
+
+def _truncate(path: str, size: int) -> None:
+    if os.path.exists(path) and os.path.getsize(path) > size:
+        with open(path, 'r+b') as fp:
+            fp.truncate(size)
+
+
+class SnapshotStore:
+    """
+    Appends scans to the column files of a store directory.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path: str = path
+        os.makedirs(path, exist_ok=True)
+
+        self.servers: list[str] = self._load('servers.jsonl')
+        self.maps: list[str] = self._load('maps.jsonl')
+
+        self._server_ids = {key: i for i, key in enumerate(self.servers)}
+        self._map_ids = {name: i for i, name in enumerate(self.maps)}
+        self._rows = self._count_rows()
+        self._repair()
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _load(self, filename: str) -> list:
+        path = self._file(filename)
+        if os.path.exists(path):
+            # Drop a line cut off by a crash before appending after it
+            with open(path, 'rb') as fp:
+                _truncate(path, fp.read().rfind(b'\n') + 1)
+        return _load_dictionary(path)
+
+    def _repair(self) -> None:
+        # Cut columns that a crash left longer than the others, and
+        # scans that start past the last complete row, so that later
+        # appends stay aligned
+        for name, typecode in COLUMNS.values():
+            _truncate(
+                self._file(name),
+                self._rows * array.array(typecode).itemsize
+            )
+
+        path = self._file(_SCANS[0])
+        if not os.path.exists(path):
+            return
+        scans = array.array(_SCANS[1])
+        with open(path, 'rb') as fp:
+            data = fp.read()
+        scans.frombytes(data[:len(data) - len(data) % scans.itemsize])
+        keep = 0
+        while keep < len(scans) and scans[keep] < self._rows:
+            keep += 1
+        _truncate(path, keep * scans.itemsize)
+
+    def _count_rows(self) -> int:
+        # Columns may differ in length after a crash; trust the shortest
+        rows = []
+        for name, typecode in COLUMNS.values():
+            path = self._file(name)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            rows.append(size // array.array(typecode).itemsize)
+        return min(rows)
+
+    def _intern(self, key: str, ids: dict, names: list, filename: str) -> int:
+        index = ids.get(key)
+        if index is None:
+            index = len(names)
+            ids[key] = index
+            names.append(key)
+            with open(self._file(filename), 'a', encoding='utf-8',
+                      newline='\n') as fp:
+                fp.write(json.dumps(key, ensure_ascii=False) + '\n')
+        return index
+
+    def server_id(self, address: str, port: int) -> int:
+        """Returns the id of a server, adding it if it is new."""
+        return self._intern(
+            f'{address}:{port}', self._server_ids, self.servers,
+            'servers.jsonl'
+        )
+
+    def append(self, results, timestamp: float = None) -> int:
+        """
+        Appends one scan. ``results`` is an iterable of ``ScanResult``
+        or ``Server`` objects; servers that did not answer are skipped.
+        Returns the number of rows written.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+
+        rows = []
+        for item in results:
+            server = getattr(item, 'server', item)
+            if server is None or getattr(item, 'error', None) is not None:
+                continue
+            latency = getattr(item, 'latency', None)
+            rows.append((
+                self.server_id(server.address, server.port),
+                server.number_players or 0,
+                self._intern(
+                    server.map or '', self._map_ids, self.maps, 'maps.jsonl'
+                ),
+                latency * 1000 if latency is not None else math.nan
+            ))
+
+        if not rows:
+            return 0
+
+        rows.sort()
+        columns = {
+            'timestamp': array.array('d', [timestamp]) * len(rows),
+            'server': array.array('I', [row[0] for row in rows]),
+            'numplayers': array.array('B', [min(row[1], 255) for row in rows]),
+            'map': array.array('I', [row[2] for row in rows]),
+            'ping': array.array('f', [row[3] for row in rows])
+        }
+
+        with open(self._file(_SCANS[0]), 'ab') as fp:
+            array.array(_SCANS[1], [self._rows]).tofile(fp)
+        for column, (name, typecode) in COLUMNS.items():
+            with open(self._file(name), 'ab') as fp:
+                columns[column].tofile(fp)
+
+        self._rows += len(rows)
+        return len(rows)
+
+
+class StoreReader:
+    """
+    Memory-maps the columns of a store directory for queries.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path: str = path
+        self.servers: list[str] = _load_dictionary(
+            os.path.join(path, 'servers.jsonl')
+        )
+        self.maps: list[str] = _load_dictionary(
+            os.path.join(path, 'maps.jsonl')
+        )
+
+        self._server_ids = {key: i for i, key in enumerate(self.servers)}
+        self._files = []
+        self._maps = []
+
+        columns = {}
+        for column, (name, typecode) in COLUMNS.items():
+            columns[column] = self._open(name, typecode)
+        rows = min(len(view) for view in columns.values())
+        self.columns: dict = {
+            column: view[:rows] for column, view in columns.items()
+        }
+        self.rows: int = rows
+
+        starts = [start for start in self._open(*_SCANS) if start < rows]
+        self._scans = list(zip(starts, starts[1:] + [rows]))
+
+    def __enter__(self) -> "StoreReader":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def _open(self, name: str, typecode: str) -> memoryview:
+        path = os.path.join(self.path, name)
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return memoryview(array.array(typecode))
+
+        fp = open(path, 'rb')
+        buf = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        self._files.append(fp)
+        self._maps.append(buf)
+
+        view = memoryview(buf)
+        itemsize = array.array(typecode).itemsize
+        return view[:len(view) - len(view) % itemsize].cast(typecode)
+
+    def scans(self) -> list:
+        """Returns ``(timestamp, first row, end row)`` of every scan."""
+        timestamps = self.columns['timestamp']
+        return [(timestamps[start], start, end) for start, end in self._scans]
+
+    def series(
+        self,
+        address: str,
+        port: int,
+        start: float = None,
+        end: float = None
+    ) -> list:
+        """
+        Returns ``(timestamp, numplayers, map, ping)`` of a server for
+        every scan between ``start`` and ``end`` in which it answered.
+        """
+        server_id = self._server_ids.get(f'{address}:{port}')
+        if server_id is None:
+            return []
+
+        columns = self.columns
+        timestamps = columns['timestamp']
+        servers = columns['server']
+        series = []
+
+        for first, last in self._scans:
+            timestamp = timestamps[first]
+            if start is not None and timestamp < start:
+                continue
+            if end is not None and timestamp >= end:
+                break
+            row = bisect.bisect_left(servers, server_id, first, last)
+            if row < last and servers[row] == server_id:
+                series.append((
+                    timestamp,
+                    columns['numplayers'][row],
+                    self.maps[columns['map'][row]],
+                    columns['ping'][row]
+                ))
+
+        return series
+
+    def total_players(self) -> list:
+        """Returns ``(timestamp, players on all servers)`` per scan."""
+        timestamps = self.columns['timestamp']
+        numplayers = self.columns['numplayers']
+        return [
+            (timestamps[first], sum(numplayers[first:last]))
+            for first, last in self._scans
+        ]
+
+    def peak_per_day(self, tz: datetime.tzinfo = datetime.timezone.utc) -> dict:
+        """
+        Returns the peak concurrent player count over all servers
+        for every day, keyed by :class:`datetime.date`.
+        """
+        peaks = {}
+        for timestamp, total in self.total_players():
+            day = datetime.datetime.fromtimestamp(timestamp, tz).date()
+            if total > peaks.get(day, -1):
+                peaks[day] = total
+        return peaks
+
+    def close(self) -> None:
+        """Releases the memory maps and files."""
+        self.columns = {}
+        for buf in self._maps:
+            try:
+                buf.close()
+            except BufferError:
+                # A caller still holds a view; the map closes with it
+                pass
+        for fp in self._files:
+            fp.close()
+        self._maps = []
+        self._files = []
@@ -1,3 +1,4 @@
+import re
 import struct
 import socket
 import time
@@ -6,6 +7,108 @@ from . import enums
 from . import huffman
 from . import exceptions
 from .player import Player
+from .capture import CaptureWriter
+from .metrics import Metrics, NULL_TIMER
+from .resolver import Resolver, get_resolver
+
+# Color code: escape character followed by a bracketed name or one byte
+_COLOR_CODE = re.compile(r'\x1c(?:\[[^\]]*\]|.)?', re.DOTALL)
+
+# Launcher request: challenge, desired flags and a time stamp, each one a
+# 32-bit little-endian integer regardless of the platform's native long
+_REQUEST = struct.Struct('<lLl')
+_EXTENDED_REQUEST = struct.Struct('<lLlL')
+
+
+def build_request(
+    flags: int,
+    timestamp: int = None,
+    extended_flags: int = None
+) -> bytes:
+    """
+    Builds a raw (not Huffman-encoded) launcher query request.
+    The time stamp is echoed back by the server, so it may also be used
+    as a token to match replies with requests. If ``flags`` request
+    ``SQF_EXTENDED_INFO``, ``extended_flags`` (default: all of them)
+    are appended.
+    """
+    if timestamp is None:
+        timestamp = int(time.time())
+    # Per-player and per-team fields can only be parsed knowing the
+    # number of players and teams, and whether players have a team
+    if flags & enums.RequestFlags.SQF_PLAYERDATA.value:
+        flags |= enums.RequestFlags.SQF_NUMPLAYERS.value
+        flags |= enums.RequestFlags.SQF_GAMETYPE.value
+    if flags & enums.TEAMINFO_FIELDS.value:
+        flags |= enums.RequestFlags.SQF_TEAMINFO_NUMBER.value
+
+    if not flags & enums.RequestFlags.SQF_EXTENDED_INFO.value:
+        return _REQUEST.pack(
+            enums.LAUNCHER_CHALLENGE,
+            flags & 0xFFFFFFFF,
+            timestamp & 0x7FFFFFFF
+        )
+
+    if extended_flags is None:
+        extended_flags = enums.ExtendedFlags.all().value
+    return _EXTENDED_REQUEST.pack(
+        enums.LAUNCHER_CHALLENGE,
+        flags & 0xFFFFFFFF,
+        timestamp & 0x7FFFFFFF,
+        extended_flags & 0xFFFFFFFF
+    )
+
+
+_RESPONSES = frozenset(response.value for response in enums.Response)
+_GAMEMODES = frozenset(gamemode.value for gamemode in enums.Gamemode)
+
+# Smallest encoded player: empty name, score, ping, spectator, bot, time
+_MIN_PLAYER_SIZE = 8
+
+_FLOAT = struct.Struct('<f')
+_SHORT = struct.Struct('<h')
+
+# Keys of the values sent with SQF_ALL_DMFLAGS, in order
+_DMFLAGS = (
+    'dmflags', 'dmflags2', 'zadmflags', 'compatflags', 'zacompatflags',
+    'compatflags2'
+)
+
+
+def check_response(data: bytes) -> None:
+    """
+    Cheaply rejects datagrams that can not be launcher responses,
+    before they are decoded: checks the length, the Huffman header and
+    the response magic number. Raises
+    :class:`~.exceptions.MalformedResponse`.
+    """
+    if not 2 <= len(data) <= enums.MAX_PACKET_SIZE:
+        raise exceptions.MalformedResponse(
+            f'invalid packet length {len(data)}', 0
+        )
+    if data[0] > 7 and data[0] != 0xff:
+        raise exceptions.MalformedResponse('invalid Huffman header', 0)
+
+    try:
+        header = huffman.get_codec().decode(data, 4)
+    except KeyError:
+        # The bits ran out in the middle of a code
+        header = b''
+    if len(header) < 4:
+        raise exceptions.MalformedResponse('truncated response header', 0)
+    magic = int.from_bytes(header, byteorder='little')
+    if magic not in _RESPONSES:
+        raise exceptions.MalformedResponse(f'unknown response {magic}', 0)
+
+
+def strip_colors(text: str) -> str:
+    """
+    Removes Zandronum color codes (e.g. ``\\x1cA`` or ``\\x1c[b1]``)
+    from a string such as a host or player name.
+    """
+    if '\x1c' not in text:
+        return text
+    return _COLOR_CODE.sub('', text)
 
 
 class Server:
@@ -18,7 +121,11 @@ class Server:
         address: str,
         port: int = 10666,
         flags: enums.RequestFlags = enums.RequestFlags.default(),
-        timeout: float = 5.0
+        timeout: float = 5.0,
+        capture: CaptureWriter = None,
+        metrics: Metrics = None,
+        resolver: Resolver = None,
+        validate: bool = False
     ) -> None:
         self.address: str = address
         self.port: int = port
@@ -65,25 +172,49 @@ class Server:
             'optional_pwads_count': None,
             'optional_pwads': None,
             'deh_loaded': None,
-            'deh_list': None
+            'deh_list': None,
+            'teamdamage': None,
+            'team_count': None,
+            'team_names': None,
+            'team_colors': None,
+            'team_scores': None,
+            'extended_flags': None,
+            'pwad_hashes': None,
+            'country': None,
+            'gamemode_name': None,
+            'gamemode_shortname': None,
+            'voicechat': None
         }
         self.players: list[Player] = []
 
-        self._huffman = huffman.Huffman(huffman.HUFFMAN_FREQS)
-        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._huffman = huffman.get_codec()
+        self._sock: socket.socket = None
+        self._timeout = timeout
+        self._capture = capture
+        self._metrics = metrics
+        self._resolver = resolver or get_resolver()
+        self._validate = validate
         self._request_flags = flags.value
         self._buffsize = 8192
         self._bytepos = 0
         self._raw_data = b''
-
-        self._sock.settimeout(timeout)
+        # Sections skipped by _parse: (decoding method, byte position)
+        self._lazy: list = []
 
     def __enter__(self) -> "Server":
         self.query()
         return self
 
     def __exit__(self, exc_type, exc_value, traceback) -> None:
-        self._sock.close()
+        self.close()
+
+    def close(self) -> None:
+        """
+        Closes the query socket, if one was opened.
+        """
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
 
     def query(self) -> "Server":
         """
@@ -94,27 +225,149 @@ class Server:
         # type, with appropriate length and encoded little-endian.
         # The numbers are: 199 + bitwise OR hex flags + epoch timestamp
         # (concatenated, not added).
+        request = build_request(self._request_flags)
+
+        # Hostnames are resolved through a cache, replies are then matched
+        # against the resolved address
+        addr = self._resolver.resolve(self.address, self.port)
 
-        # Launcher challenge
-        request = struct.pack('l', 199)
-        # Desired information
-        request += struct.pack('l', self._request_flags)
-        # Current time, this will be sent back to you so you can determine ping
-        request += struct.pack('l', int(time.time()))
+        metrics = self._metrics
+        timer = NULL_TIMER if metrics is None else metrics.timer()
 
         # Compress query request with the Huffman algorithm
         request_encoded = self._huffman.encode(request)
+        timer.mark('encode')
+
+        # The socket is created on first query, so servers built only for
+        # parsing (e.g. capture replay) never allocate one
+        if self._sock is None:
+            self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._sock.settimeout(self._timeout)
 
         # Send the query request to Zandronum server
-        self._sock.sendto(request_encoded, (self.address, self.port))
-        data, server = self._sock.recvfrom(self._buffsize)
-        self._raw_data = self._huffman.decode(data)
+        self._sock.sendto(request_encoded, addr)
+        timer.mark('send')
+        if metrics is not None:
+            metrics.inc('queries')
+            metrics.inc('bytes_out', len(request_encoded))
+
+        # Stray datagrams from other hosts are ignored, without granting
+        # the reply more time
+        deadline = time.monotonic() + self._timeout
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise socket.timeout('timed out')
+                self._sock.settimeout(remaining)
+                data, server = self._sock.recvfrom(self._buffsize)
+                if server[:2] == addr:
+                    break
+        except socket.timeout:
+            if metrics is not None:
+                metrics.inc('timeouts')
+            raise
+        timer.mark('wait')
+
+        return self._handle_response(data, server, timer)
+
+    def _handle_response(self, data: bytes, server: tuple, timer) -> "Server":
+        """
+        Records, decodes and parses a response received from ``server``.
+        """
+        if self._capture is not None:
+            self._capture.write(data, server)
+
+        metrics = self._metrics
+        if metrics is not None:
+            metrics.inc('responses')
+            metrics.inc('bytes_in', len(data))
+
+        try:
+            self._decode_and_parse(data, timer)
+        except exceptions.QueryDenied as e:
+            if metrics is not None:
+                if isinstance(e, exceptions.QueryBanned):
+                    metrics.inc('banned')
+                else:
+                    metrics.inc('denied')
+            raise
+        except exceptions.MalformedResponse:
+            if metrics is not None:
+                metrics.inc('malformed')
+            raise
+        timer.mark('parse')
+
+        return self
 
-        # Calling method for parsing server query response
-        self._parse()
+    def parse_response(self, data: bytes) -> "Server":
+        """
+        Decodes and parses a raw Huffman-encoded server response.
+        """
+        self._decode_and_parse(data, NULL_TIMER)
 
         return self
 
+    def _decode_and_parse(self, data: bytes, timer) -> None:
+        if not self._validate:
+            self._raw_data = self._huffman.decode(data)
+            timer.mark('decode')
+            # Calling method for parsing server query response
+            self._parse()
+            return
+
+        # Validating mode: every failure is a MalformedResponse
+        check_response(data)
+        try:
+            self._raw_data = self._huffman.decode(data)
+        except (IndexError, KeyError):
+            raise exceptions.MalformedResponse(
+                'invalid Huffman data', 0
+            ) from None
+        timer.mark('decode')
+
+        try:
+            self._parse()
+        except exceptions.MalformedResponse:
+            raise
+        except (IndexError, ValueError, KeyError) as e:
+            raise exceptions.MalformedResponse(
+                str(e), self._bytepos
+            ) from None
+
+    def snapshot(self) -> dict:
+        """
+        Returns the parsed server state as a plain, picklable dict.
+        Raises :class:`~.exceptions.MalformedResponse` if a lazily
+        decoded section is broken.
+        """
+        self._decode_lazy()
+        return {
+            'address': self.address,
+            'port': self.port,
+            'response': self.response,
+            'response_time': self.response_time,
+            'response_flags': self.response_flags,
+            'query': dict(self.query_dict),
+            'players': [dict(player.player_dict) for player in self.players]
+        }
+
+    @classmethod
+    def from_snapshot(cls, snapshot: dict) -> "Server":
+        """
+        Creates a server from a :meth:`snapshot` without querying it.
+        """
+        server = cls(snapshot['address'], snapshot['port'])
+        server.response = snapshot['response']
+        server.response_time = snapshot['response_time']
+        server.response_flags = snapshot['response_flags']
+        server.query_dict.update(snapshot['query'])
+        server.players = [
+            Player.from_dict(player_dict, server.query_dict['teamgame'])
+            for player_dict in snapshot['players']
+        ]
+        return server
+
     def _parse(self) -> None:
         """
         Parsing server raw infomation data to properties.
@@ -122,6 +375,8 @@ class Server:
 
         # We start at position 0, beginning of our raw data stream
         self._bytepos = 0
+        self.players = []
+        self._lazy = []
 
         # 0: Get server response header and time stamp (both 4 byte long ints)
         # Server response
@@ -144,128 +399,285 @@ class Server:
         # 2: Our flags are repeated back to us (long int)
         self.response_flags = self._next_bytes(4)
 
-        # 3: Flags
+        # 3: Fields, in this order, for each flag set in the echoed flags
+        F = enums.RequestFlags
+        flags = self.response_flags
         # The server's name (sv_hostname)
-        self.query_dict['hostname'] = self._next_string()
+        if flags & F.SQF_NAME.value:
+            self.query_dict['hostname'] = self._next_string()
         # The server's WAD URL (sv_website)
-        self.query_dict['url'] = self._next_string()
+        if flags & F.SQF_URL.value:
+            self.query_dict['url'] = self._next_string()
         # The server host's e-mail (sv_hostemail)
-        self.query_dict['hostemail'] = self._next_string()
+        if flags & F.SQF_EMAIL.value:
+            self.query_dict['hostemail'] = self._next_string()
         # The current map's name
-        self.query_dict['map'] = self._next_string()
+        if flags & F.SQF_MAPNAME.value:
+            self.query_dict['map'] = self._next_string()
         # The max number of clients (sv_maxclients)
-        self.query_dict['maxclients'] = self._next_bytes(1)
+        if flags & F.SQF_MAXCLIENTS.value:
+            self.query_dict['maxclients'] = self._next_bytes(1)
         # The max number of players (sv_maxplayers)
-        self.query_dict['maxplayers'] = self._next_bytes(1)
-        # The number of PWADs loaded
-        self.query_dict['pwads_loaded'] = self._next_bytes(1)
-        # The PWAD's name (sent for each PWAD)
-        self.query_dict['pwads_list'] = []
-        if int(self.query_dict['pwads_loaded']) > 0:
+        if flags & F.SQF_MAXPLAYERS.value:
+            self.query_dict['maxplayers'] = self._next_bytes(1)
+        if flags & F.SQF_PWADS.value:
+            # The number of PWADs loaded
+            self.query_dict['pwads_loaded'] = self._next_bytes(1)
+            self._check_count(self.query_dict['pwads_loaded'], 1)
+            # The PWAD's name (sent for each PWAD)
+            self.query_dict['pwads_list'] = []
             for i in range(0, self.query_dict['pwads_loaded']):
                 self.query_dict['pwads_list'].append(self._next_string())
-        # The current gamemode
-        self.query_dict['gamemode'] = enums.Gamemode(self._next_bytes(1))
-        # Sets teamgame boolean if gamemode with teams
-        if self.query_dict['gamemode'] in [
-            enums.Gamemode.TEAMPLAY,
-            enums.Gamemode.TEAMLMS,
-            enums.Gamemode.TEAMPOSSESSION
-        ]:
-            self.query_dict['teamgame'] = True
-        else:
-            self.query_dict['teamgame'] = False
-        # Instagib
-        if self._next_bytes(1) == 1:
-            self.query_dict['instagib'] = True
-        else:
-            self.query_dict['instagib'] = False
-        # Buckshot
-        if self._next_bytes(1) == 1:
-            self.query_dict['buckshot'] = True
-        else:
-            self.query_dict['buckshot'] = False
+        if flags & F.SQF_GAMETYPE.value:
+            # The current gamemode
+            gamemode = self._next_bytes(1)
+            if self._validate and gamemode not in _GAMEMODES:
+                raise exceptions.MalformedResponse(
+                    f'unknown gamemode {gamemode}', self._bytepos - 1
+                )
+            self.query_dict['gamemode'] = enums.Gamemode(gamemode)
+            # Sets teamgame boolean if gamemode with teams
+            if self.query_dict['gamemode'] in enums.TEAM_GAMEMODES:
+                self.query_dict['teamgame'] = True
+            else:
+                self.query_dict['teamgame'] = False
+            # Instagib
+            if self._next_bytes(1) == 1:
+                self.query_dict['instagib'] = True
+            else:
+                self.query_dict['instagib'] = False
+            # Buckshot
+            if self._next_bytes(1) == 1:
+                self.query_dict['buckshot'] = True
+            else:
+                self.query_dict['buckshot'] = False
         # The game's name ("DOOM", "DOOM II", "HERETIC", "HEXEN", "ERROR!")
-        self.query_dict['gamename'] = self._next_string()
+        if flags & F.SQF_GAMENAME.value:
+            self.query_dict['gamename'] = self._next_string()
         # The IWAD's name
-        self.query_dict['iwad'] = self._next_string()
+        if flags & F.SQF_IWAD.value:
+            self.query_dict['iwad'] = self._next_string()
         # Whether a password is required to join the server
-        if self._next_bytes(1) == 1:
-            self.query_dict['forcepassword'] = True
-        else:
-            self.query_dict['forcepassword'] = False
+        if flags & F.SQF_FORCEPASSWORD.value:
+            if self._next_bytes(1) == 1:
+                self.query_dict['forcepassword'] = True
+            else:
+                self.query_dict['forcepassword'] = False
         # Whether a password is required to join the game
-        if self._next_bytes(1) == 1:
-            self.query_dict['forcejoinpassword'] = True
-        else:
-            self.query_dict['forcejoinpassword'] = False
+        if flags & F.SQF_FORCEJOINPASSWORD.value:
+            if self._next_bytes(1) == 1:
+                self.query_dict['forcejoinpassword'] = True
+            else:
+                self.query_dict['forcejoinpassword'] = False
         # The game's difficulty (skill)
-        self.query_dict['skill'] = self._next_bytes(1)
+        if flags & F.SQF_GAMESKILL.value:
+            self.query_dict['skill'] = self._next_bytes(1)
         # The bot difficulty (botskill)
-        self.query_dict['botskill'] = self._next_bytes(1)
-        # Value of fraglimit
-        self.query_dict['fraglimit'] = self._next_bytes(2)
-        # Value of timelimit
-        self.query_dict['timelimit'] = self._next_bytes(2)
-        # Time left in minutes (only sent if timelimit > 0)
-        self.query_dict['timelimit_left'] = 0
-        if self.query_dict['timelimit'] != 0:
-            self.query_dict['timelimit_left'] = self._next_bytes(2)
-        # Duel limit (duellimit)
-        self.query_dict['duellimit'] = self._next_bytes(2)
-        # Point limit (pointlimit)
-        self.query_dict['pointlimit'] = self._next_bytes(2)
-        # Win limit (winlimit)
-        self.query_dict['winlimit'] = self._next_bytes(2)
+        if flags & F.SQF_BOTSKILL.value:
+            self.query_dict['botskill'] = self._next_bytes(1)
+        # Deprecated: dmflags, dmflags2 and compatflags
+        if flags & F.SQF_DMFLAGS.value:
+            self.query_dict['dmflags'] = self._next_bytes(4)
+            self.query_dict['dmflags2'] = self._next_bytes(4)
+            self.query_dict['compatflags'] = self._next_bytes(4)
+        if flags & F.SQF_LIMITS.value:
+            # Value of fraglimit
+            self.query_dict['fraglimit'] = self._next_bytes(2)
+            # Value of timelimit
+            self.query_dict['timelimit'] = self._next_bytes(2)
+            # Time left in minutes (only sent if timelimit > 0)
+            self.query_dict['timelimit_left'] = 0
+            if self.query_dict['timelimit'] != 0:
+                self.query_dict['timelimit_left'] = self._next_bytes(2)
+            # Duel limit (duellimit)
+            self.query_dict['duellimit'] = self._next_bytes(2)
+            # Point limit (pointlimit)
+            self.query_dict['pointlimit'] = self._next_bytes(2)
+            # Win limit (winlimit)
+            self.query_dict['winlimit'] = self._next_bytes(2)
+        # Team damage factor (teamdamage, a float)
+        if flags & F.SQF_TEAMDAMAGE.value:
+            self.query_dict['teamdamage'] = _FLOAT.unpack(
+                self._next_raw(4)
+            )[0]
+        # Deprecated: blue and red team scores, see SQF_TEAMINFO_SCORE
+        if flags & F.SQF_TEAMSCORES.value:
+            self._next_raw(4)
         # The number of players in the server
-        self.query_dict['numplayers'] = self._next_bytes(1)
+        if flags & F.SQF_NUMPLAYERS.value:
+            self.query_dict['numplayers'] = self._next_bytes(1)
+            if self._validate and \
+                    self.query_dict['numplayers'] > enums.MAX_PLAYERS:
+                raise exceptions.MalformedResponse(
+                    f'too many players ({self.query_dict["numplayers"]})',
+                    self._bytepos - 1
+                )
         # Player datas
-        if self.query_dict['numplayers'] > 0:
-            for i in range(0, int(self.query_dict['numplayers'])):
+        if flags & F.SQF_PLAYERDATA.value:
+            count = self.query_dict['numplayers'] or 0
+            self._check_count(count, _MIN_PLAYER_SIZE)
+            for i in range(0, count):
                 self.players.append(Player(
                     self._raw_data,
                     self._bytepos,
-                    self.query_dict['teamgame']
+                    bool(self.query_dict['teamgame']),
+                    self._validate
                 ))
                 self._bytepos = self.players[i]._bytepos
+        # The number of teams
+        if flags & F.SQF_TEAMINFO_NUMBER.value:
+            self.query_dict['team_count'] = self._next_bytes(1)
+        # Team names, colors and scores (sent for each team); decoded
+        # when first needed
+        if flags & enums.TEAMINFO_FIELDS.value:
+            self._defer(self._parse_teams, self._skip_teams)
         # Whether this server is running a testing binary
-        if self._next_bytes(1):
-            self.query_dict['testing_server'] = True
-        else:
-            self.query_dict['testing_server'] = False
-        # An empty string in case the server is running a stable binary,
-        # otherwise name of the testing binary
-        self.query_dict['testing_server_archive'] = self._next_string()
-        # The number of flags that will be sent
-        self.query_dict['dmflags_number'] = self._next_bytes(1)
-        # The values of the flags (SQF_ALL_DMFLAGS)
-        self.query_dict['dmflags'] = self._next_bytes(4)
-        self.query_dict['dmflags2'] = self._next_bytes(4)
-        self.query_dict['zadmflags'] = self._next_bytes(4)
-        self.query_dict['compatflags'] = self._next_bytes(4)
-        self.query_dict['zacompatflags'] = self._next_bytes(4)
-        self.query_dict['compatflags2'] = self._next_bytes(4)
+        if flags & F.SQF_TESTING_SERVER.value:
+            if self._next_bytes(1):
+                self.query_dict['testing_server'] = True
+            else:
+                self.query_dict['testing_server'] = False
+            # An empty string in case the server is running a stable
+            # binary, otherwise name of the testing binary
+            self.query_dict['testing_server_archive'] = self._next_string()
+        # Deprecated: an empty string
+        if flags & F.SQF_DATA_MD5SUM.value:
+            self._next_string()
+        if flags & F.SQF_ALL_DMFLAGS.value:
+            # The number of flags that will be sent
+            self.query_dict['dmflags_number'] = self._next_bytes(1)
+            self._check_count(self.query_dict['dmflags_number'], 4)
+            # The values of the flags, in _DMFLAGS order
+            for i in range(0, self.query_dict['dmflags_number']):
+                value = self._next_bytes(4)
+                if i < len(_DMFLAGS):
+                    self.query_dict[_DMFLAGS[i]] = value
         # Whether the server is enforcing the master ban list. (boolean)
         # The other bits of this byte may be used to transfer other
         # security related settings in the future.
-        self.query_dict['security_settings'] = self._next_bytes(1)
-        # Amount of optional wad indices that follow
-        self.query_dict['optional_pwads_count'] = self._next_bytes(1)
-        # The optional PWAD's name (sent for each PWAD)
-        self.query_dict['optional_pwads'] = []
-        if self.query_dict['optional_pwads_count'] > 0:
+        if flags & F.SQF_SECURITY_SETTINGS.value:
+            self.query_dict['security_settings'] = self._next_bytes(1)
+        if flags & F.SQF_OPTIONAL_WADS.value:
+            # Amount of optional wad indices that follow
+            self.query_dict['optional_pwads_count'] = self._next_bytes(1)
+            self._check_count(self.query_dict['optional_pwads_count'], 1)
+            # Index into the PWAD list of each optional PWAD; names are
+            # looked up when the PWADs were requested too
+            pwads = self.query_dict['pwads_list']
+            self.query_dict['optional_pwads'] = []
             for i in range(0, self.query_dict['optional_pwads_count']):
-                self.query_dict['optional_pwads'].append(self._next_string())
-        # Amount of DEHACKED (*.deh) patches loaded
-        self.query_dict['deh_loaded'] = self._next_bytes(1)
-        # DEHACKED patch name (one string for each .deh patch)
-        self.query_dict['deh_list'] = []
-        if self.query_dict['deh_loaded'] > 0:
+                index = self._next_bytes(1)
+                if pwads is None:
+                    self.query_dict['optional_pwads'].append(index)
+                elif index < len(pwads):
+                    self.query_dict['optional_pwads'].append(pwads[index])
+                elif self._validate:
+                    raise exceptions.MalformedResponse(
+                        f'optional PWAD index {index} out of range',
+                        self._bytepos - 1
+                    )
+        if flags & F.SQF_DEH.value:
+            # Amount of DEHACKED (*.deh) patches loaded
+            self.query_dict['deh_loaded'] = self._next_bytes(1)
+            self._check_count(self.query_dict['deh_loaded'], 1)
+            # DEHACKED patch name (one string for each .deh patch)
+            self.query_dict['deh_list'] = []
             for i in range(0, self.query_dict['deh_loaded']):
                 self.query_dict['deh_list'].append(self._next_string())
+        # Extended (SQF2) fields; they end the packet, so they are only
+        # decoded when first needed
+        if flags & F.SQF_EXTENDED_INFO.value:
+            self._defer(self._parse_extended, None)
         # End of raw query data.
 
-        # TODO: SQF2 extended flags
+    def _defer(self, parse, skip) -> None:
+        # Validating parses decode everything up front, so that errors
+        # surface from the query; otherwise the section is skipped
+        if self._validate:
+            parse()
+            return
+        self._lazy.append((parse, self._bytepos))
+        if skip is not None:
+            skip()
+
+    def _decode_lazy(self) -> None:
+        """
+        Decodes the sections that parsing skipped. Raises
+        :class:`~.exceptions.MalformedResponse` if one is broken, again
+        on every later attempt.
+        """
+        if not self._lazy:
+            return
+        lazy, self._lazy = self._lazy, []
+        bytepos = self._bytepos
+        try:
+            for i, (parse, position) in enumerate(lazy):
+                self._bytepos = position
+                parse()
+        except (IndexError, ValueError, KeyError) as e:
+            # Keep the broken section, so its fields never look valid
+            self._lazy = lazy[i:]
+            raise exceptions.MalformedResponse(
+                str(e), self._bytepos
+            ) from None
+        finally:
+            self._bytepos = bytepos
+
+    def _skip_teams(self) -> None:
+        count = self.query_dict['team_count'] or 0
+        flags = self.response_flags
+        if flags & enums.RequestFlags.SQF_TEAMINFO_NAME.value:
+            for i in range(0, count):
+                self._bytepos = self._raw_data.index(0, self._bytepos) + 1
+        if flags & enums.RequestFlags.SQF_TEAMINFO_COLOR.value:
+            self._bytepos += 4 * count
+        if flags & enums.RequestFlags.SQF_TEAMINFO_SCORE.value:
+            self._bytepos += 2 * count
+
+    def _parse_teams(self) -> None:
+        F = enums.RequestFlags
+        count = self.query_dict['team_count'] or 0
+        flags = self.response_flags
+        self._check_count(count, 1)
+        # Team's name
+        if flags & F.SQF_TEAMINFO_NAME.value:
+            self.query_dict['team_names'] = [
+                self._next_string() for i in range(0, count)
+            ]
+        # Team's color (0xRRGGBB)
+        if flags & F.SQF_TEAMINFO_COLOR.value:
+            self.query_dict['team_colors'] = [
+                self._next_bytes(4) for i in range(0, count)
+            ]
+        # Team's score (a signed short)
+        if flags & F.SQF_TEAMINFO_SCORE.value:
+            self.query_dict['team_scores'] = [
+                _SHORT.unpack(self._next_raw(2))[0] for i in range(0, count)
+            ]
+
+    def _parse_extended(self) -> None:
+        F = enums.ExtendedFlags
+        # The extended flags are repeated back to us (long int)
+        flags = self.query_dict['extended_flags'] = self._next_bytes(4)
+        if flags & F.SQF2_PWAD_HASHES.value:
+            # The number of hashes, then the MD5 of each PWAD
+            count = self._next_bytes(1)
+            self._check_count(count, 1)
+            self.query_dict['pwad_hashes'] = [
+                self._next_string() for i in range(0, count)
+            ]
+        # Country code of the server (ISO 3166-1 alpha-3, or "XIP" to
+        # let the launcher look it up by IP, "XUN" if unknown)
+        if flags & F.SQF2_COUNTRY.value:
+            self.query_dict['country'] = self._next_raw(3).decode('latin-1')
+        # Full and short name of the current game mode
+        if flags & F.SQF2_GAMEMODE_NAME.value:
+            self.query_dict['gamemode_name'] = self._next_string()
+        if flags & F.SQF2_GAMEMODE_SHORTNAME.value:
+            self.query_dict['gamemode_shortname'] = self._next_string()
+        # Voice chat mode (sv_allowvoicechat)
+        if flags & F.SQF2_VOICECHAT.value:
+            self.query_dict['voicechat'] = self._next_bytes(1)
 
     @property
     def version(self) -> str:
@@ -397,7 +809,70 @@ class Server:
         """:class:`str`: Returns the host's E-Mail address."""
         return self.query_dict['hostemail']
 
+    @property
+    def team_damage(self) -> float:
+        """:class:`float`: Returns the team damage factor."""
+        return self.query_dict['teamdamage']
+
+    @property
+    def teams(self) -> list:
+        """:class:`list`: Returns a dict with the ``name``, ``color`` and
+        ``score`` of each team (values not requested are None)."""
+        self._decode_lazy()
+        count = self.query_dict['team_count'] or 0
+        names = self.query_dict['team_names'] or [None] * count
+        colors = self.query_dict['team_colors'] or [None] * count
+        scores = self.query_dict['team_scores'] or [None] * count
+        return [
+            {'name': name, 'color': color, 'score': score}
+            for name, color, score in zip(names, colors, scores)
+        ]
+
+    @property
+    def pwad_hashes(self) -> list:
+        """:class:`list`: Returns the MD5 hash of each loaded PWAD."""
+        self._decode_lazy()
+        return self.query_dict['pwad_hashes']
+
+    @property
+    def country(self) -> str:
+        """:class:`str`: Returns the host's country code."""
+        self._decode_lazy()
+        return self.query_dict['country']
+
+    @property
+    def gamemode_name(self) -> str:
+        """:class:`str`: Returns the game mode's full name,
+        as named by the host."""
+        self._decode_lazy()
+        return self.query_dict['gamemode_name']
+
+    @property
+    def gamemode_shortname(self) -> str:
+        """:class:`str`: Returns the game mode's short name."""
+        self._decode_lazy()
+        return self.query_dict['gamemode_shortname']
+
+    @property
+    def voice_chat(self) -> int:
+        """:class:`int`: Returns the host's voice chat mode."""
+        self._decode_lazy()
+        return self.query_dict['voicechat']
+
+    def _check_count(self, count: int, item_size: int) -> None:
+        # Fail fast when a count can not fit in the rest of the packet
+        if self._validate and \
+                count * item_size > len(self._raw_data) - self._bytepos:
+            raise exceptions.MalformedResponse(
+                f'count {count} exceeds packet', self._bytepos - 1
+            )
+
     def _next_bytes(self, bytes_length: int):
+        if self._validate and \
+                self._bytepos + bytes_length > len(self._raw_data):
+            raise exceptions.MalformedResponse(
+                'truncated field', self._bytepos
+            )
         ret_int = int.from_bytes(
             self._raw_data[self._bytepos:self._bytepos + bytes_length],
             byteorder='little', signed=False
@@ -405,7 +880,33 @@ class Server:
         self._bytepos += bytes_length
         return ret_int
 
+    def _next_raw(self, bytes_length: int) -> bytes:
+        if self._validate and \
+                self._bytepos + bytes_length > len(self._raw_data):
+            raise exceptions.MalformedResponse(
+                'truncated field', self._bytepos
+            )
+        ret_bytes = bytes(
+            self._raw_data[self._bytepos:self._bytepos + bytes_length]
+        )
+        if len(ret_bytes) < bytes_length:
+            raise IndexError('truncated field')
+        self._bytepos += bytes_length
+        return ret_bytes
+
     def _next_string(self) -> str:
+        if self._validate:
+            end = self._raw_data.find(
+                0, self._bytepos, self._bytepos + enums.MAX_STRING_LENGTH + 1
+            )
+            if end < 0:
+                raise exceptions.MalformedResponse(
+                    'unterminated or too long string', self._bytepos
+                )
+            ret_str = self._raw_data[self._bytepos:end].decode('latin-1')
+            self._bytepos = end + 1
+            return ret_str
+
         ret_str = ''
 
         # Read characters until we hit a null, and add them to our string
@@ -1,4 +1,4 @@
-from distutils.core import setup
+from setuptools import setup
 
 readme = ''
 with open('README.md', encoding='utf-8') as fp:
@@ -14,6 +14,9 @@ setup(
     author='hat_kid',
     url='https://github.com/thehatkid/pyzandronum',
     packages=['pyzandronum'],
+    extras_require={
+        'arrow': ['pyarrow>=10.0']
+    },
     classifiers=[
         'License :: OSI Approved :: MIT License',
         'Intended Audience :: Developers',
@@ -0,0 +1,70 @@
+import asyncio
+import os
+
+import pytest
+
+from pyzandronum.responder import Responder
+from pyzandronum.scanner import Scanner
+
+pyarrow = pytest.importorskip('pyarrow')
+import pyarrow.parquet  # noqa: E402
+
+from pyzandronum.arrow import ParquetWriter  # noqa: E402
+
+
+def scan(count: int) -> list:
+    async def run():
+        async with Responder.synthetic(count, seed=3) as responder:
+            return await Scanner(timeout=2.0).scan_all(responder.addresses)
+
+    return asyncio.run(run())
+
+
+def test_parquet_round_trip(tmp_path):
+    results = scan(7)
+    assert all(result.ok for result in results)
+    assert sum(len(result.server.players) for result in results) > 0
+
+    with ParquetWriter(str(tmp_path), batch_size=3) as writer:
+        writer.write_all(results)
+    assert writer.records == 7
+
+    servers_file = pyarrow.parquet.ParquetFile(
+        os.path.join(str(tmp_path), 'servers.parquet')
+    )
+    assert [
+        servers_file.metadata.row_group(i).num_rows
+        for i in range(servers_file.metadata.num_row_groups)
+    ] == [3, 3, 1]
+
+    servers = pyarrow.parquet.read_table(
+        os.path.join(str(tmp_path), 'servers.parquet')
+    ).to_pylist()
+    players = pyarrow.parquet.read_table(
+        os.path.join(str(tmp_path), 'players.parquet')
+    )
+    assert [row['server_id'] for row in servers] == list(range(7))
+    for row, result in zip(servers, results):
+        query = result.server.query_dict
+        assert (row['address'], row['port']) == (result.address, result.port)
+        assert row['hostname'] == query['hostname']
+        assert row['map'] == query['map']
+        assert row['gamemode'] == query['gamemode'].name
+        assert row['pwads'] == query['pwads_list']
+        assert row['numplayers'] == query['numplayers']
+        assert row['error'] is None
+
+    # Players link to their server's row
+    names = {}
+    for row in players.to_pylist():
+        names.setdefault(row['server_id'], []).append(row['name'])
+    for server_id, result in enumerate(results):
+        assert names.get(server_id, []) == [
+            player.name for player in result.server.players
+        ]
+
+    schema = servers_file.schema_arrow
+    for column in ('map', 'gamemode', 'iwad', 'version', 'error'):
+        assert pyarrow.types.is_dictionary(schema.field(column).type)
+    assert pyarrow.types.is_dictionary(schema.field('pwads').type.value_type)
+    assert pyarrow.types.is_string(schema.field('hostname').type)
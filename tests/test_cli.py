@@ -0,0 +1,17 @@
+import pytest
+
+from pyzandronum.__main__ import main, parse_target
+
+
+def test_parse_target():
+    assert parse_target('example.org') == ('example.org', 10666)
+    assert parse_target('example.org:10700') == ('example.org', 10700)
+    assert parse_target('[::1]:10700') == ('::1', 10700)
+
+
+@pytest.mark.parametrize('option', (
+    ['--deadline', '1'], ['--health', 'health.json'], ['--state', 'state.json']
+))
+def test_processes_rejects_single_process_options(option):
+    with pytest.raises(SystemExit, match=option[0]):
+        main(['scan', '-p', '2', *option, '127.0.0.1'])
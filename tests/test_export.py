@@ -0,0 +1,46 @@
+import asyncio
+import socket
+
+from pyzandronum import enums
+from pyzandronum.export import BinaryReader, BinaryWriter
+from pyzandronum.responder import Responder, generate_state
+from pyzandronum.scanner import Scanner
+
+
+def scan_mixed() -> list:
+    states = [generate_state(), generate_state(), generate_state()]
+    states[1]['response'] = enums.Response.DENIED_QUERY
+
+    async def run():
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            # Nothing listens there once the socket is closed
+            sock.bind(('127.0.0.1', 0))
+            closed = sock.getsockname()
+        async with Responder(states) as responder:
+            return await Scanner(timeout=0.3, retries=0).scan_all(
+                responder.addresses + [closed]
+            ), states
+
+    return asyncio.run(run())
+
+
+def test_binary_reader_skips_errors(tmp_path):
+    results, states = scan_mixed()
+    assert [type(result.error).__name__ for result in results] == [
+        'NoneType', 'QueryIgnored', 'NoneType', 'QueryTimeout'
+    ]
+
+    path = str(tmp_path / 'scan.bin')
+    with open(path, 'wb') as fp:
+        BinaryWriter(fp).write_all(results)
+
+    with BinaryReader(path) as reader:
+        records = list(reader.records())
+        servers = list(reader.servers())
+
+    assert [data['error'] for data in records] == [
+        None, 'QueryIgnored', None, 'QueryTimeout'
+    ]
+    assert [server.name for server in servers] == [
+        states[0]['hostname'], states[2]['hostname']
+    ]
@@ -0,0 +1,71 @@
+import asyncio
+
+from pyzandronum.gateway import Gateway
+from pyzandronum.health import HealthTracker
+from pyzandronum.scanner import Scanner
+
+
+async def fetch(port: int, request: bytes) -> bytes:
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(request)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return response
+
+
+def test_overlong_request_line():
+    async def run():
+        async with Gateway([], port=0) as gateway:
+            target = b'/servers?name=' + b'x' * 100000
+            return await fetch(
+                gateway.port, b'GET ' + target + b' HTTP/1.1\r\n\r\n'
+            )
+
+    assert asyncio.run(run()).startswith(b'HTTP/1.1 400 ')
+
+
+def test_health_not_cached():
+    async def run():
+        scanner = Scanner(health=HealthTracker())
+        async with Gateway([], scanner=scanner, port=0) as gateway:
+            request = b'GET /health HTTP/1.0\r\n\r\n'
+            first = await fetch(gateway.port, request)
+            scanner.health.stats['skipped'] += 1
+            second = await fetch(gateway.port, request)
+            return first, second
+
+    first, second = asyncio.run(run())
+    assert b'"skipped":0' in first
+    assert b'"skipped":1' in second
+
+
+def test_default_scanner_queries_once_per_poll():
+    assert Gateway([]).scanner.retries == 0
+
+
+def test_if_none_match_list():
+    async def run():
+        async with Gateway([], port=0) as gateway:
+            response = await fetch(
+                gateway.port, b'GET /servers HTTP/1.0\r\n\r\n'
+            )
+            etag = response.split(b'ETag: ')[1].split(b'\r\n')[0]
+            statuses = []
+            for header in (
+                etag,
+                b'"other", ' + etag,
+                b'"other",W/' + etag,
+                b'*',
+                b'"other"',
+                b'W/"other"'
+            ):
+                response = await fetch(
+                    gateway.port,
+                    b'GET /servers HTTP/1.0\r\nIf-None-Match: ' + header +
+                    b'\r\n\r\n'
+                )
+                statuses.append(int(response.split(b' ')[1]))
+            return statuses
+
+    assert asyncio.run(run()) == [304, 304, 304, 304, 200, 200]
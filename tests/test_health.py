@@ -0,0 +1,109 @@
+import asyncio
+import socket
+
+import pytest
+
+from pyzandronum import exceptions
+from pyzandronum.health import (
+    CLOSED, HALF_OPEN, OPEN, CircuitOpen, HealthTracker
+)
+from pyzandronum.scanner import Scanner
+
+ADDR = ('127.0.0.1', 10666)
+
+
+def fail(tracker: HealthTracker, now: float, times: int = 1) -> None:
+    for i in range(times):
+        tracker.failure(ADDR, exceptions.QueryTimeout(), now=now)
+
+
+def test_circuit_states():
+    tracker = HealthTracker(failure_threshold=3, base_interval=10.0)
+
+    fail(tracker, 0.0, 2)
+    assert tracker.get(ADDR).state == CLOSED
+    assert tracker.allow(ADDR, now=0.0)
+
+    fail(tracker, 0.0)
+    health = tracker.get(ADDR)
+    assert (health.state, health.next_probe) == (OPEN, 10.0)
+    assert health.last_error == 'QueryTimeout'
+    assert tracker.open_servers() == [ADDR]
+    assert not tracker.allow(ADDR, now=9.9)
+
+    # One probe is let through, further queries wait for its outcome
+    assert tracker.allow(ADDR, now=10.0)
+    assert tracker.get(ADDR).state == HALF_OPEN
+    assert not tracker.allow(ADDR, now=10.5)
+
+    tracker.record(ADDR)
+    assert tracker.get(ADDR).state == CLOSED
+    assert tracker.open_servers() == []
+    assert tracker.allow(ADDR, now=10.5)
+    assert tracker.stats == {
+        'skipped': 2, 'probes': 1, 'opened': 1, 'closed': 1
+    }
+
+
+def test_probe_interval_growth():
+    tracker = HealthTracker(
+        failure_threshold=1, base_interval=10.0, max_interval=50.0,
+        multiplier=2.0
+    )
+    fail(tracker, 0.0)
+
+    now = 0.0
+    intervals = []
+    for i in range(5):
+        now = tracker.get(ADDR).next_probe
+        assert tracker.allow(ADDR, now=now)
+        fail(tracker, now)
+        intervals.append(tracker.get(ADDR).interval)
+    assert intervals == [20.0, 40.0, 50.0, 50.0, 50.0]
+    assert tracker.get(ADDR).next_probe == now + 50.0
+
+
+def test_other_denials_are_not_failures():
+    tracker = HealthTracker(failure_threshold=1)
+    tracker.record(ADDR, exceptions.QueryDenied())
+    assert len(tracker) == 0
+    tracker.record(ADDR, exceptions.QueryBanned())
+    assert tracker.get(ADDR).state == OPEN
+
+
+def test_save_and_load(tmp_path):
+    path = str(tmp_path / 'health.json')
+    tracker = HealthTracker(failure_threshold=1, path=path)
+    fail(tracker, 100.0)
+    assert not tracker.allow(ADDR, now=101.0)
+    tracker.save()
+
+    loaded = HealthTracker(path=path)
+    health = loaded.get(ADDR)
+    assert (health.state, health.failures, health.next_probe) == (
+        OPEN, 1, 160.0
+    )
+    assert loaded.stats['skipped'] == 1
+    assert not loaded.allow(ADDR, now=101.0)
+    assert loaded.allow(ADDR, now=160.0)
+
+
+def test_scanner_skips_open_circuit():
+    target = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    target.bind(('127.0.0.1', 0))
+    target.setblocking(False)
+    addr = target.getsockname()
+
+    tracker = HealthTracker(failure_threshold=1)
+    tracker.failure(addr, exceptions.QueryTimeout())
+    scanner = Scanner(timeout=0.2, health=tracker)
+    try:
+        results = asyncio.run(scanner.scan_all([addr, addr]))
+        assert [type(result.error) for result in results] == [
+            CircuitOpen, CircuitOpen
+        ]
+        with pytest.raises(BlockingIOError):
+            target.recvfrom(2048)
+        assert tracker.stats['skipped'] == 1
+    finally:
+        target.close()
@@ -0,0 +1,56 @@
+import random
+
+import pytest
+
+from pyzandronum import enums, huffman
+from pyzandronum.responder import build_response, generate_state
+
+
+def packets(rng: random.Random) -> list:
+    codec = huffman.get_codec()
+    raw = [
+        build_response(
+            generate_state(rng), enums.RequestFlags.all().value, 0,
+            enums.ExtendedFlags.all().value
+        )
+        for i in range(20)
+    ]
+    # Random bytes do not compress and are sent unencoded (0xff header)
+    raw += [rng.randbytes(rng.randrange(1, 300)) for i in range(20)]
+    raw += [bytes([rng.choice(b'\x00abc')]) * n for n in range(1, 40)]
+    return [codec.encode(data) for data in raw]
+
+
+def test_round_trip():
+    codec = huffman.get_codec()
+    rng = random.Random(0)
+    for data in [b'', b'\x00', bytes(range(256)), rng.randbytes(1000)]:
+        assert codec.decode(codec.encode(data)) == data
+
+
+def test_decode_many_matches_decode():
+    codec = huffman.get_codec()
+    encoded = packets(random.Random(0))
+    buffer, offsets = codec.decode_many(encoded)
+    assert len(offsets) == len(encoded) + 1
+    for i, data in enumerate(encoded):
+        assert buffer[offsets[i]:offsets[i + 1]] == codec.decode(data)
+
+
+def test_decode_many_accepts_memoryviews():
+    codec = huffman.get_codec()
+    encoded = packets(random.Random(1))
+    expected = codec.decode_many(encoded)
+    assert codec.decode_many([memoryview(data) for data in encoded]) == expected
+
+
+def test_decode_many_errors():
+    codec = huffman.get_codec()
+    valid = codec.encode(b'MAP01')
+    invalid = b'\x09' + valid[1:]
+
+    with pytest.raises(ValueError):
+        codec.decode_many([valid, invalid])
+    buffer, offsets = codec.decode_many([valid, invalid, b'', valid], 'ignore')
+    assert offsets == [0, 5, 5, 5, 10]
+    assert buffer == b'MAP01MAP01'
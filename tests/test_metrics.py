@@ -0,0 +1,91 @@
+import math
+import time
+
+import pytest
+
+from pyzandronum.metrics import PHASES, Histogram, Metrics
+
+
+def test_histogram_buckets():
+    histogram = Histogram((0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 1.0, 2.0, 3.0):
+        histogram.observe(value)
+
+    # Bounds are inclusive, like Prometheus' le
+    assert histogram.counts == [2, 2, 2]
+    assert histogram.cumulative() == [(0.1, 2), (1.0, 4), (math.inf, 6)]
+    assert histogram.count == 6
+    assert histogram.sum == pytest.approx(6.65)
+
+
+def test_histogram_quantiles():
+    histogram = Histogram((1.0, 2.0, 4.0))
+    assert histogram.quantile(0.5) is None
+
+    for value in (0.5, 1.5, 1.5, 3.0):
+        histogram.observe(value)
+    assert histogram.quantile(0.0) == 0.0
+    assert histogram.quantile(0.25) == 1.0
+    assert histogram.quantile(0.5) == 1.5
+    assert histogram.quantile(0.75) == 2.0
+    assert histogram.quantile(1.0) == 4.0
+
+    # Quantiles above the last bound are capped at it
+    histogram.observe(10.0)
+    assert histogram.quantile(1.0) == 4.0
+
+
+def test_phase_timer():
+    metrics = Metrics()
+    timer = metrics.timer()
+    time.sleep(0.01)
+    timer.mark('encode')
+    timer.mark('send')
+    timer.mark('encode')
+
+    encode = metrics.phases['encode']
+    assert encode.count == 2
+    assert encode.sum >= 0.01
+    assert metrics.phases['send'].count == 1
+    assert metrics.phases['wait'].count == 0
+
+
+def test_to_prometheus():
+    metrics = Metrics(buckets=(0.001, 0.01))
+    metrics.inc('queries', 3)
+    metrics.inc('timeouts')
+    metrics.phases['wait'].observe(0.005)
+    metrics.phases['wait'].observe(0.5)
+    lines = metrics.to_prometheus().splitlines()
+
+    assert '# TYPE pyzandronum_queries_total counter' in lines
+    assert 'pyzandronum_queries_total 3' in lines
+    assert 'pyzandronum_timeouts_total 1' in lines
+    assert '# TYPE pyzandronum_query_phase_seconds histogram' in lines
+    assert lines.count('# TYPE pyzandronum_query_phase_seconds histogram') == 1
+
+    wait = [line for line in lines if 'phase="wait"' in line]
+    assert wait == [
+        'pyzandronum_query_phase_seconds_bucket{phase="wait",le="0.001"} 0',
+        'pyzandronum_query_phase_seconds_bucket{phase="wait",le="0.01"} 1',
+        'pyzandronum_query_phase_seconds_bucket{phase="wait",le="+Inf"} 2',
+        'pyzandronum_query_phase_seconds_sum{phase="wait"} 0.505',
+        'pyzandronum_query_phase_seconds_count{phase="wait"} 2'
+    ]
+    assert len([line for line in lines if '_count{' in line]) == len(PHASES)
+
+
+def test_to_dict_and_reset():
+    metrics = Metrics(buckets=(1.0,))
+    metrics.inc('responses')
+    metrics.phases['parse'].observe(0.5)
+    data = metrics.to_dict()
+    assert data['counters']['responses'] == 1
+    assert data['phases']['parse'] == {
+        'count': 1, 'sum': 0.5, 'buckets': {'1.0': 1, 'inf': 1}
+    }
+
+    metrics.reset()
+    assert metrics.counters['responses'] == 0
+    assert metrics.phases['parse'].count == 0
+    assert metrics.phases['parse'].buckets == (1.0,)
@@ -0,0 +1,123 @@
+import asyncio
+import socket
+
+from pyzandronum.partition import (
+    HashRing, Membership, PartitionedScanner, scan_nodes
+)
+from pyzandronum.scanner import ShardedScanner
+
+TARGETS = [(f'10.0.{i // 256}.{i % 256}', 10666) for i in range(2000)]
+
+
+def closed_ports(count: int) -> list:
+    # Ports nothing listens on, so queries fail fast
+    targets = []
+    for i in range(count):
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.bind(('127.0.0.1', 0))
+            targets.append(sock.getsockname())
+    return targets
+
+
+def test_shares_cover_every_target_once():
+    ring = HashRing(['a', 'b', 'c'])
+    shares = [ring.share(TARGETS, node) for node in 'abc']
+    indices = sorted(index for share in shares for index, host, port in share)
+    assert indices == list(range(len(TARGETS)))
+    # Replicas keep the shares roughly even
+    assert all(len(share) > len(TARGETS) / 6 for share in shares)
+
+
+def test_assignment_is_stable():
+    first = HashRing(['a', 'b', 'c'])
+    second = HashRing(['c', 'a', 'b'])
+    for host, port in TARGETS:
+        assert first.node_for(host, port) == second.node_for(host, port)
+
+
+def test_join_only_moves_targets_to_the_new_node():
+    ring = HashRing(['a', 'b', 'c'])
+    before = {target: ring.node_for(*target) for target in TARGETS}
+    ring.add('d')
+    moved = 0
+    for target in TARGETS:
+        node = ring.node_for(*target)
+        if node != before[target]:
+            assert node == 'd'
+            moved += 1
+    assert 0 < moved < len(TARGETS) / 2
+
+    ring.remove('d')
+    assert {target: ring.node_for(*target) for target in TARGETS} == before
+
+
+def test_scan_nodes_yields_every_target_once():
+    targets = closed_ports(20)
+    results = list(scan_nodes(targets, nodes=3, timeout=0.5, retries=0))
+    assert sorted(result.index for result in results) == list(range(20))
+    for result in results:
+        assert (result.address, result.port) == targets[result.index]
+
+
+def test_sharded_scanner_keeps_target_order():
+    targets = closed_ports(10)
+    scanner = ShardedScanner(processes=2, timeout=0.5, retries=0)
+    results = list(scanner.scan(targets))
+    assert [result.index for result in results] == list(range(10))
+
+
+def test_membership_rebalances_shares():
+    async def until(condition):
+        for i in range(100):
+            if condition():
+                return
+            await asyncio.sleep(0.02)
+        raise AssertionError('membership did not converge')
+
+    def indices(scanners):
+        return sorted(
+            index for scanner in scanners
+            for index, host, port in scanner.share(TARGETS)
+        )
+
+    async def run():
+        changes = []
+        a = Membership('a', host='127.0.0.1', interval=0.05, timeout=0.5,
+                       on_change=changes.append)
+        address = await a.start()
+        b = Membership('b', [address], host='127.0.0.1', interval=0.05,
+                       timeout=0.5)
+        c = Membership('c', [address], host='127.0.0.1', interval=0.05,
+                       timeout=0.5)
+        await b.start()
+        await c.start()
+        scanners = [
+            PartitionedScanner(membership.node, membership=membership)
+            for membership in (a, b, c)
+        ]
+        try:
+            # b and c only know a, and find each other through it
+            await until(lambda: all(
+                m.members() == ['a', 'b', 'c'] for m in (a, b, c)
+            ))
+            assert indices(scanners) == list(range(len(TARGETS)))
+            before = {
+                index: scanner.node for scanner in scanners
+                for index, host, port in scanner.share(TARGETS)
+            }
+
+            c.close()
+            await until(lambda: all(
+                m.members() == ['a', 'b'] for m in (a, b)
+            ))
+            assert indices(scanners[:2]) == list(range(len(TARGETS)))
+            for scanner in scanners[:2]:
+                for index, host, port in scanner.share(TARGETS):
+                    assert before[index] in (scanner.node, 'c')
+        finally:
+            for membership in (a, b, c):
+                membership.close()
+        return changes
+
+    changes = asyncio.run(run())
+    assert changes[-2:] == [['a', 'b', 'c'], ['a', 'b']]
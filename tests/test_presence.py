@@ -0,0 +1,38 @@
+from types import SimpleNamespace
+
+from pyzandronum.presence import PresenceTracker
+
+
+def make_server(port: int, names: list):
+    return SimpleNamespace(
+        address='127.0.0.1', port=port,
+        players=[SimpleNamespace(name=name, bot=False) for name in names]
+    )
+
+
+def test_where_and_sessions():
+    tracker = PresenceTracker()
+    tracker.ingest([make_server(1, ['\x1cAPlayer'])], timestamp=0)
+    tracker.ingest([make_server(1, ['Player'])], timestamp=60)
+    assert [p.server for p in tracker.where('PLAYER')] == ['127.0.0.1:1']
+
+    tracker.ingest([make_server(1, [])], timestamp=120)
+    assert tracker.where('player') == []
+    assert tracker.sessions('player') == [('127.0.0.1:1', 0, 60)]
+    assert tracker.played('player', 30, 1000) == 30
+
+
+def test_silent_server_sessions_stay_in_order():
+    tracker = PresenceTracker(retention=500, grace=250)
+    tracker.ingest([make_server(1, ['Player'])], timestamp=0)
+    # Server 1 falls silent; the player shows up on server 2
+    tracker.ingest([make_server(2, ['Player'])], timestamp=100)
+    tracker.ingest([make_server(2, [])], timestamp=200)
+    tracker.ingest([], timestamp=300)
+    # Server 1's session ends at its last sighting, before server 2's
+    assert tracker.sessions('Player') == [
+        ('127.0.0.1:1', 0, 0), ('127.0.0.1:2', 100, 100)
+    ]
+
+    tracker.ingest([], timestamp=550)
+    assert tracker.sessions('Player') == [('127.0.0.1:2', 100, 100)]
@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+
+from pyzandronum.rcon import InvalidPassword, RCONClient
+from pyzandronum.responder import RCONResponder
+
+
+def run(coroutine_function, **options):
+    async def main():
+        async with RCONResponder('secret', **options) as responder:
+            return await coroutine_function(responder)
+
+    return asyncio.run(main())
+
+
+def client(responder: RCONResponder, password: str = 'secret', **options):
+    return RCONClient(
+        *responder.address, password, timeout=2.0, **options
+    )
+
+
+def test_login():
+    async def main(responder):
+        async with client(responder) as rcon:
+            assert rcon.connected
+            assert rcon.hostname == responder.hostname
+            assert rcon.map == 'MAP01'
+            assert rcon.players == ['Player']
+        return responder.stats
+
+    stats = run(main, players=['Player'])
+    assert stats['logins'] == 1
+
+
+def test_wrong_password():
+    async def main(responder):
+        with pytest.raises(InvalidPassword):
+            await client(responder, 'wrong').connect()
+        return responder.stats
+
+    stats = run(main)
+    assert stats['failed_logins'] == 1
+    assert stats['logins'] == 0
+
+
+def test_execute():
+    async def main(responder):
+        async with client(responder) as rcon:
+            output = await rcon.execute('status', quiet=0.1)
+            changed = await rcon.execute('map MAP02', quiet=0.1)
+            await asyncio.sleep(0.05)
+            return output, changed, rcon.map
+
+    output, changed, current = run(
+        main, commands={'status': lambda argument: ['line 1', 'line 2']}
+    )
+    assert output == ['line 1', 'line 2']
+    assert changed == ['Changing map to MAP02']
+    assert current == 'MAP02'
+
+
+def test_messages():
+    async def main(responder):
+        async with client(responder) as rcon:
+            rcon.send('say hello')
+            messages = rcon.messages()
+            return await asyncio.wait_for(messages.__anext__(), 2.0)
+
+    assert run(main) == '<server>: hello'
+
+
+def test_tab_complete():
+    async def main(responder):
+        async with client(responder) as rcon:
+            return await rcon.tab_complete('s')
+
+    assert run(main, commands={'status': str}) == ['say', 'status']
+
+
+def test_heartbeat():
+    async def main(responder):
+        async with client(responder, heartbeat=0.05):
+            await asyncio.sleep(0.3)
+        return responder.stats['pongs']
+
+    assert run(main) >= 3
+
+
+def test_concurrent_requests():
+    async def main(responder):
+        async with client(responder) as rcon:
+            return await asyncio.gather(
+                rcon.tab_complete('e'),
+                rcon.tab_complete('m'),
+                rcon.execute('echo one', quiet=0.1),
+                rcon.tab_complete('s')
+            )
+
+    assert run(main) == [['echo'], ['map'], ['one'], ['say']]
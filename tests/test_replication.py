@@ -0,0 +1,165 @@
+from pyzandronum import replication
+from pyzandronum.replication import Publisher, Subscriber, UDPPublisher
+from pyzandronum.scanner import ScanResult
+from pyzandronum.zandronum import Server
+
+
+def make_result(port: int, names: list, hostname: str = 'Test') -> ScanResult:
+    server = Server.from_snapshot({
+        'address': '127.0.0.1',
+        'port': port,
+        'response': 5660023,
+        'response_time': 0,
+        'response_flags': 0,
+        'query': {'hostname': hostname, 'numplayers': len(names)},
+        'players': [
+            {'name': name, 'score': i, 'ping': 50}
+            for i, name in enumerate(names)
+        ]
+    })
+    return ScanResult(0, '127.0.0.1', port, server, latency=0.01)
+
+
+def replicate(publisher: Publisher, subscriber: Subscriber, scan: list):
+    assert subscriber.apply(publisher.publish(scan))
+    return {
+        data['port']: data for data in subscriber.records()
+    }
+
+
+def test_players_with_the_same_name():
+    publisher = Publisher()
+    subscriber = Subscriber()
+
+    state = replicate(publisher, subscriber, [
+        make_result(1, ['Player', 'Player', 'Player'])
+    ])
+    assert [p['score'] for p in state[1]['players']] == [0, 1, 2]
+
+    state = replicate(publisher, subscriber, [
+        make_result(1, ['Player', 'Other'])
+    ])
+    assert [p['name'] for p in state[1]['players']] == ['Player', 'Other']
+
+
+def test_server_that_stops_answering():
+    publisher = Publisher()
+    subscriber = Subscriber()
+
+    replicate(publisher, subscriber, [make_result(1, ['Player'])])
+    state = replicate(publisher, subscriber, [
+        ScanResult(0, '127.0.0.1', 1, error=TimeoutError())
+    ])
+    assert state[1]['error'] == 'TimeoutError'
+    assert state[1]['query'] == {}
+    assert state[1]['players'] == []
+    assert subscriber.servers() == []
+
+
+def test_deltas_match_keyframes():
+    publisher = Publisher(keyframe_interval=100)
+    subscriber = Subscriber()
+    scans = [
+        [make_result(1, ['A', 'B']), make_result(2, [])],
+        [make_result(1, ['A']), make_result(2, ['C'], 'Renamed')],
+        [make_result(2, ['C', 'D'])]
+    ]
+
+    for scan in scans:
+        replicate(publisher, subscriber, scan)
+        fresh = Subscriber()
+        assert fresh.apply(publisher.keyframe())
+        assert fresh.records() == subscriber.records()
+
+
+def test_stale_keyframe_is_ignored():
+    publisher = Publisher()
+    subscriber = Subscriber()
+
+    replicate(publisher, subscriber, [make_result(1, ['A'], 'Old')])
+    stale = publisher.keyframe()
+    replicate(publisher, subscriber, [make_result(1, ['A'], 'New')])
+
+    assert subscriber.apply(stale)
+    assert subscriber.records()[0]['query']['hostname'] == 'New'
+
+
+def test_publisher_restart():
+    subscriber = Subscriber()
+    publisher = Publisher()
+    replicate(publisher, subscriber, [make_result(1, ['A'], 'Old')])
+    replicate(publisher, subscriber, [make_result(1, ['A'], 'Older')])
+
+    # A restarted publisher counts from 1 again, with new name ids
+    publisher = Publisher()
+    state = replicate(publisher, subscriber, [
+        make_result(2, ['B'], 'New'), make_result(1, ['A'], 'Old')
+    ])
+    assert state[2]['query']['hostname'] == 'New'
+    state = replicate(publisher, subscriber, [make_result(2, ['C'], 'Newer')])
+    assert list(state) == [2]
+    assert state[2]['query']['hostname'] == 'Newer'
+    assert state[2]['players'][0]['name'] == 'C'
+
+
+def test_restarted_publisher_delta_needs_keyframe():
+    subscriber = Subscriber()
+    replicate(Publisher(), subscriber, [make_result(1, ['A'])])
+
+    publisher = Publisher()
+    publisher.publish([make_result(1, ['A'])])
+    assert not subscriber.apply(publisher.publish([make_result(1, ['B'])]))
+    assert subscriber.apply(publisher.keyframe())
+    assert subscriber.records()[0]['players'][0]['name'] == 'B'
+
+
+def test_keyframe_every_message():
+    publisher = Publisher(keyframe_interval=1)
+    for i in range(3):
+        publisher.publish([make_result(1, ['A'] * i)])
+    assert publisher.stats['keyframes'] == 3
+    assert publisher.stats['deltas'] == 0
+
+
+class FakeTransport:
+    def __init__(self) -> None:
+        self.sent = []
+
+    def sendto(self, data: bytes, addr: tuple = None) -> None:
+        self.sent.append(data)
+
+
+def test_udp_chunks_of_different_messages_do_not_mix(monkeypatch):
+    publisher = UDPPublisher()
+    publisher._transport = FakeTransport()
+    subscriber = Subscriber()
+    protocol = replication._UDPSubscriberProtocol(subscriber)
+    protocol.transport = FakeTransport()
+
+    assert subscriber.apply(publisher.publish(
+        [make_result(port, ['A'], 'First') for port in range(1, 4)]
+    ))
+    # A keyframe sent on request and the next delta share a sequence;
+    # cut both into two chunks
+    names = [f'Player {i} with a long name' for i in range(32)]
+    delta = publisher.publish(
+        [make_result(port, names, 'Second') for port in range(1, 4)]
+    )
+    keyframe = publisher.keyframe()
+    size = -(-max(len(delta), len(keyframe)) // 2)
+    assert min(len(delta), len(keyframe)) > size
+    monkeypatch.setattr(replication, '_CHUNK_SIZE', size)
+
+    publisher._send(delta, [None])
+    publisher._send(keyframe, [None])
+    delta_chunks = publisher._transport.sent[:2]
+    keyframe_chunks = publisher._transport.sent[2:]
+    assert len(keyframe_chunks) == 2
+
+    for chunk in (delta_chunks[0], keyframe_chunks[1],
+                  keyframe_chunks[0], delta_chunks[1]):
+        protocol.datagram_received(chunk, None)
+    assert protocol.transport.sent == []
+    assert {
+        data['query']['hostname'] for data in subscriber.records()
+    } == {'Second'}
@@ -0,0 +1,182 @@
+import asyncio
+import random
+import socket
+import threading
+
+import pytest
+
+from pyzandronum import enums, exceptions, huffman
+from pyzandronum.export import record
+from pyzandronum.responder import Responder, build_response, generate_state
+from pyzandronum.scanner import Scanner, ShardedScanner
+
+
+def scan(scanner: Scanner, responder: Responder) -> list:
+    async def run():
+        async with responder:
+            return await scanner.scan_all(responder.addresses)
+
+    return asyncio.run(run())
+
+
+def test_scan_all():
+    responder = Responder.synthetic(20, seed=0)
+    results = scan(Scanner(timeout=2.0), responder)
+    assert [result.ok for result in results] == [True] * 20
+    assert [result.server.name for result in results] == [
+        state['hostname'] for state in responder.states
+    ]
+
+
+def test_scan_multiplexed():
+    async def run(engine):
+        responder = Responder.synthetic(50, seed=0)
+        targets = await responder.start(multiplex=True)
+        try:
+            results = await Scanner(timeout=2.0, engine=engine).scan_all(
+                targets + [targets[3]]
+            )
+        finally:
+            responder.close()
+        return responder, targets, results
+
+    for engine in (False, True):
+        responder, targets, results = asyncio.run(run(engine))
+        assert len(set(target[:2] for target in targets)) == 1
+        assert [result.ok for result in results] == [True] * 51
+        assert [result.server.name for result in results] == [
+            state['hostname'] for state in responder.states
+        ] + [responder.states[3]['hostname']]
+        assert responder.stats['requests'] == 50
+
+
+def test_state_keeps_only_answers(tmp_path):
+    path = str(tmp_path / 'state.json.gz')
+    states = [generate_state(), generate_state()]
+    states[1]['response'] = enums.Response.DENIED_QUERY
+    responder = Responder(states)
+
+    scanner = Scanner(timeout=2.0, state=path)
+    results = scan(scanner, responder)
+    assert results[0].ok and not results[1].ok
+    first, denied = responder.addresses
+
+    restored = Scanner(state=path)
+    snapshot = restored.last_snapshot(*first)
+    assert snapshot['query']['hostname'] == states[0]['hostname']
+    assert restored.last_snapshot(*denied) is None
+
+
+@pytest.fixture
+def broken_servers():
+    # Servers whose lazily decoded sections are truncated
+    F = enums.RequestFlags
+    codec = huffman.get_codec()
+    state = generate_state(
+        random.Random(0), players=(1, 4), gamemode=enums.Gamemode.CTF
+    )
+    teams = build_response(
+        state, (F.SQF_NAME | F.SQF_TEAMINFO_NUMBER | F.SQF_TEAMINFO_NAME |
+                F.SQF_TEAMINFO_SCORE).value, 0
+    )
+    extended = build_response(
+        state, (F.SQF_NAME | F.SQF_EXTENDED_INFO).value, 0,
+        enums.ExtendedFlags.all().value
+    )
+    packets = [codec.encode(teams[:-1]), codec.encode(extended[:-2])]
+
+    stop = threading.Event()
+    sockets = []
+    threads = []
+    for packet in packets:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(('127.0.0.1', 0))
+        sock.settimeout(0.1)
+        sockets.append(sock)
+
+        def serve(sock=sock, packet=packet):
+            while not stop.is_set():
+                try:
+                    data, addr = sock.recvfrom(1024)
+                except socket.timeout:
+                    continue
+                sock.sendto(packet, addr)
+
+        threads.append(threading.Thread(target=serve, daemon=True))
+        threads[-1].start()
+
+    yield [sock.getsockname() for sock in sockets]
+    stop.set()
+    for thread in threads:
+        thread.join()
+    for sock in sockets:
+        sock.close()
+
+
+def test_broken_lazy_sections(broken_servers, tmp_path):
+    scanner = Scanner(timeout=2.0, state=str(tmp_path / 'state.json.gz'))
+    results = asyncio.run(scanner.scan_all(broken_servers))
+
+    for result in results:
+        assert result.ok
+        with pytest.raises(exceptions.MalformedResponse):
+            result.server.snapshot()
+        assert record(result)['error'] == 'MalformedResponse'
+        assert scanner.last_snapshot(result.address, result.port) is None
+    with pytest.raises(exceptions.MalformedResponse):
+        results[0].server.teams
+    with pytest.raises(exceptions.MalformedResponse):
+        results[1].server.country
+
+
+def test_broken_lazy_sections_in_workers(broken_servers):
+    scanner = ShardedScanner(processes=2, timeout=2.0)
+    for result in scanner.scan(broken_servers):
+        assert isinstance(result.error, exceptions.MalformedResponse)
+
+
+def test_scan_deadline():
+    async def run():
+        fast = Responder.synthetic(3, seed=1)
+        slow = Responder.synthetic(2, seed=2, latency=0.4)
+        late_results = []
+        async with fast, slow:
+            scanner = Scanner(timeout=2.0, retries=0)
+            partial = await scanner.scan_deadline(
+                fast.addresses + slow.addresses, 0.2,
+                on_late=late_results.append
+            )
+            at_deadline = [result.ok for result in partial.results]
+            pending = set(partial.pending)
+            late = [result async for result in partial.late()]
+        return at_deadline, pending, late, late_results, partial
+
+    at_deadline, pending, late, late_results, partial = asyncio.run(run())
+    assert at_deadline == [True, True, True, False, False]
+    assert pending == {3, 4}
+    assert sorted(result.index for result in late) == [3, 4]
+    assert all(result.ok for result in late)
+    assert late_results == late
+    assert partial.done
+    assert [result.ok for result in partial.results] == [True] * 5
+
+
+def test_scan_deadline_cancel():
+    async def run():
+        fast = Responder.synthetic(1, seed=1)
+        slow = Responder.synthetic(1, seed=2, latency=0.3)
+        async with fast, slow:
+            scanner = Scanner(timeout=2.0, retries=0)
+            partial = await scanner.scan_deadline(
+                fast.addresses + slow.addresses, 0.1
+            )
+            partial.cancel()
+            late = [result async for result in partial.late()]
+            await asyncio.sleep(0.4)
+            return partial, late
+
+    partial, late = asyncio.run(run())
+    assert late == []
+    assert partial.done
+    assert partial.results[0].ok
+    assert partial.results[1].pending
@@ -0,0 +1,66 @@
+import os
+from types import SimpleNamespace
+
+from pyzandronum.store import SnapshotStore, StoreReader
+
+
+def make_server(port: int, map_name: str = 'MAP01', players: int = 0):
+    return SimpleNamespace(
+        address='127.0.0.1', port=port, map=map_name, number_players=players
+    )
+
+
+def test_series_round_trip(tmp_path):
+    store = SnapshotStore(str(tmp_path))
+    store.append([make_server(1, players=3), make_server(2)], timestamp=100.0)
+    store.append([make_server(1, 'MAP02', 4)], timestamp=200.0)
+
+    with StoreReader(str(tmp_path)) as reader:
+        assert [row[:3] for row in reader.series('127.0.0.1', 1)] == [
+            (100.0, 3, 'MAP01'), (200.0, 4, 'MAP02')
+        ]
+        assert reader.total_players() == [(100.0, 3), (200.0, 4)]
+
+
+def test_reopen_after_torn_append(tmp_path):
+    store = SnapshotStore(str(tmp_path))
+    store.append([make_server(1, players=1), make_server(2)], timestamp=100.0)
+
+    # A crash in the middle of the next append: the scan start and one
+    # column were written, the others were not
+    store.append([make_server(1, players=2), make_server(2)], timestamp=200.0)
+    for name in ('server.u32', 'numplayers.u8', 'map.u32', 'ping.f32'):
+        path = os.path.join(str(tmp_path), name)
+        with open(path, 'r+b') as fp:
+            fp.truncate(os.path.getsize(path) // 2)
+
+    store = SnapshotStore(str(tmp_path))
+    store.append([make_server(1, players=5), make_server(2)], timestamp=300.0)
+
+    with StoreReader(str(tmp_path)) as reader:
+        assert reader.rows == 4
+        assert [scan[0] for scan in reader.scans()] == [100.0, 300.0]
+        assert [row[:2] for row in reader.series('127.0.0.1', 1)] == [
+            (100.0, 1), (300.0, 5)
+        ]
+
+
+def test_names_with_newlines(tmp_path):
+    store = SnapshotStore(str(tmp_path))
+    store.append([make_server(1, 'A\nB'), make_server(2, 'C')], timestamp=1.0)
+
+    store = SnapshotStore(str(tmp_path))
+    assert store.maps == ['A\nB', 'C']
+    with StoreReader(str(tmp_path)) as reader:
+        assert reader.series('127.0.0.1', 2)[0][2] == 'C'
+
+
+def test_torn_dictionary_line(tmp_path):
+    store = SnapshotStore(str(tmp_path))
+    store.append([make_server(1)], timestamp=1.0)
+    with open(os.path.join(str(tmp_path), 'maps.jsonl'), 'a') as fp:
+        fp.write('"MAP')
+
+    store = SnapshotStore(str(tmp_path))
+    store.append([make_server(1, 'MAP02')], timestamp=2.0)
+    assert SnapshotStore(str(tmp_path)).maps == ['MAP01', 'MAP02']
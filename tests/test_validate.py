@@ -0,0 +1,70 @@
+import random
+import time
+
+import pytest
+
+from pyzandronum import enums, exceptions, huffman
+from pyzandronum.responder import build_response, generate_state
+from pyzandronum.zandronum import Server
+
+# Generous bound; a validating parse takes well under a millisecond
+TIME_LIMIT = 0.05
+
+
+def raw_responses(rng: random.Random, count: int) -> list:
+    flags = enums.RequestFlags.all().value
+    extended = enums.ExtendedFlags.all().value
+    return [
+        build_response(generate_state(rng), flags, 0, extended)
+        for i in range(count)
+    ]
+
+
+def flip(rng: random.Random, data: bytes) -> bytes:
+    data = bytearray(data)
+    for i in range(rng.randint(1, 4)):
+        data[rng.randrange(len(data))] ^= 1 << rng.randrange(8)
+    return bytes(data)
+
+
+def mutations(rng: random.Random) -> list:
+    codec = huffman.get_codec()
+    packets = []
+    for raw in raw_responses(rng, 50):
+        encoded = codec.encode(raw)
+        packets.append(encoded)
+        # Truncated, before and after encoding
+        for i in range(5):
+            packets.append(codec.encode(raw[:rng.randrange(len(raw))]))
+            packets.append(encoded[:rng.randrange(len(encoded))])
+        # Bit-flipped, before and after encoding
+        for i in range(5):
+            packets.append(codec.encode(flip(rng, raw)))
+            packets.append(flip(rng, encoded))
+    # Random noise, raw and encoded
+    for i in range(100):
+        noise = rng.randbytes(rng.randrange(1, 1500))
+        packets += [noise, codec.encode(noise)]
+    return packets
+
+
+def test_valid_responses_parse():
+    rng = random.Random(0)
+    codec = huffman.get_codec()
+    for raw in raw_responses(rng, 20):
+        server = Server('127.0.0.1', validate=True)
+        server.parse_response(codec.encode(raw))
+        assert server.snapshot()['query']['hostname'] is not None
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_mutated_responses(seed):
+    for data in mutations(random.Random(seed)):
+        server = Server('127.0.0.1', validate=True)
+        started = time.perf_counter()
+        try:
+            server.parse_response(data)
+            server.snapshot()
+        except (exceptions.MalformedResponse, exceptions.QueryDenied):
+            pass
+        assert time.perf_counter() - started < TIME_LIMIT, data
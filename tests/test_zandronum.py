@@ -0,0 +1,40 @@
+import socket
+import threading
+import time
+
+import pytest
+
+from pyzandronum.zandronum import Server
+
+
+def test_query_timeout_ignores_stray_datagrams():
+    # The target never answers, while another host keeps sending
+    # datagrams to the querying socket
+    target = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    target.bind(('127.0.0.1', 0))
+    target.settimeout(2.0)
+    stray = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    stopped = threading.Event()
+
+    def flood():
+        data, client = target.recvfrom(2048)
+        # Bounded, so a query that never times out still fails the test
+        for i in range(100):
+            if stopped.wait(0.02):
+                break
+            stray.sendto(b'stray', client)
+
+    thread = threading.Thread(target=flood)
+    thread.start()
+    server = Server('127.0.0.1', target.getsockname()[1], timeout=0.3)
+    started = time.monotonic()
+    try:
+        with pytest.raises(socket.timeout):
+            server.query()
+        assert time.monotonic() - started < 1.0
+    finally:
+        stopped.set()
+        thread.join()
+        server.close()
+        target.close()
+        stray.close()